@@ -0,0 +1,87 @@
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.home.models import HomePageConfig
+
+INDEX_VERSION_KEY = "home:config_index:version"
+
+IndexKey = Tuple[Optional[str], Optional[int], Optional[int]]
+
+_lock = threading.Lock()
+_index: Dict[IndexKey, int] = {}
+_index_version: Optional[str] = None
+_index_built_at = 0.0
+
+
+def invalidate() -> None:
+    cache.set(INDEX_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def _current_version() -> str:
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(INDEX_VERSION_KEY, version, timeout=None):
+            version = cache.get(INDEX_VERSION_KEY)
+    return version
+
+
+def _build_index() -> Dict[IndexKey, int]:
+    index: Dict[IndexKey, int] = {}
+    configs = (
+        HomePageConfig.objects.filter(is_active=True)
+        .order_by("-priority", "id")
+        .values_list("id", "locale", "city_id", "region_id")
+    )
+    for config_id, locale, city_id, region_id in configs:
+        # First one wins: configs come ordered by priority within each bucket.
+        index.setdefault((locale or None, city_id, region_id), config_id)
+    return index
+
+
+def _is_current(version: str) -> bool:
+    if version != _index_version:
+        return False
+    if getattr(settings, "CACHE_IS_SHARED", False):
+        return True
+    # A per-process cache only sees this worker's invalidations, so changes
+    # made through other workers are picked up when the index expires.
+    ttl = max(int(getattr(settings, "HOME_CONFIG_INDEX_LOCAL_TTL_SECONDS", 30)), 0)
+    return time.monotonic() - _index_built_at < ttl
+
+
+def _get_index() -> Dict[IndexKey, int]:
+    global _index, _index_version, _index_built_at
+    version = _current_version()
+    if _is_current(version):
+        return _index
+    with _lock:
+        if not _is_current(version):
+            _index = _build_index()
+            _index_version = version
+            _index_built_at = time.monotonic()
+    return _index
+
+
+def resolve_config_id(lang: str, city_id: Optional[int], region_id: Optional[int]) -> Optional[int]:
+    """Pick the active config the way the home feed always has.
+
+    An exact locale beats the default locale, then a matching city beats a
+    config without a city, then the same for regions; priority breaks ties.
+    """
+    index = _get_index()
+    locales: List[Optional[str]] = [lang, None]
+    cities: List[Optional[int]] = [city_id, None] if city_id else [None]
+    regions: List[Optional[int]] = [region_id, None] if region_id else [None]
+    for locale in locales:
+        for city in cities:
+            for region in regions:
+                config_id = index.get((locale, city, region))
+                if config_id is not None:
+                    return config_id
+    return None
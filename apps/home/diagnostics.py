@@ -0,0 +1,85 @@
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.db import connection
+
+from core.storage import track_storage_calls
+
+logger = logging.getLogger(__name__)
+
+DEBUG_HEADER = "X-Home-Debug"
+TRUTHY = ("1", "true", "yes", "y", "on")
+
+
+@dataclass
+class BlockStats:
+    name: str
+    wall_ms: float = 0.0
+    queries: int = 0
+    sql_ms: float = 0.0
+    storage_calls: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.name,
+            "wall_ms": round(self.wall_ms, 2),
+            "queries": self.queries,
+            "sql_ms": round(self.sql_ms, 2),
+            "storage_calls": len(self.storage_calls),
+        }
+
+
+class _QueryTimer:
+    def __init__(self, stats: BlockStats):
+        self.stats = stats
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.stats.queries += 1
+            self.stats.sql_ms += (time.perf_counter() - started) * 1000
+
+
+def query_budget() -> int:
+    return max(int(getattr(settings, "HOME_BLOCK_QUERY_BUDGET", 0)), 0)
+
+
+def is_requested(request) -> bool:
+    raw = request.headers.get(DEBUG_HEADER) or request.query_params.get("_debug")
+    if str(raw or "").lower() not in TRUTHY:
+        return False
+    user = getattr(request, "user", None)
+    if user and getattr(user, "is_staff", False):
+        return True
+    return bool(getattr(settings, "HOME_DEBUG_ALLOW_NON_STAFF", False))
+
+
+@contextmanager
+def measure(name: str, enabled: bool = True):
+    if not enabled:
+        yield None
+        return
+    stats = BlockStats(name=name)
+    started = time.perf_counter()
+    with connection.execute_wrapper(_QueryTimer(stats)), track_storage_calls() as calls:
+        try:
+            yield stats
+        finally:
+            stats.storage_calls = calls
+            stats.wall_ms = (time.perf_counter() - started) * 1000
+
+    budget = query_budget()
+    if budget and stats.queries > budget:
+        logger.warning(
+            "Home block %s ran %s queries (budget %s, %.1f ms SQL)",
+            name,
+            stats.queries,
+            budget,
+            stats.sql_ms,
+        )
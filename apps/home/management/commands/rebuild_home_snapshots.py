@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.home import snapshots
+
+
+class Command(BaseCommand):
+    help = "Rebuild stale home snapshots so anonymous requests keep being served from the cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep rebuilding instead of exiting")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between passes with --loop")
+
+    def handle(self, *args, **options):
+        loop = options.get("loop", False)
+        interval = max(options.get("interval", 5.0), 0.1)
+
+        if not snapshots.is_enabled():
+            self.stdout.write(self.style.WARNING("Home snapshots are disabled."))
+            return
+
+        while True:
+            rebuilt = snapshots.rebuild_stale_snapshots()
+            if rebuilt or not loop:
+                self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} home snapshot(s)."))
+            if not loop:
+                return
+            time.sleep(interval)
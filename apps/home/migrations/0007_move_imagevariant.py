@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # ImageVariant moved to the media app. The table is renamed in place and
+    # media.0001_initial takes over the model state, so queued rows survive.
+
+    dependencies = [
+        ('home', '0006_imagevariant'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AlterModelTable(name='ImageVariant', table='media_imagevariant'),
+            ],
+            state_operations=[
+                migrations.DeleteModel(name='ImageVariant'),
+            ],
+        ),
+    ]
@@ -258,9 +258,10 @@ class HomeBlockSerializer(serializers.Serializer):
     style = serializers.DictField(required=False)
     items = serializers.ListField(child=serializers.DictField(), required=False)
     view_all = serializers.DictField(required=False, allow_null=True)
+    next_cursor = serializers.CharField(required=False, allow_null=True)
 
     def to_representation(self, instance: Dict[str, Any]) -> Dict[str, Any]:
-        return {
+        data = {
             "id": instance.get("id"),
             "type": instance.get("type"),
             "title": instance.get("title"),
@@ -269,3 +270,6 @@ class HomeBlockSerializer(serializers.Serializer):
             "items": instance.get("items", []),
             "view_all": instance.get("view_all"),
         }
+        if "next_cursor" in instance:
+            data["next_cursor"] = instance.get("next_cursor")
+        return data
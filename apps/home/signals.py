@@ -0,0 +1,151 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.banners.models import Banner
+from apps.categories.models import Category
+from apps.home import config_index, snapshots
+from apps.home.models import HomeBlock, HomeBlockItem, HomePageConfig
+from apps.services.models import Review, Service, ServiceImage, ServiceTag
+from apps.stories.models import ServiceStory
+
+
+@receiver([post_save, post_delete], sender=HomePageConfig)
+def invalidate_home_config(sender, instance, **kwargs):
+    config_index.invalidate()
+    snapshots.invalidate(snapshots.CONFIGS_TAG, snapshots.config_tag(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=HomeBlock)
+def invalidate_home_block(sender, instance, **kwargs):
+    snapshots.invalidate(snapshots.config_tag(instance.config_id))
+
+
+@receiver([post_save, post_delete], sender=HomeBlockItem)
+def invalidate_home_block_item(sender, instance, **kwargs):
+    config_id = HomeBlock.objects.filter(pk=instance.block_id).values_list("config_id", flat=True).first()
+    if config_id:
+        snapshots.invalidate(snapshots.config_tag(config_id))
+
+
+# Service fields that decide whether a service is in a query block and where.
+SCOPE_FIELDS = ("is_active", "priority", "category_id", "city_id")
+
+
+def _service_scope_tags(service_ids, category_ids=(), city_ids=()):
+    """Tags of the query blocks the services can appear in."""
+    service_ids = [service_id for service_id in service_ids if service_id]
+    category_ids = set(category_ids)
+    city_ids = set(city_ids)
+    for category_id, city_id in Service.objects.filter(pk__in=service_ids).values_list("category_id", "city_id"):
+        category_ids.add(category_id)
+        city_ids.add(city_id)
+    category_ids.update(
+        Service.additional_categories.through.objects.filter(service_id__in=service_ids).values_list(
+            "category_id", flat=True
+        )
+    )
+    city_ids.update(
+        Service.available_cities.through.objects.filter(service_id__in=service_ids).values_list("city_id", flat=True)
+    )
+    tags = {snapshots.SERVICE_TAG}
+    tags.update(snapshots.category_services_tag(category_id) for category_id in category_ids if category_id)
+    tags.update(snapshots.city_services_tag(city_id) for city_id in city_ids if city_id)
+    return tags
+
+
+@receiver(pre_save, sender=Service)
+def remember_service_scope(sender, instance, **kwargs):
+    if not snapshots.is_enabled() or instance.pk is None:
+        return
+    instance._home_scope_before = Service.objects.filter(pk=instance.pk).values(*SCOPE_FIELDS).first()
+
+
+@receiver(post_save, sender=Service)
+def invalidate_service(sender, instance, created, **kwargs):
+    if not snapshots.is_enabled():
+        return
+    tags = {snapshots.SERVICE_EDIT_TAG, snapshots.service_tag(instance.pk)}
+    before = getattr(instance, "_home_scope_before", None)
+    if created or before is None or any(before[field] != getattr(instance, field) for field in SCOPE_FIELDS):
+        # Only a change that can move the service into or out of a block marks
+        # the blocks it can appear in as stale; other edits reach the blocks
+        # that show it through its own service tag.
+        before = before or {}
+        tags |= _service_scope_tags([instance.pk], [before.get("category_id")], [before.get("city_id")])
+    snapshots.invalidate(*tags)
+
+
+@receiver(pre_delete, sender=Service)
+def remember_deleted_service_scope(sender, instance, **kwargs):
+    if snapshots.is_enabled():
+        # The m2m rows are gone by post_delete.
+        instance._home_scope_before = _service_scope_tags([instance.pk])
+
+
+@receiver(post_delete, sender=Service)
+def invalidate_deleted_service(sender, instance, **kwargs):
+    tags = getattr(instance, "_home_scope_before", None) or {snapshots.SERVICE_TAG}
+    snapshots.invalidate(snapshots.SERVICE_EDIT_TAG, snapshots.service_tag(instance.pk), *tags)
+
+
+@receiver([post_save, post_delete], sender=Review)
+@receiver([post_save, post_delete], sender=ServiceImage)
+def invalidate_service_child(sender, instance, **kwargs):
+    snapshots.invalidate(snapshots.service_tag(instance.service_id))
+
+
+@receiver([post_save, post_delete], sender=ServiceTag)
+def invalidate_service_tag(sender, instance, **kwargs):
+    snapshots.invalidate(snapshots.TAGS_TAG)
+
+
+@receiver([post_save, post_delete], sender=ServiceStory)
+def invalidate_story(sender, instance, **kwargs):
+    snapshots.invalidate(snapshots.STORY_TAG, snapshots.service_tag(instance.service_id))
+
+
+@receiver([post_save, post_delete], sender=Banner)
+def invalidate_banner(sender, instance, **kwargs):
+    snapshots.invalidate(snapshots.BANNER_TAG)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    snapshots.invalidate(snapshots.CATEGORY_TAG)
+
+
+@receiver(m2m_changed, sender=Service.tags.through)
+@receiver(m2m_changed, sender=Service.available_cities.through)
+@receiver(m2m_changed, sender=Service.additional_categories.through)
+def invalidate_service_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    # Cleared rows are only known before the clear, added and removed ones from pk_set.
+    if action not in ("pre_clear", "post_add", "post_remove") or not snapshots.is_enabled():
+        return
+    if not reverse:
+        service_ids = [instance.pk]
+        related_ids = pk_set or ()
+    else:
+        related_ids = [instance.pk]
+        service_ids = pk_set or ()
+        if action == "pre_clear":
+            related_field = next(
+                field.attname
+                for field in sender._meta.concrete_fields
+                if field.many_to_one and field.name != "service"
+            )
+            service_ids = list(sender.objects.filter(**{related_field: instance.pk}).values_list("service_id", flat=True))
+    category_ids = related_ids if sender is Service.additional_categories.through else ()
+    city_ids = related_ids if sender is Service.available_cities.through else ()
+    snapshots.invalidate(
+        snapshots.SERVICE_EDIT_TAG,
+        *(snapshots.service_tag(service_id) for service_id in service_ids),
+        *_service_scope_tags(service_ids, category_ids, city_ids),
+    )
+
+
+@receiver(m2m_changed, sender=Banner.cities.through)
+@receiver(m2m_changed, sender=Banner.regions.through)
+def invalidate_banner_relations(sender, instance, action, **kwargs):
+    if not action.startswith("post_"):
+        return
+    snapshots.invalidate(snapshots.BANNER_TAG)
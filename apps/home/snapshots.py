@@ -0,0 +1,264 @@
+import hashlib
+import io
+import json
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from apps.home.models import HomeBlock, HomeBlockSourceMode, HomeBlockType
+
+SNAPSHOT_KEY_PREFIX = "home:snapshot"
+# The index of stored snapshots is a ring of slots filled through an atomic
+# counter, so concurrent writers never overwrite each other's entries.
+SNAPSHOT_INDEX_PREFIX = "home:snapshot:index"
+SNAPSHOT_INDEX_SEQUENCE_KEY = f"{SNAPSHOT_INDEX_PREFIX}:sequence"
+TAG_KEY_PREFIX = "home:tag"
+
+# Tags a snapshot depends on. Kind tags cover "which objects are in the block",
+# object tags cover "what an included object looks like". SERVICE_TAG and the
+# category/city service tags only change when a service can enter or leave a
+# block; SERVICE_EDIT_TAG changes on every service save.
+CONFIGS_TAG = "configs"
+SERVICE_TAG = "service"
+SERVICE_EDIT_TAG = "service-edit"
+BANNER_TAG = "banner"
+STORY_TAG = "story"
+CATEGORY_TAG = "category"
+TAGS_TAG = "tags"
+
+
+def config_tag(config_id: int) -> str:
+    return f"config:{config_id}"
+
+
+def service_tag(service_id: int) -> str:
+    return f"service:{service_id}"
+
+
+def category_services_tag(category_id: int) -> str:
+    return f"category-services:{category_id}"
+
+
+def city_services_tag(city_id: int) -> str:
+    return f"city-services:{city_id}"
+
+
+def is_enabled() -> bool:
+    # Tag bumps on a per-process cache would leave other workers serving stale snapshots.
+    return bool(getattr(settings, "HOME_SNAPSHOT_ENABLED", True)) and bool(
+        getattr(settings, "CACHE_IS_SHARED", False)
+    )
+
+
+def is_snapshot_request(request) -> bool:
+    if not is_enabled():
+        return False
+    user = getattr(request, "user", None)
+    return not (user and getattr(user, "is_authenticated", False))
+
+
+def snapshot_params(request, lang: str, hints: Dict[str, Any], location_filter: bool) -> Dict[str, Any]:
+    return {
+        "lang": lang,
+        "city_id": hints.get("city_id"),
+        "region_id": hints.get("region_id"),
+        "region_city_id": hints.get("region_city_id"),
+        "location_filter": bool(location_filter),
+        "host": request.get_host(),
+        "scheme": request.scheme,
+    }
+
+
+def _snapshot_key(params: Dict[str, Any]) -> str:
+    raw = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    return f"{SNAPSHOT_KEY_PREFIX}:{hashlib.sha256(raw).hexdigest()[:32]}"
+
+
+def _tag_key(tag: str) -> str:
+    return f"{TAG_KEY_PREFIX}:{tag}"
+
+
+def _index_slot_key(slot: int) -> str:
+    return f"{SNAPSHOT_INDEX_PREFIX}:slot:{slot}"
+
+
+def _index_marker_key(key: str) -> str:
+    return f"{SNAPSHOT_INDEX_PREFIX}:key:{key}"
+
+
+def _snapshot_ttl() -> int:
+    return max(int(getattr(settings, "HOME_SNAPSHOT_TTL_SECONDS", 120)), 1)
+
+
+def _max_keys() -> int:
+    return max(int(getattr(settings, "HOME_SNAPSHOT_MAX_KEYS", 500)), 1)
+
+
+def _is_fresh(entry: Dict[str, Any]) -> bool:
+    versions = entry.get("tags") or {}
+    if not versions:
+        return True
+    current = cache.get_many([_tag_key(tag) for tag in versions])
+    return all(current.get(_tag_key(tag)) == token for tag, token in versions.items())
+
+
+def payload_etag(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":"))
+    return '"%s"' % hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def vary_etag(etag: str, parts: Iterable[Any]) -> str:
+    raw = etag + "|" + ",".join(str(part) for part in parts)
+    return '"%s"' % hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def get_snapshot(params: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], str]]:
+    entry = cache.get(_snapshot_key(params))
+    if not entry or not _is_fresh(entry):
+        return None
+    return entry["payload"], entry["etag"]
+
+
+def _current_tag_versions(tags: Iterable[str]) -> Dict[str, str]:
+    keys = {tag: _tag_key(tag) for tag in tags}
+    current = cache.get_many(list(keys.values()))
+    versions = {}
+    for tag, key in keys.items():
+        token = current.get(key)
+        if token is None:
+            token = uuid.uuid4().hex
+            if not cache.add(key, token, timeout=None):
+                token = cache.get(key)
+        versions[tag] = token
+    return versions
+
+
+def store_snapshot(params: Dict[str, Any], payload: Dict[str, Any], tags: Set[str], etag: str) -> None:
+    key = _snapshot_key(params)
+    entry = {"payload": payload, "etag": etag, "tags": _current_tag_versions(tags)}
+    cache.set(key, entry, timeout=_snapshot_ttl())
+    _index_snapshot(key, params)
+
+
+def _index_snapshot(key: str, params: Dict[str, Any]) -> None:
+    marker_key = _index_marker_key(key)
+    slot = cache.get(marker_key)
+    if slot is not None and (cache.get(_index_slot_key(slot)) or {}).get("key") == key:
+        return
+    # Once the ring wraps, the new entry takes the oldest entry's slot.
+    cache.add(SNAPSHOT_INDEX_SEQUENCE_KEY, 0, timeout=None)
+    slot = cache.incr(SNAPSHOT_INDEX_SEQUENCE_KEY) % _max_keys()
+    cache.set_many(
+        {_index_slot_key(slot): {"key": key, "params": params}, marker_key: slot},
+        timeout=None,
+    )
+
+
+def _indexed_snapshots() -> Dict[str, Dict[str, Any]]:
+    slots = cache.get_many([_index_slot_key(slot) for slot in range(_max_keys())])
+    # Racing writers of the same key may each take a slot; one entry is enough.
+    return {entry["key"]: entry["params"] for entry in slots.values()}
+
+
+def block_tags(block: HomeBlock, items: List[Dict[str, Any]]) -> Set[str]:
+    tags: Set[str] = {config_tag(block.config_id)}
+    if block.type == HomeBlockType.STORIES_ROW:
+        tags.update({STORY_TAG, SERVICE_TAG})
+        tags.update(service_tag(item["service_id"]) for item in items if item.get("service_id"))
+    elif block.type == HomeBlockType.BANNER_CAROUSEL:
+        tags.add(BANNER_TAG)
+    elif block.type == HomeBlockType.CATEGORY_STRIP:
+        tags.add(CATEGORY_TAG)
+    elif block.type in (HomeBlockType.SERVICE_CAROUSEL, HomeBlockType.SERVICE_LIST):
+        tags.update({CATEGORY_TAG, TAGS_TAG})
+        if block.source_mode == HomeBlockSourceMode.MANUAL:
+            tags.update(service_tag(item.object_id) for item in block.manual_items.all())
+        else:
+            tags.update(_query_scope_tags(block))
+        tags.update(service_tag(item["id"]) for item in items if item.get("id"))
+    return tags
+
+
+def _query_scope_tags(block: HomeBlock) -> Set[str]:
+    """Tags of the services a query block can pick: its categories, else its cities."""
+    from apps.home.views import HomeViewSet
+
+    params = block.query_params or {}
+    tags: Set[str] = {SERVICE_EDIT_TAG} if params.get("ordering") else set()
+    category_ids = HomeViewSet._param_list(params, "category_ids", "categories")
+    if category_ids:
+        return tags | {category_services_tag(category_id) for category_id in category_ids}
+    city_ids = HomeViewSet._param_list(params, "city_ids", "cities")
+    if city_ids:
+        return tags | {city_services_tag(city_id) for city_id in city_ids}
+    return tags | {SERVICE_TAG}
+
+
+def _bump(tags: Iterable[str]) -> None:
+    cache.set_many({_tag_key(tag): uuid.uuid4().hex for tag in tags}, timeout=None)
+
+
+def invalidate(*tags: str) -> None:
+    if not is_enabled() or not tags:
+        return
+    # Bump now and again after commit, so a snapshot built from pre-commit rows
+    # in between does not outlive it. Stale snapshots are rebuilt by the next
+    # request or by the rebuild_home_snapshots command.
+    _bump(tags)
+    transaction.on_commit(lambda: _bump(tags))
+
+
+def rebuild_stale_snapshots() -> int:
+    rebuilt = 0
+    for key, params in _indexed_snapshots().items():
+        entry = cache.get(key)
+        if entry and _is_fresh(entry):
+            continue
+        rebuild_snapshot(params)
+        rebuilt += 1
+    return rebuilt
+
+
+def rebuild_snapshot(params: Dict[str, Any]) -> Dict[str, Any]:
+    from apps.home.views import HomeViewSet
+
+    request = build_request(params)
+    view = HomeViewSet(request=request, format_kwarg=None, action="list", kwargs={}, args=())
+    payload, tags = view.build_payload(request, params)
+    store_snapshot(params, payload, tags, payload_etag(payload))
+    return payload
+
+
+def build_request(params: Dict[str, Any], user=None):
+    """A GET /api/home/ request built from plain values, anonymous unless `user` is given."""
+    from django.contrib.auth.models import AnonymousUser
+    from rest_framework.request import Request
+
+    query = {"lang": params["lang"]}
+    if params.get("location_filter"):
+        query["location_filter"] = "true"
+    host = params.get("host") or "localhost"
+    server_name, _, server_port = host.partition(":")
+    scheme = params.get("scheme") or "http"
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": "/api/home/",
+        "QUERY_STRING": urlencode(query),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": server_port or ("443" if scheme == "https" else "80"),
+        "HTTP_HOST": host,
+        "HTTP_ACCEPT_LANGUAGE": params["lang"],
+        "wsgi.url_scheme": scheme,
+        "wsgi.input": io.BytesIO(b""),
+    }
+    django_request = WSGIRequest(environ)
+    django_request.device = None
+    request = Request(django_request)
+    request.user = user if user is not None else AnonymousUser()
+    return request
@@ -0,0 +1,512 @@
+import io
+import tempfile
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.categories.models import Category
+from apps.home import config_index, snapshots
+from apps.home import views as home_views
+from apps.home.models import (
+    HomeBlock,
+    HomeBlockItem,
+    HomeBlockSourceMode,
+    HomeBlockType,
+    HomePageConfig,
+)
+from apps.regions.models import City, Region
+from apps.devices.models import Device
+from apps.services.models import Service
+from apps.services.factories import ServiceFixtureMixin
+from apps.stories.models import ServiceStory, ServiceStoryView
+from apps.users.models import User
+from core.storage import StorageCallCounterMixin, track_storage_calls
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class HomeSnapshotTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        super().setUp()
+        self.service = self.create_service("Hyzmat", "Услуга")
+        self.config = HomePageConfig.objects.create(slug="default", title="Default", is_active=True)
+        self.block = HomeBlock.objects.create(
+            config=self.config,
+            type=HomeBlockType.SERVICE_LIST,
+            title_tm="Hyzmatlar",
+            title_ru="Услуги",
+            source_mode=HomeBlockSourceMode.QUERY,
+            limit=5,
+        )
+
+    def _block_titles(self, response):
+        return [item["title"] for item in response.data["blocks"][0]["items"]]
+
+    def test_repeated_anonymous_request_is_served_without_queries(self):
+        first = self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.data, first.data)
+
+    def test_service_change_invalidates_snapshot(self):
+        self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.service.title_tm = "Täze"
+        self.service.save()
+        response = self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.assertEqual(self._block_titles(response), ["Täze"])
+
+    def test_block_change_invalidates_snapshot(self):
+        self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.block.is_active = False
+        self.block.save()
+        response = self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.assertEqual(response.data["blocks"], [])
+
+    def test_authenticated_requests_bypass_snapshot(self):
+        self.client.force_authenticate(user=self.vendor)
+
+        with patch("apps.home.views.snapshots.get_snapshot") as get_snapshot:
+            response = self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._block_titles(response), ["Hyzmat"])
+        get_snapshot.assert_not_called()
+
+    def test_stale_snapshot_is_rebuilt_by_the_command(self):
+        self.client.get("/api/v1/home/", {"lang": "tm"})
+        self.service.title_tm = "Täze"
+        self.service.save()
+
+        out = io.StringIO()
+        call_command("rebuild_home_snapshots", stdout=out)
+        self.assertIn("Rebuilt 1 home snapshot(s).", out.getvalue())
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.assertEqual(self._block_titles(response), ["Täze"])
+
+    def test_edit_outside_a_category_block_keeps_its_snapshot(self):
+        self.block.query_params = {"category_ids": [self.category.id]}
+        self.block.save()
+        other_category = Category.objects.create(name_tm="Başga", name_ru="Другая")
+        other = self.create_service("Başga", "Другая", category=other_category)
+        self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        other.title_tm = "Başga täze"
+        other.save()
+        with self.assertNumQueries(0):
+            self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        other.category = self.category
+        other.save()
+        response = self.client.get("/api/v1/home/", {"lang": "tm"})
+        self.assertEqual(sorted(self._block_titles(response)), ["Başga täze", "Hyzmat"])
+
+    def test_response_carries_etag_and_honours_if_none_match(self):
+        first = self.client.get("/api/v1/home/", {"lang": "tm"})
+        etag = first["ETag"]
+
+        second = self.client.get("/api/v1/home/", {"lang": "tm"}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b"")
+        self.assertEqual(second["ETag"], etag)
+        for response in (first, second):
+            self.assertIn("Accept-Language", response["Vary"])
+            self.assertIn("X-Device-ID", response["Vary"])
+
+    def test_etag_changes_with_block_content(self):
+        first = self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.service.title_tm = "Täze"
+        self.service.save()
+        second = self.client.get("/api/v1/home/", {"lang": "tm"}, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+
+    def test_per_process_cache_disables_snapshots(self):
+        with override_settings(CACHE_IS_SHARED=False), patch("apps.home.views.snapshots.get_snapshot") as get_snapshot:
+            response = self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.assertEqual(response.status_code, 200)
+        get_snapshot.assert_not_called()
+
+    def test_index_keeps_every_writer_and_wraps_at_max_keys(self):
+        params = [{"lang": "tm", "city_id": city_id} for city_id in range(4)]
+        with override_settings(HOME_SNAPSHOT_MAX_KEYS=3):
+            for item in params[:3]:
+                snapshots.store_snapshot(item, {}, set(), '"etag"')
+            snapshots.store_snapshot(params[0], {}, set(), '"etag"')
+            self.assertCountEqual(snapshots._indexed_snapshots().values(), params[:3])
+
+            snapshots.store_snapshot(params[3], {}, set(), '"etag"')
+            self.assertCountEqual(snapshots._indexed_snapshots().values(), params[1:])
+
+
+class HomeConfigIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.region = Region.objects.create(name_tm="Ahal", name_ru="Ахал")
+        self.city = City.objects.create(region=self.region, name_tm="Anew", name_ru="Анау")
+        self.default = HomePageConfig.objects.create(slug="default", title="Default")
+
+    def test_most_specific_config_wins(self):
+        localized = HomePageConfig.objects.create(slug="ru", title="RU", locale="ru")
+        regional = HomePageConfig.objects.create(slug="region", title="Region", locale="ru", region=self.region)
+        city = HomePageConfig.objects.create(slug="city", title="City", locale="ru", city=self.city)
+
+        self.assertEqual(config_index.resolve_config_id("tm", None, None), self.default.id)
+        self.assertEqual(config_index.resolve_config_id("ru", None, None), localized.id)
+        self.assertEqual(config_index.resolve_config_id("ru", None, self.region.id), regional.id)
+        self.assertEqual(config_index.resolve_config_id("ru", self.city.id, self.region.id), city.id)
+
+    def test_priority_breaks_ties_and_changes_are_picked_up(self):
+        preferred = HomePageConfig.objects.create(slug="preferred", title="Preferred", priority=5)
+        self.assertEqual(config_index.resolve_config_id("tm", None, None), preferred.id)
+
+        preferred.is_active = False
+        preferred.save()
+
+        self.assertEqual(config_index.resolve_config_id("tm", None, None), self.default.id)
+
+    def test_resolution_is_served_from_memory(self):
+        config_index.resolve_config_id("tm", None, None)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(config_index.resolve_config_id("tm", None, None), self.default.id)
+
+    @override_settings(CACHE_IS_SHARED=False, HOME_CONFIG_INDEX_LOCAL_TTL_SECONDS=30)
+    def test_per_process_cache_expires_the_index(self):
+        preferred = HomePageConfig.objects.create(slug="preferred", title="Preferred", priority=5, is_active=False)
+        config_index.resolve_config_id("tm", None, None)
+        # Stands in for another worker's change, whose invalidation never reaches this process.
+        HomePageConfig.objects.filter(pk=preferred.pk).update(is_active=True)
+
+        self.assertEqual(config_index.resolve_config_id("tm", None, None), self.default.id)
+        with patch("apps.home.config_index.time.monotonic", return_value=config_index._index_built_at + 31):
+            self.assertEqual(config_index.resolve_config_id("tm", None, None), preferred.id)
+
+    @override_settings(CACHE_IS_SHARED=True, HOME_CONFIG_INDEX_LOCAL_TTL_SECONDS=0)
+    def test_shared_cache_keeps_the_index_until_invalidated(self):
+        config_index.resolve_config_id("tm", None, None)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(config_index.resolve_config_id("tm", None, None), self.default.id)
+
+
+@override_settings(HOME_SNAPSHOT_ENABLED=False)
+class HomeServiceBlockPlannerTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.services = [
+            self.create_service(f"S{index}", priority=index)
+            for index in range(5)
+        ]
+        self.config = HomePageConfig.objects.create(slug="planner", title="Planner", is_active=True)
+        service_type = ContentType.objects.get_for_model(Service)
+
+        HomeBlock.objects.create(
+            config=self.config,
+            type=HomeBlockType.SERVICE_CAROUSEL,
+            position=1,
+            source_mode=HomeBlockSourceMode.QUERY,
+            limit=2,
+        )
+        self.carousel = HomeBlock.objects.first()
+        pinned = self.pinned = HomeBlock.objects.create(
+            config=self.config,
+            type=HomeBlockType.SERVICE_LIST,
+            position=2,
+            source_mode=HomeBlockSourceMode.PINNED_QUERY,
+            limit=3,
+        )
+        manual = self.manual = HomeBlock.objects.create(
+            config=self.config,
+            type=HomeBlockType.SERVICE_LIST,
+            position=3,
+            source_mode=HomeBlockSourceMode.MANUAL,
+            limit=2,
+        )
+        for position, service in enumerate([self.services[4], self.services[3]]):
+            HomeBlockItem.objects.create(
+                block=pinned, content_type=service_type, object_id=service.id, position=position
+            )
+        for position, service in enumerate([self.services[2], self.services[0], self.services[1]]):
+            HomeBlockItem.objects.create(
+                block=manual, content_type=service_type, object_id=service.id, position=position
+            )
+
+    def _block_titles(self, response):
+        return [[item["title"] for item in block["items"]] for block in response.data["blocks"]]
+
+    def test_blocks_keep_query_pinned_and_manual_order(self):
+        response = self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.assertEqual(
+            self._block_titles(response),
+            [["S0", "S1"], ["S4", "S3", "S0"], ["S2", "S0"]],
+        )
+
+    def test_service_blocks_share_one_annotated_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        heavy = [query for query in ctx.captured_queries if "services_serviceratingstats" in query["sql"]]
+        self.assertEqual(len(heavy), 1)
+
+    def test_query_filters_use_semi_joins_without_distinct(self):
+        region = Region.objects.create(name_tm="Ahal", name_ru="Ахал")
+        cities = [
+            City.objects.create(region=region, name_tm="Änew", name_ru="Анев"),
+            City.objects.create(region=region, name_tm="Tejen", name_ru="Теджен"),
+        ]
+        self.services[0].available_cities.set(cities)
+        self.services[1].city = cities[0]
+        self.services[1].save()
+        self.services[2].available_cities.set(cities[1:])
+        HomeBlock.objects.create(
+            config=self.config,
+            type=HomeBlockType.SERVICE_LIST,
+            position=4,
+            source_mode=HomeBlockSourceMode.QUERY,
+            limit=5,
+            query_params={"city_ids": [city.id for city in cities], "region_ids": [region.id]},
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.assertEqual(self._block_titles(response)[3], ["S0", "S1", "S2"])
+        self.assertFalse([query for query in ctx.captured_queries if "DISTINCT" in query["sql"].upper()])
+
+    def _load_more(self, block, cursor=None, **params):
+        if cursor:
+            params["cursor"] = cursor
+        return self.client.get(f"/api/v1/home/blocks/blk_{block.id}/", {"lang": "tm", **params})
+
+    def test_only_service_lists_get_a_next_cursor(self):
+        blocks = self.client.get("/api/v1/home/", {"lang": "tm"}).data["blocks"]
+
+        self.assertNotIn("next_cursor", blocks[0])
+        self.assertIsNotNone(blocks[1]["next_cursor"])
+        self.assertIsNotNone(blocks[2]["next_cursor"])
+
+    def test_pinned_list_continues_after_the_pins(self):
+        blocks = self.client.get("/api/v1/home/", {"lang": "tm"}).data["blocks"]
+
+        response = self._load_more(self.pinned, blocks[1]["next_cursor"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], f"blk_{self.pinned.id}")
+        self.assertEqual([item["title"] for item in response.data["items"]], ["S1", "S2"])
+        self.assertIsNone(response.data["next_cursor"])
+
+    def test_list_continues_after_the_last_service_shown(self):
+        blocks = self.client.get("/api/v1/home/", {"lang": "tm"}).data["blocks"]
+        self.create_service("New", priority=0)
+
+        response = self._load_more(self.pinned, blocks[1]["next_cursor"])
+
+        self.assertEqual([item["title"] for item in response.data["items"]], ["S1", "S2"])
+
+    def test_manual_list_pages_without_duplicates(self):
+        first = self._load_more(self.manual, size=1)
+        second = self._load_more(self.manual, first.data["next_cursor"], size=1)
+        third = self._load_more(self.manual, second.data["next_cursor"], size=1)
+
+        titles = [item["title"] for page in (first, second, third) for item in page.data["items"]]
+        self.assertEqual(titles, ["S2", "S0", "S1"])
+        self.assertIsNone(third.data["next_cursor"])
+
+    def test_rejects_tampered_cursor(self):
+        response = self._load_more(self.manual, "not-a-cursor")
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_carousels_have_no_continuation(self):
+        response = self._load_more(self.carousel)
+
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(HOME_DEBUG_ALLOW_NON_STAFF=False)
+class HomeDiagnosticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.staff = User.objects.create_user(phone="+99361000105", password="pass123", is_staff=True)
+        self.customer = User.objects.create_user(phone="+99361000106", password="pass123")
+        config = HomePageConfig.objects.create(slug="debug", title="Debug")
+        self.block = HomeBlock.objects.create(config=config, type=HomeBlockType.CATEGORY_STRIP)
+
+    def test_staff_gets_per_block_stats(self):
+        self.client.force_authenticate(user=self.staff)
+
+        response = self.client.get("/api/v1/home/", {"lang": "tm"}, HTTP_X_HOME_DEBUG="1")
+
+        stats = response.data["_debug"]["blocks"]
+        self.assertEqual([entry["id"] for entry in stats], [f"blk_{self.block.id}"])
+        self.assertGreaterEqual(stats[0]["queries"], 1)
+        self.assertEqual(
+            set(stats[0]),
+            {"id", "wall_ms", "queries", "sql_ms", "storage_calls"},
+        )
+
+    def test_debug_header_is_ignored_for_other_users(self):
+        self.client.force_authenticate(user=self.customer)
+
+        response = self.client.get("/api/v1/home/", {"lang": "tm"}, HTTP_X_HOME_DEBUG="1")
+
+        self.assertNotIn("_debug", response.data)
+
+    @override_settings(HOME_BLOCK_QUERY_BUDGET=1, HOME_SNAPSHOT_ENABLED=False)
+    def test_query_budget_overrun_is_logged(self):
+        with self.assertLogs("apps.home.diagnostics", level="WARNING") as logs:
+            self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        self.assertIn(f"blk_{self.block.id}", logs.output[0])
+
+
+class StorageCallCounterTests(SimpleTestCase):
+    def test_calls_are_counted_only_while_tracking(self):
+        storage_cls = type("CountingStorage", (StorageCallCounterMixin, FileSystemStorage), {})
+        storage = storage_cls(location=tempfile.gettempdir(), base_url="/media/")
+
+        storage.url("outside.webp")
+        with track_storage_calls() as calls:
+            storage.url("a.webp")
+            storage.exists("a.webp")
+
+        self.assertEqual(calls, ["url", "exists"])
+
+
+@override_settings(HOME_SNAPSHOT_ENABLED=False)
+class HomeConcurrentBlocksTests(ServiceFixtureMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(3):
+            self.create_service(f"S{index}", priority=index)
+        config = HomePageConfig.objects.create(slug="concurrent", title="Concurrent")
+        for position, block_type in enumerate(
+            [HomeBlockType.CATEGORY_STRIP, HomeBlockType.SERVICE_CAROUSEL, HomeBlockType.SERVICE_LIST]
+        ):
+            HomeBlock.objects.create(config=config, type=block_type, position=position, limit=2)
+
+    def test_concurrent_build_matches_sequential_output(self):
+        sequential = self.client.get("/api/v1/home/", {"lang": "ru"})
+        with override_settings(HOME_CONCURRENT_BLOCKS=True, HOME_BLOCK_WORKERS=3), patch(
+            "apps.home.views._get_block_executor", wraps=home_views._get_block_executor
+        ) as get_executor:
+            concurrent = self.client.get("/api/v1/home/", {"lang": "ru"})
+
+        get_executor.assert_called_once()
+        self.assertEqual(len(concurrent.data["blocks"]), 3)
+        self.assertEqual(concurrent.content, sequential.content)
+
+    def test_workers_get_their_own_request_for_the_viewer(self):
+        viewer = self.vendor
+        client = APIClient()
+        client.force_authenticate(user=viewer)
+        sequential = client.get("/api/v1/home/", {"lang": "ru"})
+        build_block = home_views.HomeViewSet._build_measured_block
+        with override_settings(HOME_CONCURRENT_BLOCKS=True, HOME_BLOCK_WORKERS=3), patch.object(
+            home_views.HomeViewSet, "_build_measured_block", autospec=True, side_effect=build_block
+        ) as build:
+            concurrent = client.get("/api/v1/home/", {"lang": "ru"})
+
+        self.assertEqual(concurrent.content, sequential.content)
+        worker_request = build.call_args.args[4]
+        self.assertIsNot(worker_request._request, concurrent.wsgi_request)
+        self.assertEqual(worker_request.user.pk, viewer.pk)
+
+    def test_pool_is_capped_by_the_connection_budget(self):
+        with override_settings(HOME_BLOCK_WORKERS=10, DB_CONNECTIONS_PER_PROCESS=3), patch.object(
+            home_views, "_block_executor", None
+        ):
+            executor = home_views._get_block_executor()
+        self.addCleanup(executor.shutdown)
+
+        self.assertEqual(executor._max_workers, 2)
+
+
+class HomeStoriesRowTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        super().setUp()
+        self.region = Region.objects.create(name_tm="Ahal", name_ru="Ахал")
+        self.other_region = Region.objects.create(name_tm="Mary", name_ru="Мары")
+        self.city = City.objects.create(region=self.region, name_tm="Anew", name_ru="Анау")
+        self.other_city = City.objects.create(region=self.other_region, name_tm="Mary", name_ru="Мары")
+        self.local = self._service("Local", self.city)
+        self.remote = self._service("Remote", self.other_city)
+        self.remote.available_cities.add(self.city)
+        self.far = self._service("Far", self.other_city)
+
+        self.local_stories = [self._story(self.local, priority) for priority in (2, 1)]
+        self._story(self.remote, 1)
+        self._story(self.far, 1)
+        self._story(self.far, 1, is_active=False)
+
+        config = HomePageConfig.objects.create(slug="stories", title="Stories")
+        HomeBlock.objects.create(config=config, type=HomeBlockType.STORIES_ROW, limit=10)
+
+    def _service(self, title, city):
+        return self.create_service(title, city=city)
+
+    def _story(self, service, priority, is_active=True):
+        return ServiceStory.objects.create(
+            service=service,
+            image=f"services/stories/{service.id}-{priority}.webp",
+            priority=priority,
+            is_active=is_active,
+        )
+
+    def _items(self, response):
+        return response.data["blocks"][0]["items"]
+
+    def test_groups_counts_and_filters_by_region(self):
+        response = self.client.get("/api/v1/home/", {"lang": "tm", "region_id": self.region.id})
+
+        items = self._items(response)
+        self.assertEqual([item["title"] for item in items], ["Local", "Remote"])
+        self.assertEqual(items[0]["id"], self.local_stories[1].id)
+        self.assertEqual([item["stories_count"] for item in items], [2, 1])
+
+    def test_city_matches_come_first(self):
+        response = self.client.get("/api/v1/home/", {"lang": "tm", "city_id": self.other_city.id})
+
+        self.assertEqual([item["title"] for item in self._items(response)], ["Remote", "Far", "Local"])
+
+    def test_has_unseen_reflects_device_views(self):
+        device = Device.objects.create(device_id="device-1")
+        ServiceStoryView.objects.create(story=self.local_stories[0], device=device)
+        ServiceStoryView.objects.create(story=self.local_stories[1], device=device)
+
+        response = self.client.get("/api/v1/home/", {"lang": "tm"}, HTTP_X_DEVICE_ID="device-1")
+        anonymous = self.client.get("/api/v1/home/", {"lang": "tm"})
+
+        unseen = {item["title"]: item["has_unseen"] for item in self._items(response)}
+        self.assertEqual(unseen, {"Local": False, "Remote": True, "Far": True})
+        self.assertTrue(all(item["has_unseen"] for item in self._items(anonymous)))
+        self.assertNotEqual(response["ETag"], anonymous["ETag"])
@@ -1,15 +1,25 @@
-from copy import deepcopy
-from typing import Any, Dict, Iterable, List, Optional, Tuple
-
-from django.db.models import Avg, BooleanField, Count, Exists, OuterRef, Prefetch, Q, Value, Case, When, IntegerField, Subquery
-from django.db.models.functions import Round
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from copy import copy, deepcopy
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core import signing
+from django.db import close_old_connections
+from django.db.models import BooleanField, Count, Exists, F, OuterRef, Q, Value, Case, When, IntegerField, Window
+from django.db.models.functions import FirstValue, RowNumber
+from django.shortcuts import get_object_or_404
 from django.utils import timezone, translation
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from rest_framework import permissions, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from apps.banners.models import Banner
 from apps.categories.models import Category
-from apps.home.models import HomeBlock, HomeBlockSourceMode, HomeBlockType, HomePageConfig
+from apps.home import config_index, diagnostics, snapshots
+from apps.home.models import HomeBlock, HomeBlockSourceMode, HomeBlockType
 from apps.home.serializers import (
     BannerSerializer,
     CategoryLightSerializer,
@@ -18,96 +28,210 @@ from apps.home.serializers import (
 )
 from apps.regions.models import City, Region
 from apps.regions.serializers import CitySerializer
-from apps.services.serializers import ServiceCarouselSerializer, ServiceListSerializer
-from apps.services.models import Favorite, Service, ServiceImage
-from apps.stories.models import ServiceStory
+from apps.services.serializers import ServiceCarouselCardSerializer, ServiceListCardSerializer
+from apps.services.models import Favorite, Service
+from apps.services.rating_stats import rating_annotations
+from apps.stories.models import ServiceStory, ServiceStoryView
 from apps.users.blocking import get_blocked_user_ids
-from core.image_assets import build_image_asset
+from apps.users.models import User
+from core.image_assets import build_image_asset, collect_image_variants
+from core.pagination import keyset_after, keyset_order_by, keyset_ordering, keyset_values
 from core.utils import get_lang_code, localized_value
 
+SERVICE_BLOCK_TYPES = (HomeBlockType.SERVICE_CAROUSEL, HomeBlockType.SERVICE_LIST)
+BLOCK_CURSOR_SALT = "home.block.cursor"
+# Cursor keys that say where a block page starts, see _plan_service_block.
+BLOCK_CURSOR_POSITION_KEYS = ("m", "k", "o")
+MAX_BLOCK_PAGE_SIZE = 50
+
+
+class ServiceBlockPlan(NamedTuple):
+    ids: List[int]
+    post_limit: Optional[int] = None
+    # Where the next page starts, see _plan_service_block.
+    next_after: Optional[Dict[str, Any]] = None
+
+
+class ServicePage(NamedTuple):
+    services: List[Service]
+    next_after: Optional[Dict[str, Any]] = None
+
+_block_executor: Optional[ThreadPoolExecutor] = None
+_block_executor_lock = threading.Lock()
+
+
+def _get_block_executor() -> ThreadPoolExecutor:
+    global _block_executor
+    if _block_executor is None:
+        with _block_executor_lock:
+            if _block_executor is None:
+                # Every pool thread keeps its own persistent connection next to
+                # the request thread's, so the pool fits in the per-process budget.
+                budget = max(int(getattr(settings, "DB_CONNECTIONS_PER_PROCESS", 5)), 2)
+                _block_executor = ThreadPoolExecutor(
+                    max_workers=min(max(int(getattr(settings, "HOME_BLOCK_WORKERS", 4)), 1), budget - 1),
+                    thread_name_prefix="home-blocks",
+                )
+    return _block_executor
+
+
+ANNOTATED_SERVICE_ORDERINGS = {"rating", "reviews_count", "is_favorite"}
+
 
 class HomeViewSet(viewsets.GenericViewSet):
     permission_classes = [permissions.AllowAny]
 
     def list(self, request, *args, **kwargs):
-        lang = self._resolve_language(request)
-        city = self._resolve_city(request)
-        region = self._resolve_region(request)
-        if city and city.region and not region:
-            region = city.region
-
-        config_qs = (
-            HomePageConfig.objects.filter(is_active=True)
-            .filter(Q(locale=lang) | Q(locale__isnull=True) | Q(locale=""))
-        )
-        if city:
-            config_qs = config_qs.filter(Q(city=city) | Q(city__isnull=True))
-        else:
-            config_qs = config_qs.filter(Q(city__isnull=True))
-
-        if region:
-            config_qs = config_qs.filter(Q(region=region) | Q(region__isnull=True))
+        hints = self._location_hints(request)
+        debug = diagnostics.is_requested(request)
+        if debug or not snapshots.is_snapshot_request(request):
+            payload, _ = self.build_payload(request, hints, debug=debug)
+            etag = snapshots.payload_etag(payload)
         else:
-            config_qs = config_qs.filter(Q(region__isnull=True))
-
-        city_match = (
-            Case(
-                When(city=city, then=Value(1)),
-                default=Value(0),
-                output_field=IntegerField(),
+            params = snapshots.snapshot_params(
+                request,
+                self._resolve_language(request),
+                hints,
+                location_filter=self._location_filter_param(request),
             )
-            if city
-            else Value(0, output_field=IntegerField())
+            snapshot = snapshots.get_snapshot(params)
+            if snapshot is None:
+                payload, tags = self.build_payload(request, hints)
+                etag = snapshots.payload_etag(payload)
+                snapshots.store_snapshot(params, payload, tags, etag)
+            else:
+                payload, etag = snapshot
+
+        unseen_service_ids = self._apply_story_views(payload, request)
+        if unseen_service_ids is not None:
+            etag = snapshots.vary_etag(etag, unseen_service_ids)
+        return self._conditional_response(request, payload, etag)
+
+    def block(self, request, pk=None, *args, **kwargs):
+        block = get_object_or_404(
+            HomeBlock.objects.filter(
+                is_active=True,
+                config__is_active=True,
+                type=HomeBlockType.SERVICE_LIST,
+            ).prefetch_related("manual_items__content_object"),
+            pk=pk,
         )
-        region_match = (
-            Case(
-                When(region=region, then=Value(1)),
-                default=Value(0),
-                output_field=IntegerField(),
-            )
-            if region
-            else Value(0, output_field=IntegerField())
+        cursor = self._decode_block_cursor(request.query_params.get("cursor"))
+        if cursor is None:
+            hints = self._location_hints(request)
+            city = self._resolve_city(hints)
+            region = self._resolve_region(hints, city)
+            if city and city.region and not region:
+                region = city.region
+            apply_location_filter = self._should_filter_by_location(block, request)
+            after = None
+        else:
+            city = City.objects.select_related("region").filter(id=cursor.get("c")).first() if cursor.get("c") else None
+            region = Region.objects.filter(id=cursor.get("r")).first() if cursor.get("r") else None
+            apply_location_filter = bool(cursor.get("l"))
+            after = {key: cursor[key] for key in BLOCK_CURSOR_POSITION_KEYS if key in cursor}
+
+        size = self._parse_positive_int(request.query_params.get("size")) or block.limit or MAX_BLOCK_PAGE_SIZE
+        size = min(size, MAX_BLOCK_PAGE_SIZE)
+        with collect_image_variants():
+            plan = self._plan_service_block(block, city, region, request, apply_location_filter, after, size)
+            page = self._fetch_planned_services({block.id: plan}, request.user)[block.id]
+            items, _ = self._build_service_block(block, city, region, request, page.services)
+        return Response(
+            {
+                "id": f"blk_{block.id}",
+                "items": items,
+                "next_cursor": self._block_cursor(page.next_after, city, region, apply_location_filter),
+            }
         )
-        config_qs = config_qs.annotate(
-            locale_match=Case(
-                When(locale=lang, then=Value(1)),
-                default=Value(0),
-                output_field=IntegerField(),
-            ),
-            city_match=city_match,
-            region_match=region_match,
-            city_isnull=Case(
-                When(city__isnull=True, then=Value(1)),
-                default=Value(0),
-                output_field=IntegerField(),
-            ),
-            region_isnull=Case(
-                When(region__isnull=True, then=Value(1)),
-                default=Value(0),
-                output_field=IntegerField(),
-            ),
-        ).order_by(
-            "-locale_match",
-            "-city_match",
-            "-region_match",
-            "city_isnull",
-            "region_isnull",
-            "-priority",
+
+    @staticmethod
+    def _block_cursor(
+        next_after: Optional[Dict[str, Any]],
+        city: Optional[City],
+        region: Optional[Region],
+        apply_location_filter: bool,
+    ) -> Optional[str]:
+        if next_after is None:
+            return None
+        state = {
+            **next_after,
+            "c": city.id if city else None,
+            "r": region.id if region else None,
+            "l": apply_location_filter,
+        }
+        return signing.Signer(salt=BLOCK_CURSOR_SALT).sign_object(state, compress=True)
+
+    @staticmethod
+    def _decode_block_cursor(raw: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not raw:
+            return None
+        try:
+            state = signing.Signer(salt=BLOCK_CURSOR_SALT).unsign_object(raw)
+        except (signing.BadSignature, ValueError):
+            raise ValidationError({"cursor": "Invalid cursor."})
+        if not isinstance(state, dict) or not any(key in state for key in BLOCK_CURSOR_POSITION_KEYS):
+            raise ValidationError({"cursor": "Invalid cursor."})
+        offset, keys, manual = state.get("o", 0), state.get("k"), state.get("m")
+        if (
+            not isinstance(offset, int)
+            or offset < 0
+            or not (keys is None or isinstance(keys, list))
+            or not (manual is None or (isinstance(manual, list) and len(manual) == 2 and all(isinstance(value, int) for value in manual)))
+        ):
+            raise ValidationError({"cursor": "Invalid cursor."})
+        return state
+
+    @staticmethod
+    def _conditional_response(request, payload: Dict[str, Any], etag: str):
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(payload)
+        response["ETag"] = etag
+        # The payload follows the language, the viewer and the device's location.
+        patch_vary_headers(response, ("Accept-Language", "Authorization", "X-Device-ID"))
+        return response
+
+    def build_payload(
+        self, request, hints: Dict[str, Any], debug: bool = False
+    ) -> Tuple[Dict[str, Any], Set[str]]:
+        with collect_image_variants():
+            return self._build_payload(request, hints, debug=debug)
+
+    def _build_payload(
+        self, request, hints: Dict[str, Any], debug: bool = False
+    ) -> Tuple[Dict[str, Any], Set[str]]:
+        lang = self._resolve_language(request)
+        city = self._resolve_city(hints)
+        region = self._resolve_region(hints, city)
+        if city and city.region and not region:
+            region = city.region
+
+        config_id = config_index.resolve_config_id(
+            lang,
+            city.id if city else None,
+            region.id if region else None,
         )
-        config = config_qs.first()
 
+        tags: Set[str] = {snapshots.CONFIGS_TAG}
         city_payload = CitySerializer(city).data if city else None
-        if not config:
-            return Response({"version": 0, "city": city_payload, "blocks": []})
+        if not config_id:
+            return {"version": 0, "city": city_payload, "blocks": []}, tags
 
+        tags.add(snapshots.config_tag(config_id))
         blocks_payload: List[Dict[str, Any]] = []
         blocks = (
-            config.blocks.filter(is_active=True)
+            HomeBlock.objects.filter(config_id=config_id, is_active=True)
             .order_by("position", "id")
             .prefetch_related("manual_items__content_object")
         )
-        for block in blocks:
-            items, view_all = self._build_block(block, city, region, request)
+        blocks = list(blocks)
+        measure = debug or bool(diagnostics.query_budget())
+        with diagnostics.measure("plan", enabled=measure) as plan_stats:
+            planned_services = self._plan_service_blocks(blocks, city, region, request)
+        built_blocks = self._build_blocks(blocks, city, region, request, planned_services, measure)
+        for block, ((items, view_all), _) in zip(blocks, built_blocks):
+            tags |= snapshots.block_tags(block, items)
             block_limit = block.limit
             if block.type == HomeBlockType.CATEGORY_STRIP:
                 block_limit = self._resolve_category_strip_limit(block)
@@ -120,16 +244,28 @@ class HomeViewSet(viewsets.GenericViewSet):
                 "items": items,
                 "view_all": view_all,
             }
+            if block.type == HomeBlockType.SERVICE_LIST:
+                page = planned_services.get(block.id)
+                block_payload["next_cursor"] = self._block_cursor(
+                    page.next_after if page else None,
+                    city,
+                    region,
+                    self._should_filter_by_location(block, request),
+                )
             serialized_block = HomeBlockSerializer(block_payload).data
             blocks_payload.append(serialized_block)
 
-        return Response(
-            {
-                "version": config.id,
-                "city": city_payload,
-                "blocks": blocks_payload,
+        payload = {
+            "version": config_id,
+            "city": city_payload,
+            "blocks": blocks_payload,
+        }
+        if debug:
+            payload["_debug"] = {
+                "plan": plan_stats.as_dict(),
+                "blocks": [stats.as_dict() for _, stats in built_blocks],
             }
-        )
+        return payload, tags
 
     @staticmethod
     def _resolve_language(request) -> str:
@@ -144,6 +280,10 @@ class HomeViewSet(viewsets.GenericViewSet):
                 return val
             return str(val).lower() in ("1", "true", "yes", "y", "on")
 
+        return HomeViewSet._location_filter_param(request)
+
+    @staticmethod
+    def _location_filter_param(request) -> bool:
         raw = request.query_params.get("location_filter")
         if raw is None:
             return False
@@ -186,15 +326,27 @@ class HomeViewSet(viewsets.GenericViewSet):
         return cleaned
 
     @staticmethod
-    def _resolve_city(request) -> Optional[City]:
-        city_id = request.query_params.get("city_id")
+    def _location_hints(request) -> Dict[str, Any]:
+        device = getattr(request, "device", None)
+        user = getattr(request, "user", None)
+        device_city_id = device.city_id if device else None
+        user_city_id = (
+            getattr(user, "city_id", None)
+            if user and getattr(user, "is_authenticated", False)
+            else None
+        )
+        city_id = request.query_params.get("city_id") or device_city_id or user_city_id
+        region_id = request.query_params.get("region_id") or (device.region_id if device else None)
+        return {
+            "city_id": city_id,
+            "region_id": region_id,
+            "region_city_id": None if region_id else (device_city_id or user_city_id),
+        }
+
+    @staticmethod
+    def _resolve_city(hints: Dict[str, Any]) -> Optional[City]:
+        city_id = hints.get("city_id")
         if not city_id:
-            device = getattr(request, "device", None)
-            if device and device.city_id:
-                return device.city
-            user = getattr(request, "user", None)
-            if user and getattr(user, "is_authenticated", False) and getattr(user, "city_id", None):
-                return user.city
             return None
         try:
             return City.objects.select_related("region").get(id=city_id)
@@ -202,27 +354,94 @@ class HomeViewSet(viewsets.GenericViewSet):
             return None
 
     @staticmethod
-    def _resolve_region(request) -> Optional[Region]:
-        region_id = request.query_params.get("region_id")
+    def _resolve_region(hints: Dict[str, Any], city: Optional[City] = None) -> Optional[Region]:
+        region_id = hints.get("region_id")
         if region_id:
             try:
                 return Region.objects.get(id=region_id)
             except Region.DoesNotExist:
                 return None
 
-        device = getattr(request, "device", None)
-        if device and device.region_id:
-            return device.region
-        if device and device.city_id:
-            return device.city.region
+        region_city_id = hints.get("region_city_id")
+        if not region_city_id:
+            return None
+        if city and str(city.id) == str(region_city_id):
+            return city.region
+        return Region.objects.filter(city__id=region_city_id).first()
+
+    def _build_blocks(
+        self,
+        blocks: List[HomeBlock],
+        city: Optional[City],
+        region: Optional[Region],
+        request,
+        planned_services: Dict[int, ServicePage],
+        measure: bool = False,
+    ) -> List[Tuple[Tuple[List[Any], Optional[Dict[str, Any]]], Optional[diagnostics.BlockStats]]]:
+        if len(blocks) < 2 or not getattr(settings, "HOME_CONCURRENT_BLOCKS", False):
+            return [
+                self._build_measured_block(block, city, region, request, planned_services.get(block.id), measure)
+                for block in blocks
+            ]
 
+        # Each task runs in a copy of the current context so request-scoped state
+        # (active language, the image variant batch) follows it into the pool.
+        # Tasks get plain request values and their own copies of the rows rather
+        # than the request and instances other threads read.
         user = getattr(request, "user", None)
-        if user and getattr(user, "is_authenticated", False) and getattr(user, "city_id", None):
-            return user.city.region
-        return None
+        values = {
+            "lang": self._resolve_language(request),
+            "location_filter": self._location_filter_param(request),
+            "host": request.get_host(),
+            "scheme": request.scheme,
+            "user_id": user.pk if user and getattr(user, "is_authenticated", False) else None,
+        }
+        executor = _get_block_executor()
+        futures = [
+            executor.submit(
+                copy_context().run,
+                self._build_block_in_worker,
+                values,
+                deepcopy(block),
+                deepcopy(city),
+                deepcopy(region),
+                deepcopy(planned_services.get(block.id)),
+                measure,
+            )
+            for block in blocks
+        ]
+        return [future.result() for future in futures]
+
+    def _build_block_in_worker(self, values: Dict[str, Any], block, city, region, page, measure):
+        try:
+            user = User(pk=values["user_id"]) if values["user_id"] else None
+            request = snapshots.build_request(values, user=user)
+            return self._build_measured_block(block, city, region, request, page, measure)
+        finally:
+            # Pool threads outlive the request, so their connections follow
+            # CONN_MAX_AGE the way request threads' connections do.
+            close_old_connections()
+
+    def _build_measured_block(
+        self,
+        block: HomeBlock,
+        city: Optional[City],
+        region: Optional[Region],
+        request,
+        page: Optional[ServicePage],
+        measure: bool,
+    ):
+        with diagnostics.measure(f"blk_{block.id}", enabled=measure) as stats:
+            result = self._build_block(block, city, region, request, page)
+        return result, stats
 
     def _build_block(
-        self, block: HomeBlock, city: Optional[City], region: Optional[Region], request
+        self,
+        block: HomeBlock,
+        city: Optional[City],
+        region: Optional[Region],
+        request,
+        page: Optional[ServicePage] = None,
     ) -> Tuple[List[Any], Optional[Dict[str, Any]]]:
         if block.type == HomeBlockType.STORIES_ROW:
             return self._build_stories_row(block, city, region, request), None
@@ -238,59 +457,87 @@ class HomeViewSet(viewsets.GenericViewSet):
             else:
                 view_all = self._default_category_view_all()
             return items, self._ensure_view_all_label(view_all)
-        if block.type in (HomeBlockType.SERVICE_CAROUSEL, HomeBlockType.SERVICE_LIST):
-            return self._build_service_block(block, city, region, request)
+        if block.type in SERVICE_BLOCK_TYPES:
+            return self._build_service_block(block, city, region, request, page.services if page else [])
         return [], None
 
     @staticmethod
+    def _active_story_q(prefix: str = "") -> Q:
+        now = timezone.now()
+        return (
+            Q(**{f"{prefix}is_active": True})
+            & (Q(**{f"{prefix}starts_at__isnull": True}) | Q(**{f"{prefix}starts_at__lte": now}))
+            & (Q(**{f"{prefix}ends_at__isnull": True}) | Q(**{f"{prefix}ends_at__gte": now}))
+        )
+
+    @classmethod
     def _build_stories_row(
-        block: HomeBlock, city: Optional[City], region: Optional[Region], request
+        cls, block: HomeBlock, city: Optional[City], region: Optional[Region], request
     ) -> List[Dict[str, Any]]:
         lang = get_lang_code(request)
-        now = timezone.now()
-        blocked_user_ids = get_blocked_user_ids(getattr(request, "user", None))
+        user = getattr(request, "user", None)
+        blocked_user_ids = get_blocked_user_ids(user)
+        available_cities = Service.available_cities.through.objects.filter(service_id=OuterRef("service_id"))
+        story_order = [F("priority").asc(), F("starts_at").desc(), F("created_at").desc(), F("id").asc()]
+        by_service = {"partition_by": [F("service_id")]}
+
+        stories_qs = ServiceStory.objects.filter(cls._active_story_q(), service__is_active=True)
+        if blocked_user_ids:
+            stories_qs = stories_qs.exclude(service__vendor_id__in=blocked_user_ids)
+        if region and not city:
+            stories_qs = stories_qs.filter(
+                Q(service__city__region_id=region.id)
+                | Exists(available_cities.filter(city__region_id=region.id))
+            )
+
+        city_match = Value(0, output_field=IntegerField())
+        if city:
+            city_match = Case(
+                When(
+                    Q(service__city_id=city.id) | Exists(available_cities.filter(city_id=city.id)),
+                    then=Value(1),
+                ),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        is_owner = Value(0, output_field=IntegerField())
+        if user and getattr(user, "is_authenticated", False):
+            is_owner = Case(
+                When(service__vendor_id=user.id, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+
+        # One row per service: the first story that has an image supplies the
+        # cover, while the id and the count describe the whole group.
         stories_qs = (
-            ServiceStory.objects.filter(
-                Q(is_active=True),
-                Q(starts_at__isnull=True) | Q(starts_at__lte=now),
-                Q(ends_at__isnull=True) | Q(ends_at__gte=now),
+            stories_qs.annotate(
+                lead_story_id=Window(FirstValue("id"), order_by=story_order, **by_service),
+                group_stories_count=Window(Count("id"), **by_service),
+                cover_rank=Window(
+                    RowNumber(),
+                    order_by=[
+                        Case(When(image="", then=Value(1)), default=Value(0)).asc(),
+                        *story_order,
+                    ],
+                    **by_service,
+                ),
+                city_match=city_match,
+                is_owner=is_owner,
             )
-            .select_related("service", "service__city__region")
-            .prefetch_related("service__available_cities")
-            .order_by("service_id", "priority", "-starts_at", "-created_at")
+            .filter(cover_rank=1)
+            .select_related("service")
+            .order_by("-is_owner", "-city_match", "service_id")
         )
-        if blocked_user_ids:
-            stories_qs = stories_qs.exclude(service__vendor_id__in=blocked_user_ids)
+        if block.limit:
+            stories_qs = stories_qs[: block.limit]
 
-        items_map: Dict[int, Dict[str, Any]] = {}
-        order_counter = 0
+        items = []
         for story in stories_qs:
             service = story.service
-            if not service or not service.is_active:
-                continue
-            is_owner = bool(
-                getattr(request, "user", None)
-                and getattr(request.user, "is_authenticated", False)
-                and service.vendor_id == getattr(request.user, "id", None)
-            )
-            city_match = False
-            if region and not city:
-                if service.city and service.city.region_id == region.id:
-                    region_match = True
-                else:
-                    region_match = any(c.region_id == region.id for c in service.available_cities.all())
-                if not region_match:
-                    continue
-            if city:
-                if service.city_id == city.id:
-                    city_match = True
-                else:
-                    city_match = any(c.id == city.id for c in service.available_cities.all())
-            data = items_map.get(service.id)
-            if data is None:
-                order_counter += 1
-                data = {
-                    "id": story.id,
+            items.append(
+                {
+                    "id": story.lead_story_id,
                     "service_id": service.id,
                     "title": localized_value(service, "title", lang=lang) or "",
                     "avatar": build_image_asset(
@@ -308,40 +555,50 @@ class HomeViewSet(viewsets.GenericViewSet):
                         preset_keys=("story_cover_1x", "story_cover_2x"),
                     ),
                     "has_unseen": True,
-                    "stories_count": 0,
-                    "is_owner": is_owner,
-                    "city_match": city_match,
-                    "order": order_counter,
+                    "stories_count": story.group_stories_count,
+                    "is_owner": bool(story.is_owner),
                     "open": {"type": "story", "service_id": service.id},
                 }
-            else:
-                data["city_match"] = data.get("city_match", False) or city_match
-                data["is_owner"] = data.get("is_owner", False) or is_owner
-            data["stories_count"] += 1
-            if not data.get("story_cover") and story.image:
-                data["story_cover"] = build_image_asset(
-                    story.image,
-                    entity="story",
-                    object_id=story.id,
-                    field_name="cover",
-                    preset_keys=("story_cover_1x", "story_cover_2x"),
-                )
-            items_map[service.id] = data
-
-        items = list(items_map.values())
-        items.sort(
-            key=lambda x: (
-                not x.get("is_owner", False),
-                not x.get("city_match", False),
-                x.get("order", 0),
             )
+        return StoriesRowItemSerializer(items, many=True).data
+
+    def _apply_story_views(self, payload: Dict[str, Any], request) -> Optional[List[int]]:
+        """Fill in has_unseen for the viewer; returns the services with unseen stories."""
+        viewer = self._story_viewer_q(request)
+        if viewer is None:
+            return None
+        items = [
+            item
+            for block in payload.get("blocks") or []
+            if block.get("type") == HomeBlockType.STORIES_ROW
+            for item in block.get("items") or []
+        ]
+        if not items:
+            return None
+
+        viewed_counts = dict(
+            ServiceStoryView.objects.filter(
+                viewer,
+                self._active_story_q("story__"),
+                story__service_id__in={item["service_id"] for item in items},
+            )
+            .values("story__service_id")
+            .annotate(viewed=Count("story_id", distinct=True))
+            .values_list("story__service_id", "viewed")
         )
         for item in items:
-            item.pop("city_match", None)
-            item.pop("order", None)
-        if block.limit:
-            items = items[: block.limit]
-        return StoriesRowItemSerializer(items, many=True).data
+            item["has_unseen"] = item.get("stories_count", 0) > viewed_counts.get(item["service_id"], 0)
+        return sorted({item["service_id"] for item in items if item["has_unseen"]})
+
+    @staticmethod
+    def _story_viewer_q(request) -> Optional[Q]:
+        user = getattr(request, "user", None)
+        if user and getattr(user, "is_authenticated", False):
+            return Q(user_id=user.id)
+        device = getattr(request, "device", None)
+        if device:
+            return Q(device_id=device.id, user__isnull=True)
+        return None
 
     def _build_banner_carousel(
         self, block: HomeBlock, city: Optional[City], region: Optional[Region], request
@@ -458,104 +715,188 @@ class HomeViewSet(viewsets.GenericViewSet):
         )
         return serializer.data, total_count, display_limit
 
-    def _build_service_block(
-        self, block: HomeBlock, city: Optional[City], region: Optional[Region], request
-    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
-        catalog_only = block.source_mode != HomeBlockSourceMode.MANUAL
-        include_images = block.type == HomeBlockType.SERVICE_CAROUSEL
-        include_tags = block.type == HomeBlockType.SERVICE_CAROUSEL
-        services_qs = self._base_service_queryset(
-            request.user,
-            catalog_only=catalog_only,
-            include_images=include_images,
-            include_tags=include_tags,
-        )
-        manual_order: Optional[List[int]] = None
-        pinned_ids: Optional[List[int]] = None
-        apply_location_filter = self._should_filter_by_location(block, request)
-        needs_distinct = False
-        manual_items = None
+    def _plan_service_blocks(
+        self, blocks: List[HomeBlock], city: Optional[City], region: Optional[Region], request
+    ) -> Dict[int, ServicePage]:
+        plans = {
+            block.id: self._plan_service_block(
+                block, city, region, request, self._should_filter_by_location(block, request)
+            )
+            for block in blocks
+            if block.type in SERVICE_BLOCK_TYPES
+        }
+        return self._fetch_planned_services(plans, request.user)
+
+    def _fetch_planned_services(self, plans: Dict[int, ServiceBlockPlan], user) -> Dict[int, ServicePage]:
+        service_ids = {sid for plan in plans.values() for sid in plan.ids}
+        services_map = {}
+        if service_ids:
+            services_map = {
+                service.id: service
+                for service in self._base_service_queryset(user).filter(id__in=service_ids)
+            }
+        planned: Dict[int, ServicePage] = {}
+        for block_id, plan in plans.items():
+            services = [services_map[sid] for sid in plan.ids if sid in services_map]
+            if plan.post_limit:
+                services = services[: plan.post_limit]
+            planned[block_id] = ServicePage(services, plan.next_after)
+        return planned
+
+    def _plan_service_block(
+        self,
+        block: HomeBlock,
+        city: Optional[City],
+        region: Optional[Region],
+        request,
+        apply_location_filter: bool,
+        after: Optional[Dict[str, Any]] = None,
+        size: Optional[int] = None,
+    ) -> ServiceBlockPlan:
+        """Plan one page of a service block.
+
+        The first page uses the block limit. Lists also report where the next
+        page starts, found by fetching one row past the page: the position of
+        the last manual item ("m"), the ordering values of the last service
+        ("k"), or an offset ("o") for orderings a keyset cannot express. `after`
+        is that state from the previous page.
+        """
+        size = size if size is not None else block.limit
+        paginate = block.type == HomeBlockType.SERVICE_LIST
+        manual_items: List[Tuple[int, int, int]] = []
         if block.source_mode in (HomeBlockSourceMode.MANUAL, HomeBlockSourceMode.PINNED_QUERY):
-            manual_items = list(block.manual_items.all())
-
-        if block.source_mode == HomeBlockSourceMode.MANUAL:
-            manual_order = [
-                item.object_id
-                for item in manual_items or []
+            manual_items = [
+                (item.position, item.id, item.object_id)
+                for item in block.manual_items.all()
                 if isinstance(item.content_object, Service)
             ]
-            services_qs = services_qs.filter(id__in=manual_order)
-        else:
-            params = block.query_params or {}
-            if block.source_mode == HomeBlockSourceMode.PINNED_QUERY:
-                pinned_ids = [
-                    item.object_id
-                    for item in manual_items or []
-                    if isinstance(item.content_object, Service)
-                ]
+        manual_ids = [service_id for _, _, service_id in manual_items]
 
-            category_ids = self._param_list(params, "category_ids", "categories")
-            tag_ids = self._param_list(params, "tag_ids", "tags")
-            city_ids = self._param_list(params, "city_ids", "cities")
-            region_ids = self._param_list(params, "region_ids", "regions")
-            explicit_ordering = params.get("ordering")
+        if block.source_mode == HomeBlockSourceMode.MANUAL:
+            if not paginate and not apply_location_filter:
+                return ServiceBlockPlan(manual_ids, post_limit=size)
+            services_qs = self._service_ids_queryset(request.user).filter(id__in=manual_ids)
+            if apply_location_filter:
+                services_qs = self._apply_service_location_filter(services_qs, city, region)
+            available = set(services_qs.values_list("id", flat=True))
+            items = [item for item in manual_items if item[2] in available]
+            if after and after.get("m"):
+                items = [item for item in items if list(item[:2]) > after["m"]]
+            if not size:
+                return ServiceBlockPlan([service_id for _, _, service_id in items])
+            page = items[:size]
+            has_more = paginate and len(items) > size
+            return ServiceBlockPlan(
+                [service_id for _, _, service_id in page],
+                next_after={"m": list(page[-1][:2])} if has_more else None,
+            )
 
-            if category_ids:
-                services_qs = services_qs.filter_by_category_ids(category_ids)
-                if len(category_ids) == 1 and not explicit_ordering:
-                    services_qs = services_qs.with_category_match_rank(category_ids[0])
-            if tag_ids:
-                services_qs = services_qs.filter(tags__id__in=tag_ids)
-                needs_distinct = True
-            if city_ids:
-                services_qs = services_qs.filter(Q(city_id__in=city_ids) | Q(available_cities__id__in=city_ids))
-                needs_distinct = True
-            if region_ids:
-                services_qs = services_qs.filter(
-                    Q(city__region_id__in=region_ids) | Q(available_cities__region_id__in=region_ids)
-                )
-                needs_distinct = True
+        params = block.query_params or {}
+        explicit_ordering = params.get("ordering")
+        services_qs = self._service_ids_queryset(request.user, explicit_ordering)
+
+        category_ids = self._param_list(params, "category_ids", "categories")
+        tag_ids = self._param_list(params, "tag_ids", "tags")
+        city_ids = self._param_list(params, "city_ids", "cities")
+        region_ids = self._param_list(params, "region_ids", "regions")
 
-            if explicit_ordering:
-                services_qs = services_qs.order_by(explicit_ordering)
+        if category_ids:
+            services_qs = services_qs.filter_by_category_ids(category_ids)
+            if len(category_ids) == 1 and not explicit_ordering:
+                services_qs = services_qs.with_category_match_rank(category_ids[0])
+        services_qs = services_qs.filter_by_tag_ids(tag_ids)
+        services_qs = services_qs.filter_by_city_ids(city_ids, include_main_city=True)
+        services_qs = services_qs.filter_by_region_ids(region_ids, include_main_city=True)
+
+        if explicit_ordering:
+            services_qs = services_qs.order_by(explicit_ordering)
 
         if apply_location_filter:
-            if city:
-                services_qs = services_qs.filter(Q(city=city) | Q(available_cities=city))
-                needs_distinct = True
-            elif region:
-                services_qs = services_qs.filter(Q(city__region=region) | Q(available_cities__region=region))
-                needs_distinct = True
-
-        if needs_distinct:
-            services_qs = services_qs.distinct()
-
-        services: List[Service]
-        if manual_order is not None:
-            services_map = {service.id: service for service in services_qs}
-            services = [services_map[sid] for sid in manual_order if sid in services_map]
-            if block.limit:
-                services = services[: block.limit]
-        elif pinned_ids is not None:
-            pinned_qs = services_qs.filter(id__in=pinned_ids)
-            pinned_map = {s.id: s for s in pinned_qs}
-            services = [pinned_map[sid] for sid in pinned_ids if sid in pinned_map]
-            if block.limit:
-                remaining = block.limit - len(services)
-                if remaining > 0:
-                    query_qs = services_qs.exclude(id__in=pinned_ids)[:remaining]
-                    services.extend(list(query_qs))
-            else:
-                query_qs = services_qs.exclude(id__in=pinned_ids)
-                services.extend(list(query_qs))
+            services_qs = self._apply_service_location_filter(services_qs, city, region)
+
+        pinned = block.source_mode == HomeBlockSourceMode.PINNED_QUERY and bool(manual_ids)
+        if pinned and after is not None:
+            # Every matching pin is on the first page; later pages hold the rest.
+            services_qs = services_qs.exclude(id__in=manual_ids)
+        ordering = keyset_ordering(services_qs)
+        offset = 0
+        if ordering is not None:
+            services_qs = services_qs.order_by(*keyset_order_by(ordering))
+            # The primary key ends every keyset ordering, so it is the last value of a row.
+            fields = [attname for _, _, attname in ordering]
+            if after and after.get("k") is not None:
+                try:
+                    services_qs = services_qs.filter(keyset_after(services_qs.model._meta, ordering, after["k"]))
+                except ValueError:
+                    raise ValidationError({"cursor": "Invalid cursor."})
         else:
-            services = list(services_qs[: block.limit])
+            fields = ["id"]
+            offset = after.get("o", 0) if after else 0
+
+        if pinned and after is None:
+            # Pinned services keep their manual order ahead of the query results.
+            pin_rank = Case(
+                *[When(id=sid, then=Value(index)) for index, sid in enumerate(manual_ids)],
+                default=Value(None),
+                output_field=IntegerField(),
+            )
+            services_qs = services_qs.annotate(pin_rank=pin_rank).order_by(
+                F("pin_rank").asc(nulls_last=True), *services_qs.query.order_by
+            )
+        rows_qs = services_qs.values_list(*fields)
+        if not size:
+            return ServiceBlockPlan([row[-1] for row in rows_qs[offset:]])
+
+        extra = 1 if paginate else 0
+        if not (pinned and after is None):
+            rows = list(rows_qs[offset : offset + size + extra])
+            has_more = len(rows) > size
+            page = rows[:size]
+            return ServiceBlockPlan(
+                [row[-1] for row in page],
+                next_after=self._next_after(ordering, page, offset) if has_more else None,
+            )
 
-        serializer_cls = (
-            ServiceCarouselSerializer
-            if block.type == HomeBlockType.SERVICE_CAROUSEL
-            else ServiceListSerializer
+        # All matching pins are kept even past the limit, the query only fills the
+        # rest. Later pages continue after the last unpinned service shown.
+        rows = list(rows_qs[: max(size, len(manual_ids)) + extra])
+        pinned_set = set(manual_ids)
+        pinned_rows = [row for row in rows if row[-1] in pinned_set]
+        rest = [row for row in rows if row[-1] not in pinned_set][: max(size - len(pinned_rows), 0)]
+        has_more = paginate and len(rows) > len(pinned_rows) + len(rest)
+        return ServiceBlockPlan(
+            [row[-1] for row in pinned_rows + rest],
+            next_after=self._next_after(ordering, rest, 0) if has_more else None,
         )
+
+    @staticmethod
+    def _next_after(ordering, page: List[Tuple[Any, ...]], offset: int) -> Dict[str, Any]:
+        if ordering is None:
+            return {"o": offset + len(page)}
+        return {"k": keyset_values(page[-1]) if page else None}
+
+    @staticmethod
+    def _apply_service_location_filter(services_qs, city: Optional[City], region: Optional[Region]):
+        if city:
+            return services_qs.filter_by_city_ids([city.id], include_main_city=True)
+        if region:
+            return services_qs.filter_by_region_ids([region.id], include_main_city=True)
+        return services_qs
+
+    def _build_service_block(
+        self,
+        block: HomeBlock,
+        city: Optional[City],
+        region: Optional[Region],
+        request,
+        services: List[Service],
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        apply_location_filter = self._should_filter_by_location(block, request)
+        if block.type == HomeBlockType.SERVICE_CAROUSEL:
+            serializer_cls = ServiceCarouselCardSerializer
+            services = [self._with_carousel_images(service) for service in services]
+        else:
+            serializer_cls = ServiceListCardSerializer
         serializer = serializer_cls(services, many=True, context={"request": request})
         items_data = list(serializer.data)
         self._inject_service_asset_fields(items_data, services)
@@ -565,6 +906,14 @@ class HomeViewSet(viewsets.GenericViewSet):
 
         return items_data, self._ensure_view_all_label(view_all)
 
+    @staticmethod
+    def _with_carousel_images(service: Service) -> Service:
+        # Carousels list images by id while covers use the model ordering, so the
+        # shared instance gets a per-block copy carrying its own image list.
+        service = copy(service)
+        service.prefetched_images = sorted(service.serviceimage_set.all(), key=lambda image: image.id)
+        return service
+
     @staticmethod
     def _service_image_fields(service: Service) -> List[Any]:
         images = getattr(service, "prefetched_images", None) or []
@@ -584,6 +933,10 @@ class HomeViewSet(viewsets.GenericViewSet):
         if getattr(service, "background", None):
             return service.background
         image_fields = cls._service_image_fields(service)
+        cover_path = getattr(service, "cover_image_path", None)
+        for image_field in image_fields:
+            if image_field.name == cover_path:
+                return image_field
         return image_fields[0] if image_fields else None
 
     @classmethod
@@ -641,46 +994,23 @@ class HomeViewSet(viewsets.GenericViewSet):
             return None
         return {"type": "search", "params": params}
 
+    @classmethod
+    def _service_ids_queryset(cls, user, ordering: Optional[str] = None):
+        if ordering and ordering.lstrip("-") in ANNOTATED_SERVICE_ORDERINGS:
+            return cls._base_service_queryset(user).prefetch_related(None)
+        return Service.objects.filter(is_active=True).order_by("priority", "-created_at")
+
     @staticmethod
-    def _base_service_queryset(
-        user,
-        catalog_only: bool = True,
-        include_images: bool = False,
-        include_tags: bool = True,
-    ):
+    def _base_service_queryset(user):
         blocked_user_ids = get_blocked_user_ids(user)
-        review_filter = Q(reviews__is_approved=True)
-        if blocked_user_ids:
-            review_filter &= ~Q(reviews__user_id__in=blocked_user_ids)
-
-        prefetches = ["tags"] if include_tags else []
-        prefetches.append("additional_categories")
-        if include_images:
-            prefetches.append(
-                Prefetch(
-                    "serviceimage_set",
-                    queryset=ServiceImage.objects.order_by("id"),
-                    to_attr="prefetched_images",
-                )
-            )
         qs = (
             Service.objects.filter(is_active=True)
             .select_related("category", "city__region")
-            .prefetch_related(*prefetches)
-            .annotate(
-                rating=Round(Avg("reviews__rating", filter=review_filter), 2),
-                reviews_count=Count("reviews", filter=review_filter),
-                cover_image_path=Subquery(
-                    ServiceImage.objects.filter(service_id=OuterRef("pk"))
-                    .order_by("id")
-                    .values("image")[:1]
-                ),
-            )
-            .defer("description_tm", "description_ru")
+            .prefetch_related("tags", "additional_categories", "serviceimage_set")
+            .annotate(**rating_annotations(blocked_user_ids))
+            .defer("description_tm", "description_ru", "search_vector", "search_text", "attribute_document")
             .order_by("priority", "-created_at")
         )
-        # if catalog_only:
-        #     qs = qs.filter(is_catalog=True)
         if user and getattr(user, "is_authenticated", False):
             qs = qs.annotate(
                 is_favorite=Exists(
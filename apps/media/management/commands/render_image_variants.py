@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.media.models import ImageVariant
+from core.image_assets import pending_variants_count, render_pending_variants
+
+
+class Command(BaseCommand):
+    help = "Render image variants queued in the ImageVariant manifest."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=0, help="Max variants to render per batch")
+        parser.add_argument("--retry-failed", action="store_true", help="Also retry variants that failed before")
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Queue every known variant again, e.g. after sources were overwritten in place.",
+        )
+        parser.add_argument("--loop", action="store_true", help="Keep polling the queue instead of exiting")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        limit = options.get("limit", 0)
+        retry_failed = options.get("retry_failed", False)
+        loop = options.get("loop", False)
+        interval = max(options.get("interval", 5.0), 0.1)
+
+        if options.get("reset"):
+            queued = ImageVariant.objects.exclude(status=ImageVariant.Status.PENDING).update(
+                status=ImageVariant.Status.PENDING
+            )
+            self.stdout.write(self.style.WARNING(f"Re-queued {queued} image variant(s)."))
+
+        while True:
+            self._render_batch(limit, retry_failed, quiet=loop)
+            if not loop:
+                return
+            time.sleep(interval)
+
+    def _render_batch(self, limit: int, retry_failed: bool, quiet: bool = False) -> None:
+        if not pending_variants_count(include_failed=retry_failed):
+            if not quiet:
+                self.stdout.write(self.style.WARNING("No pending image variants."))
+            return
+
+        rendered, failed = render_pending_variants(limit=limit, include_failed=retry_failed)
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} image variant(s)."))
+        if failed:
+            self.stdout.write(self.style.ERROR(f"Failed to render {failed} image variant(s)."))
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The table already exists, home.0007_move_imagevariant renamed it.
+
+    initial = True
+
+    dependencies = [
+        ('home', '0007_move_imagevariant'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ImageVariant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('source_name', models.CharField(max_length=500)),
+                        ('signature', models.CharField(max_length=32)),
+                        ('preset', models.CharField(max_length=64)),
+                        ('variant_name', models.CharField(max_length=500)),
+                        ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=16)),
+                        ('created_at', models.DateTimeField(auto_now_add=True)),
+                        ('updated_at', models.DateTimeField(auto_now=True)),
+                    ],
+                    options={
+                        'verbose_name': 'Image variant',
+                        'verbose_name_plural': 'Image variants',
+                        'indexes': [models.Index(fields=['status', 'id'], name='image_variant_status_idx')],
+                        'constraints': [models.UniqueConstraint(fields=('source_name', 'signature', 'preset'), name='image_variant_source_preset_uniq')],
+                    },
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagevariant',
+            name='source_field',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+    ]
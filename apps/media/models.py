@@ -0,0 +1,51 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class ImageSource(models.Model):
+    """Signature of an uploaded source, recorded when the file is saved."""
+
+    name = models.CharField(max_length=500, unique=True)
+    signature = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Image source")
+        verbose_name_plural = _("Image sources")
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class ImageVariant(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending", _("Pending")
+        READY = "ready", _("Ready")
+        FAILED = "failed", _("Failed")
+
+    source_name = models.CharField(max_length=500)
+    # "app_label.Model.field" of the source, so the renderer opens it through that field's storage.
+    source_field = models.CharField(max_length=200, blank=True, default="")
+    signature = models.CharField(max_length=32)
+    preset = models.CharField(max_length=64)
+    variant_name = models.CharField(max_length=500)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Image variant")
+        verbose_name_plural = _("Image variants")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source_name", "signature", "preset"],
+                name="image_variant_source_preset_uniq",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["status", "id"], name="image_variant_status_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return self.variant_name
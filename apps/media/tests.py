@@ -0,0 +1,120 @@
+import io
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase, override_settings
+
+from apps.banners.models import Banner
+from apps.media.models import ImageSource, ImageVariant
+from core.image_assets import (
+    build_image_asset,
+    collect_image_variants,
+    record_image_source,
+    render_pending_variants,
+)
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+
+@override_settings(IMAGE_VARIANT_RENDER_MODE="deferred", IMAGE_VARIANT_BACKGROUND_RENDER=False)
+class ImageVariantManifestTests(TestCase):
+    def setUp(self):
+        if Image is None:
+            self.skipTest("Pillow is not installed")
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        self.storage = FileSystemStorage(location=self.media_root, base_url="/media/")
+
+        name = self.storage.save("banners/source.png", ContentFile(self._png()))
+        self.field = SimpleNamespace(name=name, url=self.storage.url(name), storage=self.storage)
+
+    @staticmethod
+    def _png(color="red"):
+        buffer = io.BytesIO()
+        Image.new("RGB", (40, 30), color).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def _build(self, object_id=1):
+        return build_image_asset(
+            self.field,
+            entity="banner",
+            object_id=object_id,
+            field_name="image",
+            preset_keys=("banner_1x", "banner_2x"),
+        )
+
+    def test_miss_returns_original_and_queues_variants(self):
+        asset = self._build()
+
+        self.assertEqual(asset, {"original": "/media/banners/source.png", "variants": {}})
+        self.assertEqual(ImageVariant.objects.filter(status=ImageVariant.Status.PENDING).count(), 2)
+
+    def test_rendered_variants_resolve_without_storage_calls(self):
+        self._build()
+        self.assertEqual(render_pending_variants(storage=self.storage), (2, 0))
+
+        with patch.object(self.storage, "exists") as exists, patch.object(self.storage, "size") as size:
+            asset = self._build()
+
+        exists.assert_not_called()
+        size.assert_not_called()
+        self.assertEqual(list(asset["variants"]), ["banner_1x", "banner_2x"])
+        self.assertTrue(asset["variants"]["banner_1x"].endswith(".webp"))
+
+    def test_batch_resolves_all_assets_with_one_lookup(self):
+        self._build()
+        render_pending_variants(storage=self.storage)
+
+        with self.assertNumQueries(1):
+            with collect_image_variants():
+                assets = [self._build(object_id) for object_id in range(5)]
+
+        self.assertTrue(all(len(asset["variants"]) == 2 for asset in assets))
+
+    def test_renders_from_the_source_field_storage(self):
+        with patch.object(Banner._meta.get_field("image"), "storage", self.storage):
+            banner = Banner(image=self.field.name)
+            build_image_asset(
+                banner.image, entity="banner", object_id=1, field_name="image", preset_keys=("banner_1x",)
+            )
+
+            self.assertEqual(ImageVariant.objects.get().source_field, "banners.Banner.image")
+            self.assertEqual(render_pending_variants(), (1, 0))
+
+        variant = ImageVariant.objects.get()
+        self.assertEqual(variant.status, ImageVariant.Status.READY)
+        self.assertTrue(self.storage.exists(variant.variant_name))
+
+    def test_limit_caps_one_run(self):
+        self._build()
+
+        self.assertEqual(render_pending_variants(storage=self.storage, limit=1), (1, 0))
+        self.assertEqual(ImageVariant.objects.filter(status=ImageVariant.Status.PENDING).count(), 1)
+
+    def test_saving_a_source_records_its_signature(self):
+        with patch.object(Banner._meta.get_field("image"), "storage", self.storage):
+            banner = Banner()
+            banner.image.save("upload.png", ContentFile(self._png()), save=False)
+
+        self.assertEqual(banner.image.name, "banners/upload.webp")
+        self.assertTrue(ImageSource.objects.filter(name=banner.image.name).exists())
+
+    def test_source_saved_again_under_its_name_gets_new_variants(self):
+        record_image_source(self.field.name, 100)
+        self._build()
+        render_pending_variants(storage=self.storage)
+
+        record_image_source(self.field.name, 120)
+        with patch.object(self.storage, "size") as size:
+            asset = self._build()
+
+        size.assert_not_called()
+        self.assertEqual(asset["variants"], {})
+        self.assertEqual(ImageVariant.objects.filter(status=ImageVariant.Status.PENDING).count(), 2)
@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from apps.services.models import ProductAttributeValue, Service, ServiceAttributeValue
+
+# Document layout, keyed by attribute id:
+#   {"s": {"o": {"12": [34]}, "n": {"7": [3.5]}, "b": {"9": [true]}, "t": {"5": ["red"]}},
+#    "p": [<same shape per product>]}
+# "o" holds option ids, "n" numbers, "b" booleans and "t" lower-cased texts.
+OPTIONS = "o"
+NUMBERS = "n"
+BOOLEANS = "b"
+TEXTS = "t"
+
+VALUE_COLUMNS = ("attribute_id", "option_id", "value_text_tm", "value_text_ru", "value_number", "value_boolean")
+
+_pending_refresh: ContextVar[Optional[Set[int]]] = ContextVar("attribute_document_refresh", default=None)
+
+
+def normalize_text(value: Any) -> str:
+    return str(value).strip().lower()
+
+
+def _add_value(doc: Dict[str, Dict[str, List[Any]]], attribute_id, option_id, text_tm, text_ru, number, boolean):
+    key = str(attribute_id)
+    entries = []
+    if option_id is not None:
+        entries.append((OPTIONS, option_id))
+    if number is not None:
+        entries.append((NUMBERS, number))
+    if boolean is not None:
+        entries.append((BOOLEANS, boolean))
+    for text in (text_tm, text_ru):
+        if text and text.strip():
+            entries.append((TEXTS, normalize_text(text)))
+    for section, value in entries:
+        values = doc.setdefault(section, {}).setdefault(key, [])
+        if value not in values:
+            values.append(value)
+
+
+def _sorted(doc):
+    return {
+        section: {key: sorted(values) for key, values in sorted(by_attribute.items())}
+        for section, by_attribute in sorted(doc.items())
+    }
+
+
+def build_documents(service_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    service_ids = set(service_ids)
+    service_docs: Dict[int, dict] = {service_id: {} for service_id in service_ids}
+    for service_id, *values in ServiceAttributeValue.objects.filter(service_id__in=service_ids).values_list(
+        "service_id", *VALUE_COLUMNS
+    ):
+        _add_value(service_docs[service_id], *values)
+
+    product_docs: Dict[int, Dict[int, dict]] = {service_id: {} for service_id in service_ids}
+    for service_id, product_id, *values in (
+        ProductAttributeValue.objects.filter(product__service_id__in=service_ids)
+        .order_by("product_id")
+        .values_list("product__service_id", "product_id", *VALUE_COLUMNS)
+    ):
+        _add_value(product_docs[service_id].setdefault(product_id, {}), *values)
+
+    return {
+        service_id: {
+            "s": _sorted(service_docs[service_id]),
+            "p": [_sorted(doc) for _, doc in sorted(product_docs[service_id].items())],
+        }
+        for service_id in service_ids
+    }
+
+
+def refresh_attribute_documents(service_ids: Iterable[int]) -> None:
+    for service_id, document in build_documents(service_ids).items():
+        Service.objects.filter(pk=service_id).update(attribute_document=document)
+
+
+def schedule_refresh(service_ids: Iterable[int]) -> None:
+    service_ids = {service_id for service_id in service_ids if service_id}
+    pending = _pending_refresh.get()
+    if pending is None:
+        refresh_attribute_documents(service_ids)
+    else:
+        pending.update(service_ids)
+
+
+@contextmanager
+def deferred_refresh():
+    """Rebuild each touched service's document once when the block exits."""
+    if _pending_refresh.get() is not None:
+        yield
+        return
+    token = _pending_refresh.set(set())
+    try:
+        yield
+        pending = _pending_refresh.get()
+    finally:
+        _pending_refresh.reset(token)
+    refresh_attribute_documents(pending)
@@ -0,0 +1,197 @@
+"""Plain-function service cards.
+
+`ServiceListSerializer` and `ServiceCarouselSerializer` resolve ~25 fields
+through serializer dispatch, nested city/region serializers and repeated
+language lookups per row. The builders here produce the same payload with
+the language and request resolved once per list.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from core.fieldsets import FieldPlan
+from core.utils import SUPPORTED_LANGS, format_price_text, get_lang_code
+
+_MISSING = object()
+
+# Card fields read from each relation; views skip the join when none is wanted.
+CITY_FIELDS = ("city", "city_title", "region_title", "is_region_level")
+CATEGORY_FIELDS = ("category_title",)
+ADDITIONAL_CATEGORY_FIELDS = ("additional_categories", "categories")
+
+
+class CardContext(NamedTuple):
+    lang: str
+    # Suffix of the localized columns, as chosen by localized_value.
+    suffix: str
+    request: Any
+    user: Any
+    default_region_id: Optional[int]
+    plan: FieldPlan = FieldPlan()
+
+
+def card_context(context: Dict[str, Any]) -> CardContext:
+    """Resolve what LangMixin and FavoriteStatusMixin look up per field."""
+    request = context.get("request")
+    user = getattr(request, "user", None) if request else None
+    lang = context.get("lang") or get_lang_code(request)
+    return CardContext(
+        lang=lang,
+        suffix=lang if lang in SUPPORTED_LANGS else "tm",
+        request=request,
+        user=user if user and user.is_authenticated else None,
+        default_region_id=getattr(settings, "DEFAULT_REGION_ID", None),
+        plan=context.get("field_plan") or FieldPlan(),
+    )
+
+
+def _file_url(value, ctx: CardContext):
+    if not value:
+        return None
+    try:
+        url = value.url
+    except AttributeError:
+        return None
+    if ctx.request is not None:
+        return ctx.request.build_absolute_uri(url)
+    return url
+
+
+def _region(region, ctx: CardContext):
+    if region is None:
+        return None
+    return {
+        "id": region.id,
+        "name_tm": region.name_tm,
+        "name_ru": region.name_ru,
+        "name": getattr(region, f"name_{ctx.suffix}", None),
+        "is_default": bool(ctx.default_region_id and region.id == ctx.default_region_id),
+    }
+
+
+def _city(city, ctx: CardContext):
+    if city is None:
+        return None
+    return {
+        "id": city.id,
+        "name_tm": city.name_tm,
+        "name_ru": city.name_ru,
+        "name": getattr(city, f"name_{ctx.suffix}", None),
+        "is_region_level": bool(city.is_region_level),
+        "region": _region(city.region, ctx),
+    }
+
+
+def _is_favorite(service, ctx: CardContext) -> bool:
+    annotated = getattr(service, "is_favorite", None)
+    if annotated is not None:
+        return bool(annotated)
+    if ctx.user is not None:
+        return service.favorites.filter(user=ctx.user).exists()
+    return False
+
+
+def _images(service) -> List[Any]:
+    images = getattr(service, "prefetched_images", None) or []
+    if not images and hasattr(service, "serviceimage_set"):
+        images = service.serviceimage_set.all()
+    return images
+
+
+def _cover_url(service):
+    if service.avatar:
+        return service.avatar.url
+    if service.background:
+        return service.background.url
+    cover_image_path = getattr(service, "cover_image_path", None) or getattr(service, "cover_image", None)
+    if cover_image_path:
+        if hasattr(cover_image_path, "url"):
+            return cover_image_path.url
+        try:
+            return default_storage.url(cover_image_path)
+        except Exception:
+            return None
+    images = getattr(service, "prefetched_images", None) or []
+    first_image = images[0] if images else None
+    if not first_image and hasattr(service, "serviceimage_set"):
+        first_image = service.serviceimage_set.all().first()
+    return first_image.image.url if first_image and getattr(first_image, "image", None) else None
+
+
+def _base_card(service, ctx: CardContext) -> Dict[str, Any]:
+    lang = ctx.suffix
+    # Relations of pruned fields are not loaded, see CITY_FIELDS.
+    city = service.city if ctx.plan.wants_any(CITY_FIELDS) else None
+    region = city.region if city is not None else None
+    category = service.category if ctx.plan.wants_any(CATEGORY_FIELDS) else None
+    additional_ids = (
+        [item.id for item in service.additional_categories.all()]
+        if ctx.plan.wants_any(ADDITIONAL_CATEGORY_FIELDS)
+        else []
+    )
+    reviews_count = getattr(service, "reviews_count", _MISSING)
+    rating = getattr(service, "rating", _MISSING)
+    work_experience_years = service.work_experience_years
+    discount_text = service.discount_text
+    address = (service.address or "").strip()
+
+    card = {
+        "id": service.id,
+        "category": service.category_id,
+        "primary_category": service.category_id,
+        "additional_categories": additional_ids,
+        "categories": [service.category_id, *additional_ids],
+        "city": _city(city, ctx),
+        "avatar": _file_url(service.avatar, ctx),
+        "title_tm": service.title_tm,
+        "title_ru": service.title_ru,
+        "title": getattr(service, f"title_{lang}", None),
+        "is_favorite": _is_favorite(service, ctx),
+    }
+    # Read-only serializer fields skip attributes the queryset did not annotate.
+    if reviews_count is not _MISSING:
+        card["reviews_count"] = int(reviews_count) if reviews_count is not None else None
+    card["is_verified"] = bool(service.is_verified)
+    card["is_vip"] = bool(service.is_vip)
+    card["city_title"] = getattr(city, f"name_{lang}", None) if city is not None else None
+    card["region_title"] = getattr(region, f"name_{lang}", None) if region is not None else None
+    card["category_title"] = getattr(category, f"name_{lang}", None) if category is not None else None
+    card["price_text"] = format_price_text(service.price_min, service.price_max, lang=ctx.lang)
+    if rating is not _MISSING:
+        card["rating"] = float(rating) if rating is not None else None
+    card["has_discount"] = bool(discount_text)
+    card["discount_text"] = discount_text
+    card["work_experience_years"] = int(work_experience_years) if work_experience_years is not None else None
+    card["is_region_level"] = bool(city is not None and city.is_region_level)
+    card["has_location"] = bool(address) or (service.latitude is not None and service.longitude is not None)
+    card["show_location"] = bool(service.show_location)
+    card["cover_url"] = _cover_url(service)
+    return card
+
+
+def service_list_card(service, ctx: CardContext) -> Dict[str, Any]:
+    """Same payload as ServiceListSerializer."""
+    card = _base_card(service, ctx)
+    card["open"] = {"type": "service", "service_id": service.id}
+    return card
+
+
+def service_nearby_card(service, ctx: CardContext) -> Dict[str, Any]:
+    """ServiceListSerializer payload plus `distance` in km."""
+    card = service_list_card(service, ctx)
+    distance = getattr(service, "distance", None)
+    card["distance"] = round(distance, 3) if distance is not None else None
+    return card
+
+
+def service_carousel_card(service, ctx: CardContext) -> Dict[str, Any]:
+    """Same payload as ServiceCarouselSerializer."""
+    card = _base_card(service, ctx)
+    tag_name = f"name_{ctx.suffix}"
+    card["tags"] = [name for name in (getattr(tag, tag_name, None) for tag in service.tags.all()) if name]
+    card["images"] = [
+        image.image.url for image in _images(service) if image.image and getattr(image.image, "url", None)
+    ]
+    card["open"] = {"type": "service", "service_id": service.id}
+    return card
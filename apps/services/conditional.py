@@ -0,0 +1,130 @@
+"""ETag validators for service and product detail.
+
+Validators are read without building the detail. The change markers that
+have timestamps (service, products, videos, rating stats) come with the
+viewer overlay query; the detail cache version tokens, which signals bump for
+every child row, cover those without one (images, contacts, attribute
+values). The ETag also covers the viewer's overlay, the language and the
+query string.
+
+No Last-Modified is sent: the timestamps alone miss untimestamped child rows
+and the viewer overlay, so an If-Modified-Since check would answer 304 for
+stale content. For the same reason no ETag is sent unless the cache is shared
+by all workers: on a per-process cache a worker that did not handle a child
+row change keeps its old version token.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Iterable, NamedTuple, Optional
+
+from django.conf import settings
+from django.db.models import BooleanField, Exists, F, OuterRef, Subquery, Value
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from apps.services import detail_cache
+from apps.services.models import Favorite, ServiceProduct, ServiceVideo
+from core.utils import get_lang_code
+
+
+class Validators(NamedTuple):
+    etag: str
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, "CACHE_IS_SHARED", False))
+
+
+def _latest(model, field: str):
+    return Subquery(
+        model.objects.filter(service_id=OuterRef("pk"))
+        .order_by(F(field).desc(nulls_last=True))
+        .values(field)[:1]
+    )
+
+
+def _validators(request, markers: Iterable[Optional[datetime]], parts: Iterable[Any]) -> Validators:
+    markers = list(markers)
+    representation = [
+        request.scheme,
+        request.get_host(),
+        get_lang_code(request),
+        sorted(request.query_params.lists()),
+        [marker.isoformat() if marker else None for marker in markers],
+        *parts,
+    ]
+    digest = hashlib.sha256(json.dumps(representation, default=str).encode("utf-8")).hexdigest()[:32]
+    return Validators(f'"{digest}"')
+
+
+def service_markers():
+    """Expressions to read with `detail_cache.user_overlay` for `service_validators`."""
+    if not is_enabled():
+        return {}
+    return {
+        "updated_marker": F("updated_at"),
+        "products_marker": _latest(ServiceProduct, "updated_at"),
+        "videos_marker": _latest(ServiceVideo, "hls_updated_at"),
+        "rating_stats_marker": F("rating_stats__updated_at"),
+    }
+
+
+def service_validators(service_id, overlay: detail_cache.Overlay, request) -> Optional[Validators]:
+    """Validators for the service detail, or None when they cannot be trusted."""
+    if not is_enabled():
+        return None
+    return _validators(
+        request,
+        overlay.markers.values(),
+        [
+            detail_cache.version_tokens(service_id),
+            overlay.fields,
+            sorted(overlay.favorite_product_ids),
+        ],
+    )
+
+
+def product_validators(product_id, service_id, request) -> Optional[Validators]:
+    """Validators for an active service's product, or None when it is not there
+    or they cannot be trusted."""
+    if not is_enabled():
+        return None
+    user = getattr(request, "user", None)
+    if user is not None and getattr(user, "is_authenticated", False):
+        is_favorite = Exists(Favorite.objects.filter(user=user, product=OuterRef("pk")))
+    else:
+        is_favorite = Value(False, output_field=BooleanField())
+    products = ServiceProduct.objects.filter(service__is_active=True)
+    try:
+        products = products.filter(pk=product_id)
+        if service_id is not None:
+            products = products.filter(service_id=service_id)
+    except (TypeError, ValueError):
+        return None
+    row = (
+        products.annotate(is_favorite_marker=is_favorite)
+        .values_list("service_id", "updated_at", "service__updated_at", "is_favorite_marker")
+        .first()
+    )
+    if row is None:
+        return None
+    service_id, updated_at, service_updated_at, is_favorite = row
+    return _validators(
+        request,
+        [updated_at, service_updated_at],
+        [detail_cache.version_tokens(service_id), bool(is_favorite)],
+    )
+
+
+def not_modified(request, validators: Validators):
+    """A 304 response when the client's ETag still matches, else None."""
+    response = get_conditional_response(request, etag=validators.etag)
+    if response is not None:
+        apply_validators(response, validators)
+    return response
+
+
+def apply_validators(response, validators: Validators):
+    response["ETag"] = validators.etag
+    patch_vary_headers(response, ("Accept-Language", "Authorization"))
+    return response
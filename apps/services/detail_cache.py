@@ -0,0 +1,142 @@
+"""Serialized service detail cached per (service, language).
+
+The cached payload is the same for every viewer. `is_favorite` (service and
+products) and the rating/count adjusted for the viewer's blocked users are
+read by `user_overlay` and applied on top with `apply_overlay`.
+
+Entries are looked up under version tokens: one per service, bumped when the
+service or any of its child rows change, and one shared token for rows many
+services render (categories, tags, cities, attributes, contact types).
+"""
+import hashlib
+import uuid
+from typing import Any, Dict, FrozenSet, Iterable, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from rest_framework.generics import get_object_or_404
+
+from apps.services.models import Favorite, Service
+from apps.services.rating_stats import rating_annotations
+
+DETAIL_KEY_PREFIX = "services:detail"
+SHARED_VERSION_KEY = "services:detail:version"
+
+
+def is_enabled() -> bool:
+    # Version bumps on a per-process cache would leave other workers serving stale details.
+    return bool(getattr(settings, "SERVICE_DETAIL_CACHE_ENABLED", True)) and bool(
+        getattr(settings, "CACHE_IS_SHARED", False)
+    )
+
+
+def _ttl() -> int:
+    return max(int(getattr(settings, "SERVICE_DETAIL_CACHE_TTL_SECONDS", 300)), 1)
+
+
+def _version_key(service_id) -> str:
+    return f"{DETAIL_KEY_PREFIX}:version:{service_id}"
+
+
+def _versions(service_id) -> Dict[str, str]:
+    keys = [SHARED_VERSION_KEY, _version_key(service_id)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            token = uuid.uuid4().hex
+            if not cache.add(key, token, timeout=None):
+                token = cache.get(key) or token
+            versions[key] = token
+    return versions
+
+
+def version_tokens(service_id) -> Tuple[str, str]:
+    """(shared, per-service) tokens; both change whenever a cached detail would."""
+    versions = _versions(service_id)
+    return versions[SHARED_VERSION_KEY], versions[_version_key(service_id)]
+
+
+def _detail_key(service_id, lang: str, request) -> str:
+    # Image fields render absolute URLs, so the host is part of the payload.
+    raw = "|".join([request.scheme, request.get_host(), *version_tokens(service_id)])
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+    return f"{DETAIL_KEY_PREFIX}:{service_id}:{lang}:{digest}"
+
+
+def get_detail(service_id, lang: str, request):
+    """Return (cached payload or None, key to store a fresh payload under)."""
+    key = _detail_key(service_id, lang, request)
+    return cache.get(key), key
+
+
+def store_detail(key: str, payload: Dict[str, Any]) -> None:
+    cache.set(key, payload, timeout=_ttl())
+
+
+class Overlay(NamedTuple):
+    fields: Dict[str, Any]
+    favorite_product_ids: FrozenSet[int]
+    # Values of the `markers` expressions passed to user_overlay.
+    markers: Dict[str, Any] = {}
+
+
+def user_overlay(service_id, user, blocked_user_ids: Iterable[int] = (), markers=None) -> Overlay:
+    """Viewer-specific detail fields. Raises Http404 for missing or inactive services.
+
+    `markers` maps names to expressions read in the same query.
+    """
+    markers = markers or {}
+    authenticated = user is not None and getattr(user, "is_authenticated", False)
+    if authenticated:
+        is_favorite = Exists(Favorite.objects.filter(user=user, service=OuterRef("pk")))
+    else:
+        is_favorite = Value(False, output_field=BooleanField())
+    queryset = (
+        Service.objects.filter(is_active=True)
+        .annotate(**rating_annotations(blocked_user_ids), is_favorite=is_favorite, **markers)
+        .values("id", "is_favorite", "rating", "reviews_count", *markers)
+    )
+    row = get_object_or_404(queryset, pk=service_id)
+
+    favorite_product_ids = frozenset()
+    if authenticated:
+        favorite_product_ids = frozenset(
+            Favorite.objects.filter(user=user, product__service_id=row["id"]).values_list("product_id", flat=True)
+        )
+    fields = {
+        "is_favorite": bool(row["is_favorite"]),
+        "reviews_count": int(row["reviews_count"]) if row["reviews_count"] is not None else None,
+        "rating": float(row["rating"]) if row["rating"] is not None else None,
+    }
+    return Overlay(fields, favorite_product_ids, {name: row[name] for name in markers})
+
+
+def apply_overlay(payload: Dict[str, Any], overlay: Overlay) -> Dict[str, Any]:
+    result = {**payload, **overlay.fields}
+    if payload.get("products"):
+        result["products"] = [
+            {**product, "is_favorite": product["id"] in overlay.favorite_product_ids}
+            for product in payload["products"]
+        ]
+    return result
+
+
+def _bump(keys) -> None:
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def invalidate(service_ids: Iterable[Optional[int]]) -> None:
+    keys = [_version_key(service_id) for service_id in set(service_ids) if service_id]
+    if not keys:
+        return
+    # Bump now for readers inside the transaction and again after commit, so a
+    # payload built from pre-commit rows in between does not outlive it.
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_all() -> None:
+    _bump([SHARED_VERSION_KEY])
+    transaction.on_commit(lambda: _bump([SHARED_VERSION_KEY]))
@@ -0,0 +1,119 @@
+from typing import Any, Dict, Iterable, List
+
+from django.db.models import Count, F
+
+from apps.services.models import (
+    CategoryAttribute,
+    ProductAttributeValue,
+    Service,
+    ServiceAttributeValue,
+)
+
+OPTION_INPUT_TYPES = ("choice", "multiselect")
+
+
+def _counts(rows) -> List[Dict[str, int]]:
+    return [{"id": key, "count": count} for key, count in rows if key is not None and count]
+
+
+def _sorted_counts(counts: Dict[int, int]) -> List[Dict[str, int]]:
+    return [{"id": key, "count": count} for key, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))]
+
+
+def _grouped(queryset, key: str, counted: str):
+    return (
+        queryset.order_by()
+        .values_list(key)
+        .annotate(count=Count(counted, distinct=True))
+        .order_by("-count", key)
+    )
+
+
+def _category_counts(service_ids) -> List[Dict[str, int]]:
+    counts: Dict[int, int] = dict(
+        _grouped(Service.objects.filter(pk__in=service_ids), "category_id", "pk")
+    )
+    # A service listed under its own category again must not count twice.
+    additional = Service.additional_categories.through.objects.filter(service_id__in=service_ids).exclude(
+        category_id=F("service__category_id")
+    )
+    for category_id, count in _grouped(additional, "category_id", "service_id"):
+        counts[category_id] = counts.get(category_id, 0) + count
+    return _sorted_counts(counts)
+
+
+def _attribute_facets(option_rows, attribute_links) -> List[Dict[str, Any]]:
+    counts_by_attribute: Dict[int, List[Dict[str, Any]]] = {}
+    for attribute_id, option_id, option_value, count in option_rows:
+        counts_by_attribute.setdefault(attribute_id, []).append(
+            {"id": option_id, "value": option_value, "count": count}
+        )
+
+    facets = []
+    for attribute_id, slug in attribute_links:
+        options = counts_by_attribute.get(attribute_id)
+        if options:
+            facets.append({"id": attribute_id, "slug": slug, "options": options})
+    return facets
+
+
+def _filterable_attributes(scope: str, category_ids: Iterable[int]):
+    links = CategoryAttribute.objects.filter(
+        scope=scope,
+        is_filterable=True,
+        attribute__is_active=True,
+        attribute__input_type__in=OPTION_INPUT_TYPES,
+    )
+    if category_ids:
+        links = links.filter(category_id__in=category_ids)
+    attributes = {}
+    for attribute_id, slug in links.order_by("filter_order", "attribute_id").values_list(
+        "attribute_id", "attribute__slug"
+    ):
+        attributes.setdefault(attribute_id, slug)
+    return list(attributes.items())
+
+
+def _option_rows(values, counted: str, attribute_ids):
+    return (
+        values.filter(attribute_id__in=attribute_ids, option__is_active=True)
+        .order_by()
+        .values_list("attribute_id", "option_id", "option__value", "option__sort_order")
+        .annotate(count=Count(counted, distinct=True))
+        .order_by("attribute_id", "option__sort_order", "option_id")
+        .values_list("attribute_id", "option_id", "option__value", "count")
+    )
+
+
+def compute_facets(services, category_ids: Iterable[int] = ()) -> Dict[str, Any]:
+    """Count `services` per category, city, region, tag and attribute option.
+
+    Every facet is one grouped query over the filtered service ids, so the
+    number of queries does not grow with the number of facet values.
+    """
+    service_ids = services.order_by().values("pk")
+    cities = Service.available_cities.through.objects.filter(service_id__in=service_ids)
+    tags = Service.tags.through.objects.filter(service_id__in=service_ids)
+
+    service_links = _filterable_attributes(CategoryAttribute.Scope.SERVICE, category_ids)
+    product_links = _filterable_attributes(CategoryAttribute.Scope.PRODUCT, category_ids)
+    service_options = _option_rows(
+        ServiceAttributeValue.objects.filter(service_id__in=service_ids),
+        "service_id",
+        [attribute_id for attribute_id, _ in service_links],
+    ) if service_links else []
+    product_options = _option_rows(
+        ProductAttributeValue.objects.filter(product__service_id__in=service_ids),
+        "product__service_id",
+        [attribute_id for attribute_id, _ in product_links],
+    ) if product_links else []
+
+    return {
+        "total": services.order_by().count(),
+        "categories": _category_counts(service_ids),
+        "cities": _counts(_grouped(cities, "city_id", "service_id")),
+        "regions": _counts(_grouped(cities, "city__region_id", "service_id")),
+        "tags": _counts(_grouped(tags, "servicetag_id", "service_id")),
+        "service_attributes": _attribute_facets(service_options, service_links),
+        "product_attributes": _attribute_facets(product_options, product_links),
+    }
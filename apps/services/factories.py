@@ -0,0 +1,29 @@
+"""Fixtures shared by the service and home test suites."""
+from apps.categories.models import Category
+from apps.services.models import Service
+from apps.users.models import RoleEnum, User
+
+
+class ServiceFixtureMixin:
+    """Creates `self.vendor` and `self.category`; `create_service` builds active services on them."""
+
+    vendor_phone = "+99361000100"
+    category_name = ("Toý", "Той")
+
+    def setUp(self):
+        super().setUp()
+        self.vendor = User.objects.create_user(phone=self.vendor_phone, password="pass123", role=RoleEnum.VENDOR)
+        self.category = Category.objects.create(name_tm=self.category_name[0], name_ru=self.category_name[1])
+
+    def create_service(self, title_tm="Hyzmat", title_ru=None, **fields) -> Service:
+        fields = {
+            "vendor": self.vendor,
+            "category": self.category,
+            "title_tm": title_tm,
+            "title_ru": title_ru or title_tm,
+            "description_tm": "Desc",
+            "description_ru": "Desc",
+            "is_active": True,
+            **fields,
+        }
+        return Service.objects.create(**fields)
@@ -1,7 +1,21 @@
-from django.db.models import Exists, OuterRef, Q
+import json
+import math
+
+from django.db import connections
+from django.db.models import BooleanField, Exists, F, Func, OuterRef, Q, Value
+from django.db.models.functions import Lower, Trim
+from django.db.models.lookups import Exact
 from django_filters.rest_framework import FilterSet, filters
 
-from apps.services.models import Attribute, Service, ServiceAttributeValue, ServiceProduct
+from apps.services import attribute_document
+from apps.services.models import (
+    Attribute,
+    AttributeOption,
+    Service,
+    ServiceAttributeValue,
+    ServiceProduct,
+    ServiceTag,
+)
 
 
 class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
@@ -137,10 +151,12 @@ def _option_filter_q(field_prefix, values):
 
 
 def _text_filter_q(field_prefix, values):
+    # Same match as the attribute document: trimmed, lower-cased and exact.
     query = Q()
     for value in values:
-        query |= Q(**{f"{field_prefix}value_text_tm__iexact": value})
-        query |= Q(**{f"{field_prefix}value_text_ru__iexact": value})
+        normalized = attribute_document.normalize_text(value)
+        for column in ("value_text_tm", "value_text_ru"):
+            query |= Q(Exact(Lower(Trim(f"{field_prefix}{column}")), normalized))
     return query
 
 
@@ -181,29 +197,136 @@ def _apply_attribute_condition(queryset, field_prefix, attribute, spec):
     return queryset.none()
 
 
+class JSONPathMatch(Func):
+    """`document @@ path`, answerable from a jsonb_path_ops GIN index."""
+
+    output_field = BooleanField()
+
+    def __init__(self, document, path):
+        super().__init__(F(document), Value(path))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        document, document_params = compiler.compile(self.source_expressions[0])
+        path, path_params = compiler.compile(self.source_expressions[1])
+        return f"({document} @@ ({path})::jsonpath)", (*document_params, *path_params)
+
+
+def _jsonpath_literal(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _resolve_option_ids(conditions):
+    option_conditions = [(spec, attribute) for spec, attribute in conditions if attribute.supports_options]
+    if not option_conditions:
+        return {}
+
+    lookup = Q()
+    for spec, attribute in option_conditions:
+        lookup |= Q(attribute_id=attribute.id) & (
+            Q(value__in=spec["values"]) | Q(id__in=parse_int_list(spec["values"]))
+        )
+    options = list(AttributeOption.objects.filter(lookup).values_list("id", "attribute_id", "value"))
+
+    resolved = {}
+    for spec, attribute in option_conditions:
+        wanted_ids = set(parse_int_list(spec["values"]))
+        wanted_values = set(spec["values"])
+        resolved[(attribute.id, tuple(spec["values"]))] = sorted(
+            option_id
+            for option_id, attribute_id, value in options
+            if attribute_id == attribute.id and (option_id in wanted_ids or value in wanted_values)
+        )
+    return resolved
+
+
+def _attribute_path(base, attribute, spec, option_ids):
+    """Compile one filter into a jsonpath predicate, or None when nothing can match."""
+    input_type = attribute.input_type
+    operator = spec["operator"]
+    values = spec["values"]
+    comparison = "=="
+
+    if input_type in {"choice", "multiselect"}:
+        section = attribute_document.OPTIONS
+        candidates = option_ids.get((attribute.id, tuple(values)), [])
+    elif input_type == "text":
+        section = attribute_document.TEXTS
+        candidates = [attribute_document.normalize_text(value) for value in values]
+    elif input_type == "boolean":
+        section = attribute_document.BOOLEANS
+        boolean_value = _parse_bool(values[-1])
+        candidates = [] if boolean_value is None else [boolean_value]
+    elif input_type == "number":
+        section = attribute_document.NUMBERS
+        candidates = [value for value in parse_float_list(values) if math.isfinite(value)]
+        if operator in {"min", "max"}:
+            comparison = ">=" if operator == "min" else "<="
+            candidates = candidates[:1]
+    else:
+        return None
+
+    if operator != "exact" and input_type != "number":
+        return None
+    if not candidates:
+        return None
+
+    accessor = f"{base}.{section}.{json.dumps(str(attribute.id))}[*]"
+    return "(" + " || ".join(f"{accessor} {comparison} {_jsonpath_literal(value)}" for value in candidates) + ")"
+
+
+def _apply_attribute_document_filter(queryset, service_conditions, product_conditions):
+    option_ids = _resolve_option_ids([*service_conditions, *product_conditions])
+    predicates = []
+    for spec, attribute in service_conditions:
+        path = _attribute_path("$.s", attribute, spec, option_ids)
+        if path is None:
+            return queryset.none()
+        predicates.append(path)
+
+    if product_conditions:
+        product_predicates = []
+        for spec, attribute in product_conditions:
+            path = _attribute_path("@", attribute, spec, option_ids)
+            if path is None:
+                return queryset.none()
+            product_predicates.append(path)
+        predicates.append(f"exists($.p[*] ? ({' && '.join(product_predicates)}))")
+
+    if not predicates:
+        return queryset
+    return queryset.filter(JSONPathMatch("attribute_document", " && ".join(predicates)))
+
+
 def apply_attribute_filters(queryset, query_params):
     service_specs = _parse_attribute_filter_specs(query_params, SERVICE_ATTRIBUTE_FILTER_PREFIX)
     product_specs = _parse_attribute_filter_specs(query_params, PRODUCT_ATTRIBUTE_FILTER_PREFIX)
     resolved_attributes = _resolve_attributes([*service_specs, *product_specs])
 
-    for spec in service_specs:
-        attribute = resolved_attributes.get(spec["attribute_key"])
-        if attribute is None:
-            continue
+    service_conditions = [
+        (spec, resolved_attributes[spec["attribute_key"]])
+        for spec in service_specs
+        if spec["attribute_key"] in resolved_attributes
+    ]
+    product_conditions = [
+        (spec, resolved_attributes[spec["attribute_key"]])
+        for spec in product_specs
+        if spec["attribute_key"] in resolved_attributes
+    ]
+    if connections[queryset.db].vendor == "postgresql":
+        return _apply_attribute_document_filter(queryset, service_conditions, product_conditions)
+
+    for spec, attribute in service_conditions:
         matching_values = ServiceAttributeValue.objects.filter(service_id=OuterRef("pk"))
         matching_values = _apply_attribute_condition(matching_values, "", attribute, spec)
         queryset = queryset.filter(Exists(matching_values))
 
-    resolved_product_specs = []
-    for spec in product_specs:
-        attribute = resolved_attributes.get(spec["attribute_key"])
-        if attribute is None:
-            continue
-        resolved_product_specs.append((spec, attribute))
-
-    if resolved_product_specs:
+    if product_conditions:
         matching_products = ServiceProduct.objects.filter(service_id=OuterRef("pk"))
-        for spec, attribute in resolved_product_specs:
+        for spec, attribute in product_conditions:
             matching_products = _apply_attribute_condition(matching_products, "values__", attribute, spec)
         queryset = queryset.filter(Exists(matching_products))
 
@@ -211,16 +334,26 @@ def apply_attribute_filters(queryset, query_params):
 
 
 class ServiceFilter(FilterSet):
-    region = NumberInFilter(field_name="available_cities__region", lookup_expr="in")
-    city = NumberInFilter(field_name="available_cities", lookup_expr="in")
+    region = NumberInFilter(method="filter_region")
+    city = NumberInFilter(method="filter_city")
     category = filters.CharFilter(method="filter_category")
+    tags = filters.ModelMultipleChoiceFilter(queryset=ServiceTag.objects.all(), method="filter_tags")
 
     main_city = filters.NumberFilter(field_name="city")
 
+    def filter_region(self, queryset, name, value):
+        return queryset.filter_by_region_ids(parse_int_list(value))
+
+    def filter_city(self, queryset, name, value):
+        return queryset.filter_by_city_ids(parse_int_list(value))
+
     def filter_category(self, queryset, name, value):
         category_ids = parse_int_list(value)
         return queryset.filter_by_category_ids(category_ids)
 
+    def filter_tags(self, queryset, name, value):
+        return queryset.filter_by_tag_ids([tag.pk for tag in value])
+
     class Meta:
         model = Service
         fields = ['category', 'is_active', 'tags', 'region', 'city', 'main_city']
@@ -0,0 +1,52 @@
+"""Great-circle distance helpers for service coordinates.
+
+`bounding_box` gives the latitude/longitude ranges that contain a circle, so
+the `service_lat_lng_idx` btree can discard far rows before the exact
+haversine distance is computed for the rest.
+"""
+import math
+from typing import NamedTuple, Optional
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class BoundingBox(NamedTuple):
+    min_lat: float
+    max_lat: float
+    # None when the box wraps the antimeridian or covers a pole.
+    min_lng: Optional[float]
+    max_lng: Optional[float]
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> BoundingBox:
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - lat_delta, lat + lat_delta
+    if min_lat <= -90 or max_lat >= 90:
+        return BoundingBox(max(min_lat, -90.0), min(max_lat, 90.0), None, None)
+    # Widest longitude span is at the latitude edge closest to a pole.
+    lng_delta = lat_delta / math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    min_lng, max_lng = lng - lng_delta, lng + lng_delta
+    if min_lng < -180 or max_lng > 180:
+        return BoundingBox(min_lat, max_lat, None, None)
+    return BoundingBox(min_lat, max_lat, min_lng, max_lng)
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    d_lat = math.radians(lat2 - lat1)
+    d_lng = math.radians(lng2 - lng1)
+    a = math.sin(d_lat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_expression(lat: float, lng: float, lat_field: str = "latitude", lng_field: str = "longitude"):
+    """Distance in km from (lat, lng) to the row's coordinates."""
+    d_lat = Radians(F(lat_field) - Value(lat)) / Value(2.0)
+    d_lng = Radians(F(lng_field) - Value(lng)) / Value(2.0)
+    a = Power(Sin(d_lat), 2) + Value(math.cos(math.radians(lat))) * Cos(Radians(F(lat_field))) * Power(
+        Sin(d_lng), 2
+    )
+    # Rounding can push sqrt(a) just past 1, outside the domain of asin.
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Least(Sqrt(a), Value(1.0)), output_field=FloatField())
@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.services import detail_cache
+from apps.services.models import ServiceImage, ServiceVideo, read_image_size
+
+
+class Command(BaseCommand):
+    help = "Store width, height and aspect ratio for service images and video previews missing them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Files read from storage in parallel")
+        parser.add_argument("--batch-size", type=int, default=200, help="Rows measured and written per batch")
+        parser.add_argument("--force", action="store_true", help="Measure rows that already have dimensions")
+
+    def handle(self, *args, **options):
+        workers = max(options["workers"], 1)
+        batch_size = max(options["batch_size"], 1)
+        force = options["force"]
+
+        images = ServiceImage.objects.exclude(Q(image__isnull=True) | Q(image=""))
+        videos = ServiceVideo.objects.exclude(Q(preview__isnull=True) | Q(preview=""))
+        if not force:
+            images = images.filter(width__isnull=True)
+            videos = videos.filter(preview_width__isnull=True)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media-dimensions") as executor:
+            image_stats = self._backfill(
+                executor, images.only("id", "service_id", "image", "aspect_ratio"), "image", batch_size
+            )
+            video_stats = self._backfill(
+                executor, videos.only("id", "service_id", "preview"), "preview", batch_size
+            )
+
+        for label, (measured, failed) in (("images", image_stats), ("video previews", video_stats)):
+            self.stdout.write(self.style.SUCCESS(f"Measured {measured} {label}."))
+            if failed:
+                self.stdout.write(self.style.WARNING(f"Could not read {failed} {label}."))
+
+    def _backfill(self, executor, queryset, file_field, batch_size):
+        measured = failed = 0
+        ids = list(queryset.order_by("id").values_list("id", flat=True))
+        for start in range(0, len(ids), batch_size):
+            rows = list(queryset.filter(id__in=ids[start:start + batch_size]))
+            # Only storage reads run in the pool; the rows are written here.
+            sizes = executor.map(lambda row: read_image_size(getattr(row, file_field)), rows)
+            updated = []
+            for row, (width, height) in zip(rows, sizes):
+                if width is None:
+                    failed += 1
+                    continue
+                row.set_dimensions(width, height)
+                updated.append(row)
+            if updated:
+                model = type(updated[0])
+                model.objects.bulk_update(updated, fields=list(model.dimensions_fields))
+                detail_cache.invalidate(row.service_id for row in updated)
+            measured += len(updated)
+        return measured, failed
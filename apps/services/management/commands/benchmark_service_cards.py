@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from apps.services.models import Service
+from apps.services.rating_stats import rating_annotations
+from apps.services.serializers import (
+    ServiceCarouselCardSerializer,
+    ServiceCarouselSerializer,
+    ServiceListCardSerializer,
+    ServiceListSerializer,
+)
+
+SERIALIZER_PAIRS = {
+    "list": (ServiceListSerializer, ServiceListCardSerializer),
+    "carousel": (ServiceCarouselSerializer, ServiceCarouselCardSerializer),
+}
+
+
+class Command(BaseCommand):
+    help = "Time the DRF service card serializers against the plain-function cards on stored services."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100, help="Services per serialized page")
+        parser.add_argument("--repeat", type=int, default=50, help="Timed runs per serializer")
+        parser.add_argument("--lang", default="tm", help="Language of the simulated request")
+
+    def handle(self, *args, **options):
+        services = list(
+            Service.objects.filter(is_active=True)
+            .select_related("vendor", "category", "city", "city__region")
+            .prefetch_related("additional_categories", "tags", "serviceimage_set")
+            .annotate(**rating_annotations())
+            .defer("description_tm", "description_ru", "search_vector", "search_text", "attribute_document")
+            .order_by("priority", "-created_at")[: options["limit"]]
+        )
+        if not services:
+            self.stdout.write(self.style.WARNING("No active services to serialize."))
+            return
+
+        request = RequestFactory().get("/api/v1/services/", {"lang": options["lang"]})
+        context = {"request": request}
+        repeat = max(options["repeat"], 1)
+        renderer = JSONRenderer()
+
+        for name, (reference, fast) in SERIALIZER_PAIRS.items():
+            expected = renderer.render(reference(services, many=True, context=context).data)
+            actual = renderer.render(fast(services, many=True, context=context).data)
+            if actual != expected:
+                self.stdout.write(self.style.ERROR(f"{name}: fast cards differ from {reference.__name__}"))
+                continue
+
+            timings = {}
+            for serializer_class in (reference, fast):
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    serializer_class(services, many=True, context=context).data
+                timings[serializer_class] = (time.perf_counter() - started) / repeat
+
+            reference_ms = timings[reference] * 1000
+            fast_ms = timings[fast] * 1000
+            speedup = timings[reference] / timings[fast] if timings[fast] else float("inf")
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{name}: {len(services)} cards, output identical; "
+                    f"DRF {reference_ms:.2f} ms, cards {fast_ms:.2f} ms, {speedup:.1f}x faster"
+                )
+            )
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from apps.services import rating_stats
+from apps.services.models import ServiceRatingStats
+
+
+class Command(BaseCommand):
+    help = "Recompute per-service rating stats from approved reviews and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--id", type=int, action="append", dest="service_ids", help="Only check this service id")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing")
+
+    def handle(self, *args, **options):
+        service_ids = options.get("service_ids")
+        dry_run = options.get("dry_run", False)
+
+        expected = rating_stats.compute_stats(service_ids)
+        stored_qs = ServiceRatingStats.objects.all()
+        if service_ids:
+            stored_qs = stored_qs.filter(service_id__in=service_ids)
+        stored = {
+            service_id: (rating_sum, rating_count, rating_avg)
+            for service_id, rating_sum, rating_count, rating_avg in stored_qs.values_list(
+                "service_id", "rating_sum", "rating_count", "rating_avg"
+            )
+        }
+
+        drifted = []
+        for service_id in sorted(set(expected) | set(stored)):
+            rating_sum, rating_count = expected.get(service_id, (0, 0))
+            current = stored.get(service_id, (0, 0, None))
+            if current != (rating_sum, rating_count, rating_stats.rating_average(rating_sum, rating_count)):
+                drifted.append(service_id)
+                self.stdout.write(
+                    f"Service #{service_id}: stored sum={current[0]} count={current[1]}, "
+                    f"expected sum={rating_sum} count={rating_count}"
+                )
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Rating stats are consistent."))
+            return
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"{len(drifted)} service(s) drifted, nothing written."))
+            return
+        rating_stats.refresh(drifted)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled rating stats for {len(drifted)} service(s)."))
@@ -0,0 +1,81 @@
+"""Grid clustering of geolocated services for the map.
+
+The grid is anchored at (-90, -180) so a service stays in the same cell while
+the viewport pans. Cells are square in degrees, `cells_per_tile` across one
+slippy-map tile at the requested zoom; that is coarser than Web Mercator
+near the poles but even at this country's latitudes.
+"""
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.db.models import Avg, Count, F, Min, Q, Value
+from django.db.models.functions import Floor
+
+from apps.services.geo import BoundingBox
+from apps.services.models import Service
+from core.utils import SUPPORTED_LANGS
+
+
+def cell_size(zoom: int) -> float:
+    cells_per_tile = max(int(getattr(settings, "SERVICE_MAP_CLUSTER_CELLS_PER_TILE", 4)), 1)
+    return 360.0 / (2 ** zoom) / cells_per_tile
+
+
+def _in_box(queryset, box: BoundingBox):
+    queryset = queryset.filter(latitude__gte=box.min_lat, latitude__lte=box.max_lat, longitude__isnull=False)
+    if box.min_lng <= box.max_lng:
+        return queryset.filter(longitude__gte=box.min_lng, longitude__lte=box.max_lng)
+    # The viewport crosses the antimeridian.
+    return queryset.filter(Q(longitude__gte=box.min_lng) | Q(longitude__lte=box.max_lng))
+
+
+def _pins(queryset, lang: str) -> List[Dict[str, Any]]:
+    suffix = lang if lang in SUPPORTED_LANGS else "tm"
+    rows = queryset.values("id", f"title_{suffix}", "latitude", "longitude", "category_id")
+    return [
+        {
+            "id": row["id"],
+            "title": row[f"title_{suffix}"],
+            "latitude": row["latitude"],
+            "longitude": row["longitude"],
+            "category": row["category_id"],
+        }
+        for row in rows
+    ]
+
+
+def compute_map(services, box: BoundingBox, zoom: int, lang: str) -> Dict[str, Any]:
+    """Clusters and pins for `services` inside `box`.
+
+    From SERVICE_MAP_PIN_ZOOM up every service is a pin. Below it each grid
+    cell is one GROUP BY row; cells holding a single service become pins.
+    """
+    in_view = _in_box(Service.objects.filter(pk__in=services.order_by().values("pk")), box)
+    max_pins = max(int(getattr(settings, "SERVICE_MAP_MAX_PINS", 500)), 0)
+
+    if zoom >= int(getattr(settings, "SERVICE_MAP_PIN_ZOOM", 15)):
+        return {"clusters": [], "pins": _pins(in_view.order_by("priority", "-created_at")[:max_pins], lang)}
+
+    size = cell_size(zoom)
+    cells = (
+        in_view.order_by()
+        .annotate(
+            cell_x=Floor((F("longitude") + Value(180.0)) / Value(size)),
+            cell_y=Floor((F("latitude") + Value(90.0)) / Value(size)),
+        )
+        .values("cell_x", "cell_y")
+        .annotate(count=Count("id"), lat=Avg("latitude"), lng=Avg("longitude"), service_id=Min("id"))
+        .order_by("-count", "cell_x", "cell_y")
+    )
+    clusters = []
+    single_ids = []
+    for cell in cells:
+        if cell["count"] == 1:
+            single_ids.append(cell["service_id"])
+        else:
+            clusters.append({"latitude": cell["lat"], "longitude": cell["lng"], "count": cell["count"]})
+    pins = []
+    if single_ids:
+        singles = Service.objects.filter(pk__in=single_ids[:max_pins]).order_by("priority", "-created_at")
+        pins = _pins(singles, lang)
+    return {"clusters": clusters, "pins": pins}
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:01
+
+from decimal import ROUND_HALF_UP, Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Review = apps.get_model("services", "Review")
+    ServiceRatingStats = apps.get_model("services", "ServiceRatingStats")
+    rows = (
+        Review.objects.filter(is_approved=True)
+        .order_by()
+        .values("service_id")
+        .annotate(rating_sum=Sum("rating"), rating_count=Count("id"))
+    )
+    ServiceRatingStats.objects.bulk_create(
+        [
+            ServiceRatingStats(
+                service_id=row["service_id"],
+                rating_sum=row["rating_sum"] or 0,
+                rating_count=row["rating_count"],
+                rating_avg=(Decimal(row["rating_sum"] or 0) / row["rating_count"]).quantize(
+                    Decimal("0.01"), rounding=ROUND_HALF_UP
+                ),
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0035_reviewreport_moderator_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceRatingStats',
+            fields=[
+                ('service', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to='services.service', verbose_name='Service')),
+                ('rating_sum', models.PositiveIntegerField(default=0, verbose_name='Rating Sum')),
+                ('rating_count', models.PositiveIntegerField(default=0, verbose_name='Rating Count')),
+                ('rating_avg', models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True, verbose_name='Average Rating')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Service Rating Stats',
+                'verbose_name_plural': 'Service Rating Stats',
+            },
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:03
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Q, Subquery
+
+
+def backfill_cover_image_path(apps, schema_editor):
+    Service = apps.get_model("services", "Service")
+    ServiceImage = apps.get_model("services", "ServiceImage")
+    Service.objects.update(
+        cover_image_path=Subquery(
+            ServiceImage.objects.filter(service_id=OuterRef("pk"))
+            .exclude(Q(image__isnull=True) | Q(image=""))
+            .order_by("position", "id")
+            .values("image")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0036_servicerating_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='cover_image_path',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True, verbose_name='Cover Image'),
+        ),
+        migrations.RunPython(backfill_cover_image_path, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:08
+
+import html
+
+import django.contrib.postgres.search
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models import TextField, Value
+from django.utils.html import strip_tags
+
+# GIN indexes only exist on PostgreSQL, so they are created here rather than
+# declared on the model, which would break table rebuilds on other backends.
+SEARCH_INDEXES = [
+    GinIndex(fields=["search_vector"], name="service_search_vector_gin"),
+    GinIndex(fields=["search_text"], name="service_search_trgm_gin", opclasses=["gin_trgm_ops"]),
+]
+
+
+def add_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Service = apps.get_model("services", "Service")
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(Service, index)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Service = apps.get_model("services", "Service")
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(Service, index)
+
+
+# Historical copy of apps.services.search.document_texts as of this migration,
+# kept here so later changes to the live module never rewrite this backfill.
+def _document_texts(titles, keywords, descriptions):
+    def join(parts):
+        return " ".join(part.strip() for part in parts if part and part.strip())
+
+    title = join(titles)
+    keywords = join(keywords)
+    body = join(html.unescape(strip_tags(text or "")) for text in descriptions)
+    return title, keywords, body, join([title, keywords]).lower()
+
+
+def backfill_search_documents(apps, schema_editor):
+    Service = apps.get_model("services", "Service")
+    full_text = schema_editor.connection.vendor == "postgresql"
+    services = Service.objects.select_related("category").prefetch_related("tags", "additional_categories")
+    for service in services.iterator(chunk_size=500):
+        keywords = []
+        for item in [*service.tags.all(), service.category, *service.additional_categories.all()]:
+            if item is not None:
+                keywords.extend([item.name_tm, item.name_ru])
+        title, keywords, body, search_text = _document_texts(
+            [service.title_tm, service.title_ru], keywords, [service.description_tm, service.description_ru]
+        )
+        fields = {"search_text": search_text}
+        if full_text:
+            fields["search_vector"] = (
+                SearchVector(Value(title, output_field=TextField()), weight="A", config="simple")
+                + SearchVector(Value(keywords, output_field=TextField()), weight="B", config="simple")
+                + SearchVector(Value(body, output_field=TextField()), weight="C", config="simple")
+            )
+        Service.objects.filter(pk=service.pk).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0037_service_cover_image_path'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='service',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:15
+
+from django.contrib.postgres.indexes import GinIndex
+from django.db import migrations, models
+
+# PostgreSQL only, see 0038_service_search_document.
+ATTRIBUTE_DOCUMENT_INDEX = GinIndex(
+    fields=["attribute_document"],
+    name="service_attr_document_gin",
+    opclasses=["jsonb_path_ops"],
+)
+VALUE_COLUMNS = ("attribute_id", "option_id", "value_text_tm", "value_text_ru", "value_number", "value_boolean")
+
+
+def add_attribute_document_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.add_index(apps.get_model("services", "Service"), ATTRIBUTE_DOCUMENT_INDEX)
+
+
+def remove_attribute_document_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.remove_index(apps.get_model("services", "Service"), ATTRIBUTE_DOCUMENT_INDEX)
+
+
+# Historical copy of apps.services.attribute_document as of this migration, kept
+# here so later changes to the live module never rewrite this backfill.
+def _document(rows):
+    doc = {}
+    for attribute_id, option_id, text_tm, text_ru, number, boolean in rows:
+        entries = []
+        if option_id is not None:
+            entries.append(("o", option_id))
+        if number is not None:
+            entries.append(("n", number))
+        if boolean is not None:
+            entries.append(("b", boolean))
+        for text in (text_tm, text_ru):
+            if text and text.strip():
+                entries.append(("t", text.strip().lower()))
+        for section, value in entries:
+            values = doc.setdefault(section, {}).setdefault(str(attribute_id), [])
+            if value not in values:
+                values.append(value)
+    return {
+        section: {key: sorted(values) for key, values in sorted(by_attribute.items())}
+        for section, by_attribute in sorted(doc.items())
+    }
+
+
+def backfill_attribute_documents(apps, schema_editor):
+    Service = apps.get_model("services", "Service")
+    ServiceAttributeValue = apps.get_model("services", "ServiceAttributeValue")
+    ProductAttributeValue = apps.get_model("services", "ProductAttributeValue")
+
+    service_rows = {}
+    for service_id, *values in ServiceAttributeValue.objects.values_list("service_id", *VALUE_COLUMNS).iterator():
+        service_rows.setdefault(service_id, []).append(values)
+    product_rows = {}
+    for service_id, product_id, *values in ProductAttributeValue.objects.values_list(
+        "product__service_id", "product_id", *VALUE_COLUMNS
+    ).iterator():
+        product_rows.setdefault(service_id, {}).setdefault(product_id, []).append(values)
+
+    for service_id in set(service_rows) | set(product_rows):
+        Service.objects.filter(pk=service_id).update(
+            attribute_document={
+                "s": _document(service_rows.get(service_id, [])),
+                "p": [_document(rows) for _, rows in sorted(product_rows.get(service_id, {}).items())],
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0038_service_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='attribute_document',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(add_attribute_document_index, remove_attribute_document_index),
+        migrations.RunPython(backfill_attribute_documents, migrations.RunPython.noop),
+    ]
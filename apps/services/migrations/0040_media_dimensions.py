@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0039_service_attribute_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceimage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Height'),
+        ),
+        migrations.AddField(
+            model_name='serviceimage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Width'),
+        ),
+        migrations.AddField(
+            model_name='servicevideo',
+            name='preview_aspect_ratio',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Preview aspect ratio'),
+        ),
+        migrations.AddField(
+            model_name='servicevideo',
+            name='preview_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Preview height'),
+        ),
+        migrations.AddField(
+            model_name='servicevideo',
+            name='preview_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Preview width'),
+        ),
+    ]
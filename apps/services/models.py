@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import FileExtensionValidator
 from django.core.files.storage import default_storage
 from django.db import models
@@ -6,6 +7,7 @@ from django.utils import translation
 from django.utils.translation import gettext_lazy as _
 from apps.categories.models import Category
 from apps.regions.models import Region, City
+from apps.services.geo import bounding_box, haversine_expression
 from apps.services.validators import validate_file_size
 from apps.users.models import User
 from core.fields import WebPImageField
@@ -16,12 +18,54 @@ from slugify import slugify
 
 
 class ServiceQuerySet(models.QuerySet):
+    # Many-to-many filters are EXISTS semi-joins: a join would repeat services
+    # matching several ids and need a DISTINCT over the annotated rows.
     def filter_by_category_ids(self, category_ids):
         if not category_ids:
             return self
+        additional = Service.additional_categories.through.objects.filter(
+            service_id=models.OuterRef("pk"), category_id__in=category_ids
+        )
+        return self.filter(Q(category_id__in=category_ids) | models.Exists(additional))
+
+    def filter_by_city_ids(self, city_ids, include_main_city=False):
+        if not city_ids:
+            return self
+        available = models.Exists(
+            Service.available_cities.through.objects.filter(service_id=models.OuterRef("pk"), city_id__in=city_ids)
+        )
+        if include_main_city:
+            return self.filter(Q(city_id__in=city_ids) | available)
+        return self.filter(available)
+
+    def filter_by_region_ids(self, region_ids, include_main_city=False):
+        if not region_ids:
+            return self
+        available = models.Exists(
+            Service.available_cities.through.objects.filter(
+                service_id=models.OuterRef("pk"), city__region_id__in=region_ids
+            )
+        )
+        if include_main_city:
+            return self.filter(Q(city__region_id__in=region_ids) | available)
+        return self.filter(available)
+
+    def filter_by_tag_ids(self, tag_ids):
+        if not tag_ids:
+            return self
         return self.filter(
-            Q(category_id__in=category_ids) | Q(additional_categories__id__in=category_ids)
-        ).distinct()
+            models.Exists(
+                Service.tags.through.objects.filter(service_id=models.OuterRef("pk"), servicetag_id__in=tag_ids)
+            )
+        )
+
+    def within_radius(self, lat, lng, radius_km):
+        """Services within `radius_km` of (lat, lng), annotated with `distance` in km."""
+        box = bounding_box(lat, lng, radius_km)
+        qs = self.filter(latitude__gte=box.min_lat, latitude__lte=box.max_lat, longitude__isnull=False)
+        if box.min_lng is not None:
+            qs = qs.filter(longitude__gte=box.min_lng, longitude__lte=box.max_lng)
+        return qs.annotate(distance=haversine_expression(lat, lng)).filter(distance__lte=radius_km)
 
     def with_category_match_rank(self, category_id):
         if not category_id:
@@ -34,6 +78,17 @@ class ServiceQuerySet(models.QuerySet):
             )
         ).order_by("category_match_rank", "priority", "-created_at")
 
+    def refresh_cover_images(self):
+        """Point each service at its first image in gallery order."""
+        return self.update(
+            cover_image_path=models.Subquery(
+                ServiceImage.objects.filter(service_id=models.OuterRef("pk"))
+                .exclude(Q(image__isnull=True) | Q(image=""))
+                .order_by("position", "id")
+                .values("image")[:1]
+            )
+        )
+
 
 class Service(models.Model):
     vendor = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("Vendor"))
@@ -77,6 +132,13 @@ class Service(models.Model):
     latitude = models.FloatField(null=True, blank=True, verbose_name=_("Latitude"))
     longitude = models.FloatField(null=True, blank=True, verbose_name=_("Longitude"))
     background = WebPImageField(upload_to="services/backgrounds", verbose_name=_("Background"), null=True)
+    cover_image_path = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_("Cover Image"),
+    )
     is_grid_gallery = models.BooleanField(default=False, verbose_name=_("Display images as grid"))
 
     is_active = models.BooleanField(default=False, verbose_name=_("Is Active"))
@@ -90,6 +152,12 @@ class Service(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
 
+    # Maintained by apps.services.search; GIN indexed on PostgreSQL only.
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    search_text = models.TextField(blank=True, default="", editable=False)
+    # Maintained by apps.services.attribute_document for attribute filters.
+    attribute_document = models.JSONField(default=dict, blank=True, editable=False)
+
     class Meta:
         verbose_name = _("Service")
         verbose_name_plural = _("Services")
@@ -98,6 +166,7 @@ class Service(models.Model):
             models.Index(fields=["is_active", "priority", "created_at"], name="service_active_order_idx"),
             models.Index(fields=["category", "is_active"], name="service_category_active_idx"),
             models.Index(fields=["city", "is_active"], name="service_city_active_idx"),
+            models.Index(fields=["latitude", "longitude"], name="service_lat_lng_idx"),
         ]
 
     objects = ServiceQuerySet.as_manager()
@@ -152,11 +221,91 @@ class ServiceContact(models.Model):
         return f"{self.type.slug}: {self.value}"
 
 
-class ServiceImage(models.Model):
+def read_image_size(field_file) -> tuple[int | None, int | None]:
+    if not field_file:
+        return None, None
+    try:
+        from PIL import Image
+    except Exception:
+        return None, None
+    try:
+        field_file.open()
+        with Image.open(field_file) as img:
+            return img.size
+    except Exception:
+        return None, None
+    finally:
+        try:
+            if getattr(field_file, "_committed", True):
+                field_file.close()
+            else:
+                # A pending upload is still to be written to storage.
+                field_file.seek(0)
+        except Exception:
+            pass
+
+
+def image_aspect_ratio(width: int | None, height: int | None) -> float | None:
+    if not width or not height:
+        return None
+    return round(width / height, 3)
+
+
+class MediaDimensionsMixin:
+    """Measures an image field when its file changes, so reads never open it.
+
+    Subclasses name the file field in `dimensions_source` and, in
+    `dimensions_fields`, the width and height columns followed by an optional
+    aspect ratio column.
+    """
+
+    dimensions_source = ""
+    dimensions_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._measured_name = instance.__dict__.get(cls.dimensions_source)
+        return instance
+
+    def set_dimensions(self, width: int | None, height: int | None) -> None:
+        width_field, height_field, *ratio_field = self.dimensions_fields
+        setattr(self, width_field, width)
+        setattr(self, height_field, height)
+        if ratio_field:
+            setattr(self, ratio_field[0], image_aspect_ratio(width, height))
+
+    def _dimensions_stale(self) -> bool:
+        field_file = getattr(self, self.dimensions_source)
+        name = field_file.name if field_file else None
+        measured = getattr(self, "_measured_name", None)
+        width_field = self.dimensions_fields[0]
+        return name != measured or (bool(name) and getattr(self, width_field) is None)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        saves_source = update_fields is None or self.dimensions_source in update_fields
+        if saves_source and self._dimensions_stale():
+            width, height = read_image_size(getattr(self, self.dimensions_source))
+            self.set_dimensions(width, height)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, *self.dimensions_fields}
+        super().save(*args, **kwargs)
+        if saves_source:
+            field_file = getattr(self, self.dimensions_source)
+            self._measured_name = field_file.name if field_file else None
+
+
+class ServiceImage(MediaDimensionsMixin, models.Model):
     service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name=_("Service"))
     image = WebPImageField(upload_to="services/images", verbose_name=_("Image"), null=True)
     position = models.PositiveIntegerField(default=100, verbose_name=_("Position"))
     aspect_ratio = models.FloatField(null=True, blank=True, verbose_name=_("Aspect Ratio"))
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name=_("Width"))
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name=_("Height"))
+
+    dimensions_source = "image"
+    dimensions_fields = ("width", "height", "aspect_ratio")
 
     class Meta:
         verbose_name = _("Service Image")
@@ -166,43 +315,20 @@ class ServiceImage(models.Model):
     def __str__(self):
         return self.service.title_tm
 
-    def _calculate_aspect_ratio(self) -> float | None:
-        if not self.image:
-            return None
-        try:
-            from PIL import Image
-        except Exception:
-            return None
-        try:
-            self.image.open()
-            with Image.open(self.image) as img:
-                width, height = img.size
-        except Exception:
-            return None
-        if not height:
-            return None
-        return round(width / height, 3)
+    def set_dimensions(self, width, height):
+        # The ratio can also be entered by hand; keep it when the file cannot be measured.
+        entered_ratio = self.aspect_ratio
+        super().set_dimensions(width, height)
+        if self.aspect_ratio is None and self.image:
+            self.aspect_ratio = entered_ratio
 
-    def get_or_set_aspect_ratio(self) -> float | None:
+    def get_aspect_ratio(self) -> float | None:
         if self.aspect_ratio:
             return round(self.aspect_ratio, 3)
-        ratio = self._calculate_aspect_ratio()
-        if ratio is None:
-            return None
-        self.aspect_ratio = ratio
-        if self.pk:
-            ServiceImage.objects.filter(pk=self.pk).update(aspect_ratio=ratio)
-        return ratio
-
-    def save(self, *args, **kwargs):
-        if self.image and not self.aspect_ratio:
-            ratio = self._calculate_aspect_ratio()
-            if ratio is not None:
-                self.aspect_ratio = ratio
-        super().save(*args, **kwargs)
+        return image_aspect_ratio(self.width, self.height)
 
 
-class ServiceVideo(models.Model):
+class ServiceVideo(MediaDimensionsMixin, models.Model):
     service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name=_("Service"))
     position = models.PositiveIntegerField(default=100, verbose_name=_("Position"))
     file = models.FileField(
@@ -226,7 +352,16 @@ class ServiceVideo(models.Model):
     hls_ready = models.BooleanField(default=False, verbose_name=_("HLS ready"))
     hls_error = models.TextField(blank=True, default="", verbose_name=_("HLS error"))
     hls_updated_at = models.DateTimeField(null=True, blank=True, verbose_name=_("HLS updated at"))
+    preview_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name=_("Preview width"))
+    preview_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, verbose_name=_("Preview height")
+    )
+    preview_aspect_ratio = models.FloatField(
+        null=True, blank=True, editable=False, verbose_name=_("Preview aspect ratio")
+    )
 
+    dimensions_source = "preview"
+    dimensions_fields = ("preview_width", "preview_height", "preview_aspect_ratio")
 
     class Meta:
         verbose_name = _("Service Video")
@@ -264,6 +399,29 @@ class Review(models.Model):
         return f"{self.user} – {self.rating}★"
 
 
+class ServiceRatingStats(models.Model):
+    service = models.OneToOneField(
+        Service,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rating_stats",
+        verbose_name=_("Service"),
+    )
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name=_("Rating Sum"))
+    rating_count = models.PositiveIntegerField(default=0, verbose_name=_("Rating Count"))
+    rating_avg = models.DecimalField(
+        max_digits=3, decimal_places=2, null=True, blank=True, verbose_name=_("Average Rating")
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    class Meta:
+        verbose_name = _("Service Rating Stats")
+        verbose_name_plural = _("Service Rating Stats")
+
+    def __str__(self):
+        return f"{self.service_id}: {self.rating_avg} ({self.rating_count})"
+
+
 class ReviewReport(models.Model):
     class Status(models.TextChoices):
         PENDING = "pending", _("Pending")
@@ -0,0 +1,123 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+from apps.services.models import Review, ServiceRatingStats
+
+# (rating sum, review count) a review adds to its service.
+Contribution = Tuple[int, int]
+
+
+def rating_average(rating_sum: int, rating_count: int) -> Optional[Decimal]:
+    if not rating_count:
+        return None
+    return (Decimal(rating_sum) / rating_count).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def review_contribution(service_id: Optional[int], rating: Optional[int], is_approved: bool) -> Dict[int, Contribution]:
+    if not service_id or not is_approved or rating is None:
+        return {}
+    return {service_id: (int(rating), 1)}
+
+
+def apply_delta(service_id: int, rating_delta: int, count_delta: int) -> None:
+    """Shift the stats of one service, locking its row so concurrent reviews add up."""
+    if not rating_delta and not count_delta:
+        return
+    with transaction.atomic():
+        stats = ServiceRatingStats.objects.select_for_update().filter(service_id=service_id).first()
+        if stats is None:
+            if count_delta < 0:
+                # Nothing recorded to subtract from, e.g. the service is being deleted.
+                return
+            stats, _ = ServiceRatingStats.objects.select_for_update().get_or_create(service_id=service_id)
+        stats.rating_sum = max(stats.rating_sum + rating_delta, 0)
+        stats.rating_count = max(stats.rating_count + count_delta, 0)
+        stats.rating_avg = rating_average(stats.rating_sum, stats.rating_count)
+        stats.save()
+
+
+def apply_change(before: Dict[int, Contribution], after: Dict[int, Contribution]) -> None:
+    for service_id in sorted(set(before) | set(after)):
+        old_sum, old_count = before.get(service_id, (0, 0))
+        new_sum, new_count = after.get(service_id, (0, 0))
+        apply_delta(service_id, new_sum - old_sum, new_count - old_count)
+
+
+def compute_stats(service_ids: Optional[Iterable[int]] = None) -> Dict[int, Contribution]:
+    reviews = Review.objects.filter(is_approved=True)
+    if service_ids is not None:
+        reviews = reviews.filter(service_id__in=list(service_ids))
+    rows = reviews.values("service_id").annotate(rating_sum=Sum("rating"), rating_count=Count("id"))
+    return {row["service_id"]: (row["rating_sum"] or 0, row["rating_count"]) for row in rows}
+
+
+def refresh(service_ids: Iterable[int]) -> None:
+    """Recompute the stats of the given services from their reviews."""
+    service_ids = sorted(set(service_ids))
+    if not service_ids:
+        return
+    computed = compute_stats(service_ids)
+    with transaction.atomic():
+        existing = set(
+            ServiceRatingStats.objects.select_for_update()
+            .filter(service_id__in=service_ids)
+            .values_list("service_id", flat=True)
+        )
+        for service_id in service_ids:
+            rating_sum, rating_count = computed.get(service_id, (0, 0))
+            if service_id not in existing and not rating_count:
+                continue
+            ServiceRatingStats.objects.update_or_create(
+                service_id=service_id,
+                defaults={
+                    "rating_sum": rating_sum,
+                    "rating_count": rating_count,
+                    "rating_avg": rating_average(rating_sum, rating_count),
+                },
+            )
+
+
+def rating_annotations(blocked_user_ids: Iterable[int] = (), prefix: str = "") -> Dict[str, object]:
+    """Rating and review count read from the stats row.
+
+    Reviews by users the viewer blocked are subtracted with a lookup limited to
+    those users, so the common case never touches the reviews table.
+    """
+    rating_sum = Coalesce(F(f"{prefix}rating_stats__rating_sum"), Value(0))
+    rating_count = Coalesce(F(f"{prefix}rating_stats__rating_count"), Value(0))
+    blocked_user_ids = list(blocked_user_ids)
+    if not blocked_user_ids:
+        return {
+            "rating": F(f"{prefix}rating_stats__rating_avg"),
+            "reviews_count": rating_count,
+        }
+
+    blocked_reviews = (
+        Review.objects.filter(
+            service_id=OuterRef(f"{prefix}pk"),
+            is_approved=True,
+            user_id__in=blocked_user_ids,
+        )
+        .order_by()
+        .values("service_id")
+    )
+    blocked_sum = Coalesce(
+        Subquery(blocked_reviews.annotate(total=Sum("rating")).values("total"), output_field=IntegerField()),
+        Value(0),
+    )
+    blocked_count = Coalesce(
+        Subquery(blocked_reviews.annotate(total=Count("id")).values("total"), output_field=IntegerField()),
+        Value(0),
+    )
+    visible_count = rating_count - blocked_count
+    return {
+        "rating": Round(
+            Cast(rating_sum - blocked_sum, FloatField()) / NullIf(visible_count, Value(0)),
+            2,
+        ),
+        "reviews_count": visible_count,
+    }
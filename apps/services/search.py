@@ -0,0 +1,94 @@
+import html
+from typing import Dict, Iterable
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, Q, TextField, Value
+from django.utils.html import strip_tags
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+
+from apps.services.models import Service
+
+# Turkmen has no text search configuration, so both languages share "simple".
+SEARCH_CONFIG = "simple"
+
+
+def supports_full_text(using: str = "default") -> bool:
+    return connections[using].vendor == "postgresql"
+
+
+def _join(parts: Iterable[str]) -> str:
+    return " ".join(part.strip() for part in parts if part and part.strip())
+
+
+def document_texts(titles: Iterable[str], keywords: Iterable[str], descriptions: Iterable[str]) -> Dict[str, str]:
+    return {
+        "title": _join(titles),
+        "keywords": _join(keywords),
+        "body": _join(html.unescape(strip_tags(text or "")) for text in descriptions),
+    }
+
+
+def trigram_text(texts: Dict[str, str]) -> str:
+    return _join([texts["title"], texts["keywords"]]).lower()
+
+
+def search_vector_expression(texts: Dict[str, str]):
+    def vector(text, weight):
+        return SearchVector(Value(text, output_field=TextField()), weight=weight, config=SEARCH_CONFIG)
+
+    return vector(texts["title"], "A") + vector(texts["keywords"], "B") + vector(texts["body"], "C")
+
+
+def service_document_texts(service: Service) -> Dict[str, str]:
+    categories = [service.category, *service.additional_categories.all()]
+    keywords = []
+    for item in [*service.tags.all(), *categories]:
+        if item is not None:
+            keywords.extend([item.name_tm, item.name_ru])
+    return document_texts(
+        [service.title_tm, service.title_ru],
+        keywords,
+        [service.description_tm, service.description_ru],
+    )
+
+
+def refresh_search_documents(service_ids: Iterable[int]) -> int:
+    services = (
+        Service.objects.filter(id__in=list(service_ids))
+        .select_related("category")
+        .prefetch_related("tags", "additional_categories")
+        .only("id", "title_tm", "title_ru", "description_tm", "description_ru", "category__name_tm", "category__name_ru")
+    )
+    full_text = supports_full_text(services.db)
+    refreshed = 0
+    for service in services:
+        texts = service_document_texts(service)
+        fields = {"search_text": trigram_text(texts)}
+        if full_text:
+            fields["search_vector"] = search_vector_expression(texts)
+        refreshed += Service.objects.filter(pk=service.pk).update(**fields)
+    return refreshed
+
+
+class ServiceSearchFilter(SearchFilter):
+    """Ranked full-text plus trigram search on PostgreSQL.
+
+    Other databases keep the plain `search_fields` lookups.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = " ".join(self.get_search_terms(request))
+        if not terms or not supports_full_text(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        query = SearchQuery(terms, config=SEARCH_CONFIG, search_type="websearch")
+        queryset = queryset.filter(
+            Q(search_vector=query) | Q(search_text__trigram_word_similar=terms.lower())
+        ).annotate(
+            search_rank=SearchRank(F("search_vector"), query) + TrigramWordSimilarity(terms.lower(), "search_text"),
+        )
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return queryset
+        return queryset.order_by("-search_rank", *queryset.query.order_by)
@@ -4,9 +4,13 @@ from django.conf import settings
 from django.utils import timezone
 from rest_framework import serializers
 from django.core.files.storage import default_storage
-from core.serializers import LangMixin
+from core.fieldsets import FieldPlan
+from core.serializers import LangMixin, SparseFieldsMixin
 from core.utils import format_price_text, localized_value
 from drf_spectacular.utils import extend_schema_field, PolymorphicProxySerializer
+from . import cards
+from .filters import parse_int_list
+from .geo import BoundingBox
 from .models import Service, ServiceImage, ServiceVideo, Review, Favorite, ContactType, ServiceContact, ServiceProduct, \
     ServiceProductImage, ServiceApplication, ServiceApplicationImage, ServiceApplicationLink, Attribute, AttributeOption, ProductAttributeValue, CategoryAttribute, ServiceAttributeValue, ReviewReport
 from apps.users.models import User
@@ -32,27 +36,6 @@ class FavoriteStatusMixin(serializers.Serializer):
         return False
 
 
-def _get_field_dimensions(file_field):
-    if not file_field:
-        return None, None
-    try:
-        from PIL import Image
-    except Exception:
-        return None, None
-    try:
-        file_field.open()
-        with Image.open(file_field) as img:
-            width, height = img.size
-            return width, height
-    except Exception:
-        return None, None
-    finally:
-        try:
-            file_field.close()
-        except Exception:
-            pass
-
-
 class ServiceImageSerializer(serializers.ModelSerializer):
     aspect_ratio = serializers.SerializerMethodField()
 
@@ -61,7 +44,7 @@ class ServiceImageSerializer(serializers.ModelSerializer):
         fields = ['image', 'aspect_ratio']
 
     def get_aspect_ratio(self, obj):
-        return obj.get_or_set_aspect_ratio()
+        return obj.get_aspect_ratio()
 
 
 class ServiceVideoSerializer(serializers.ModelSerializer):
@@ -539,6 +522,54 @@ class ServiceCarouselSerializer(ServiceCoverUrlMixin, ServiceTagsMixin, ServiceB
         return {"type": "service", "service_id": obj.id}
 
 
+class ServiceCardListSerializer(serializers.ListSerializer):
+    """Serializes a page of cards with the child's plain-function builder."""
+
+    def to_representation(self, data):
+        iterable = data.all() if hasattr(data, "all") else data
+        ctx = cards.card_context(self.child.context)
+        build = self.child.build_card
+        plan = self.child.context.get("field_plan") or FieldPlan()
+        if plan.is_partial:
+            return [plan.prune(build(item, ctx)) for item in iterable]
+        return [build(item, ctx) for item in iterable]
+
+
+class ServiceListCardSerializer(ServiceListSerializer):
+    """Fast path for ServiceListSerializer with byte-identical output."""
+
+    build_card = staticmethod(cards.service_list_card)
+
+    class Meta(ServiceListSerializer.Meta):
+        list_serializer_class = ServiceCardListSerializer
+
+    def to_representation(self, instance):
+        plan = self.context.get("field_plan") or FieldPlan()
+        return plan.prune(self.build_card(instance, cards.card_context(self.context)))
+
+
+class ServiceNearbyCardSerializer(ServiceListCardSerializer):
+    distance = serializers.FloatField(read_only=True, help_text="Distance from the requested point in km.")
+
+    build_card = staticmethod(cards.service_nearby_card)
+
+    class Meta(ServiceListCardSerializer.Meta):
+        fields = ServiceListCardSerializer.Meta.fields + ["distance"]
+
+
+class ServiceCarouselCardSerializer(ServiceCarouselSerializer):
+    """Fast path for ServiceCarouselSerializer with byte-identical output."""
+
+    build_card = staticmethod(cards.service_carousel_card)
+
+    class Meta(ServiceCarouselSerializer.Meta):
+        list_serializer_class = ServiceCardListSerializer
+
+    def to_representation(self, instance):
+        plan = self.context.get("field_plan") or FieldPlan()
+        return plan.prune(self.build_card(instance, cards.card_context(self.context)))
+
+
 class ContactTypeSerializer(LangMixin, serializers.ModelSerializer):
     name = serializers.SerializerMethodField()
 
@@ -570,11 +601,13 @@ class ServiceContactWriteSerializer(serializers.ModelSerializer):
         fields = ['type_slug', 'value']
 
 
-class ServiceProductSerializer(LangMixin, FavoriteStatusMixin, serializers.ModelSerializer):
+class ServiceProductSerializer(SparseFieldsMixin, LangMixin, FavoriteStatusMixin, serializers.ModelSerializer):
     title = serializers.SerializerMethodField()
     description = serializers.SerializerMethodField()
     images = ServiceProductImageSerializer(many=True, read_only=True)
 
+    expandable_fields = ("images",)
+
     class Meta:
         model = ServiceProduct
         fields = [
@@ -600,6 +633,8 @@ class ServiceProductSerializer(LangMixin, FavoriteStatusMixin, serializers.Model
 class ServiceProductListSerializer(ServiceProductSerializer):
     values = AttributeValueSerializer(many=True, read_only=True)
 
+    expandable_fields = ("images", "values")
+
     class Meta(ServiceProductSerializer.Meta):
         fields = ServiceProductSerializer.Meta.fields + [
             'values',
@@ -623,6 +658,8 @@ class ServiceProductDetailSerializer(ServiceProductSerializer):
     service_title_tm = serializers.CharField(source='service.title_tm', read_only=True)
     service_title_ru = serializers.CharField(source='service.title_ru', read_only=True)
 
+    expandable_fields = ("images", "values", "contacts")
+
     class Meta(ServiceProductSerializer.Meta):
         fields = ServiceProductSerializer.Meta.fields + [
             'values', 'contacts',
@@ -640,7 +677,7 @@ class ServiceProductUpdateSerializer(serializers.ModelSerializer):
         ]
 
 
-class ServiceDetailSerializer(ServiceCoverUrlMixin, ServiceTagsMixin, ServiceBaseSerializer):
+class ServiceDetailSerializer(SparseFieldsMixin, ServiceCoverUrlMixin, ServiceTagsMixin, ServiceBaseSerializer):
     description = serializers.SerializerMethodField()
     images = ServiceImageSerializer(many=True, source='serviceimage_set', read_only=True)
     videos = serializers.SerializerMethodField()
@@ -651,6 +688,10 @@ class ServiceDetailSerializer(ServiceCoverUrlMixin, ServiceTagsMixin, ServiceBas
     tags = serializers.SerializerMethodField()
     available_cities = CitySerializer(many=True, read_only=True)
 
+    expandable_fields = (
+        "images", "videos", "media", "contacts", "attributes", "products", "tags", "available_cities",
+    )
+
     class Meta(ServiceBaseSerializer.Meta):
         model = Service
         fields = ServiceBaseSerializer.Meta.fields + [
@@ -686,16 +727,14 @@ class ServiceDetailSerializer(ServiceCoverUrlMixin, ServiceTagsMixin, ServiceBas
             url = getattr(image_field, "url", None) if image_field else None
             if not url:
                 continue
-            width, height = _get_field_dimensions(image_field)
-            aspect_ratio = image.get_or_set_aspect_ratio()
             media.append(
                 {
                     "id": image.id,
                     "type": "image",
                     "url": url,
-                    "width": width,
-                    "height": height,
-                    "aspect_ratio": aspect_ratio,
+                    "width": image.width,
+                    "height": image.height,
+                    "aspect_ratio": image.get_aspect_ratio(),
                     "sort_order": image.position,
                 }
             )
@@ -706,17 +745,15 @@ class ServiceDetailSerializer(ServiceCoverUrlMixin, ServiceTagsMixin, ServiceBas
             playback_url = video.get_hls_url()
             if not preview_url or not playback_url:
                 continue
-            width, height = _get_field_dimensions(preview_field)
-            aspect_ratio = round(width / height, 3) if width and height else None
             media.append(
                 {
                     "id": video.id,
                     "type": "video",
                     "preview": preview_url,
                     "playback_url": playback_url,
-                    "width": width,
-                    "height": height,
-                    "aspect_ratio": aspect_ratio,
+                    "width": video.preview_width,
+                    "height": video.preview_height,
+                    "aspect_ratio": video.preview_aspect_ratio,
                     "sort_order": video.position,
                 }
             )
@@ -779,6 +816,100 @@ class ServiceUpdateSerializer(serializers.ModelSerializer):
         return instance
 
 
+class ServiceNearbyQuerySerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(required=False, help_text="Search radius in km.")
+
+    def validate_radius(self, value):
+        max_radius = float(getattr(settings, "SERVICE_NEARBY_MAX_RADIUS_KM", 50))
+        if value <= 0 or value > max_radius:
+            raise serializers.ValidationError(f"Must be greater than 0 and at most {max_radius:g}.")
+        return value
+
+    def validate(self, attrs):
+        attrs.setdefault("radius", float(getattr(settings, "SERVICE_NEARBY_DEFAULT_RADIUS_KM", 5)))
+        return attrs
+
+
+class ServiceBatchQuerySerializer(serializers.Serializer):
+    ids = serializers.CharField(help_text="Comma-separated service IDs, returned in this order.")
+
+    def validate_ids(self, value):
+        ids = list(dict.fromkeys(parse_int_list(value)))
+        if not ids:
+            raise serializers.ValidationError("Provide at least one service ID.")
+        max_ids = int(getattr(settings, "SERVICE_BATCH_MAX_IDS", 50))
+        if len(ids) > max_ids:
+            raise serializers.ValidationError(f"At most {max_ids} IDs are allowed.")
+        return ids
+
+
+class ServiceMapQuerySerializer(serializers.Serializer):
+    bbox = serializers.CharField(help_text="Viewport as min_lng,min_lat,max_lng,max_lat.")
+    zoom = serializers.IntegerField()
+
+    def validate_bbox(self, value):
+        try:
+            min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(","))
+        except ValueError:
+            raise serializers.ValidationError("Expected min_lng,min_lat,max_lng,max_lat.")
+        if not (-90 <= min_lat < max_lat <= 90) or not all(-180 <= lng <= 180 for lng in (min_lng, max_lng)):
+            raise serializers.ValidationError("Coordinates are out of range.")
+        return BoundingBox(min_lat, max_lat, min_lng, max_lng)
+
+    def validate_zoom(self, value):
+        min_zoom = int(getattr(settings, "MAP_MIN_ZOOM", 0))
+        max_zoom = int(getattr(settings, "MAP_MAX_ZOOM", 19))
+        if not min_zoom <= value <= max_zoom:
+            raise serializers.ValidationError(f"Must be between {min_zoom} and {max_zoom}.")
+        return value
+
+
+class ServiceMapClusterSerializer(serializers.Serializer):
+    latitude = serializers.FloatField()
+    longitude = serializers.FloatField()
+    count = serializers.IntegerField()
+
+
+class ServiceMapPinSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    latitude = serializers.FloatField()
+    longitude = serializers.FloatField()
+    category = serializers.IntegerField()
+
+
+class ServiceMapSerializer(serializers.Serializer):
+    clusters = ServiceMapClusterSerializer(many=True)
+    pins = ServiceMapPinSerializer(many=True)
+
+
+class ServiceFacetCountSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    count = serializers.IntegerField()
+
+
+class ServiceFacetOptionSerializer(ServiceFacetCountSerializer):
+    value = serializers.CharField()
+
+
+class ServiceFacetAttributeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    slug = serializers.CharField()
+    options = ServiceFacetOptionSerializer(many=True)
+
+
+class ServiceFacetsSerializer(serializers.Serializer):
+    total = serializers.IntegerField()
+    categories = ServiceFacetCountSerializer(many=True)
+    cities = ServiceFacetCountSerializer(many=True)
+    regions = ServiceFacetCountSerializer(many=True)
+    tags = ServiceFacetCountSerializer(many=True)
+    service_attributes = ServiceFacetAttributeSerializer(many=True)
+    product_attributes = ServiceFacetAttributeSerializer(many=True)
+
+
 class ReviewUserSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -853,8 +984,6 @@ class FavoriteSerializer(serializers.ModelSerializer):
                     service.rating = obj.service_rating
                 if hasattr(obj, "service_reviews_count"):
                     service.reviews_count = obj.service_reviews_count
-                if hasattr(obj, "service_cover_image_path"):
-                    service.cover_image_path = obj.service_cover_image_path
             serializer = ServiceListSerializer(service, context={'request': request})
             return serializer.data
         if obj.product_id:
@@ -0,0 +1,162 @@
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.categories.models import Category
+from apps.regions.models import City, Region
+from apps.services import attribute_document, detail_cache, rating_stats, search
+from apps.services.models import (
+    Attribute,
+    AttributeOption,
+    CategoryAttribute,
+    ContactType,
+    ProductAttributeValue,
+    Review,
+    Service,
+    ServiceAttributeValue,
+    ServiceContact,
+    ServiceImage,
+    ServiceProduct,
+    ServiceProductImage,
+    ServiceTag,
+    ServiceVideo,
+)
+
+
+TRACKED_FIELDS = {"service_id", "rating", "is_approved"}
+
+
+def _contribution(review: Review):
+    if TRACKED_FIELDS & review.get_deferred_fields():
+        return None
+    return rating_stats.review_contribution(review.service_id, review.rating, review.is_approved)
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._rating_contribution = _contribution(instance) if instance.pk else {}
+
+
+@receiver(post_save, sender=Review)
+def update_rating_stats_on_save(sender, instance, created, **kwargs):
+    before = {} if created else getattr(instance, "_rating_contribution", {})
+    after = _contribution(instance)
+    if before is None or after is None:
+        # Loaded with deferred fields, so the previous values are unknown.
+        rating_stats.refresh({instance.service_id})
+        after = None
+    else:
+        rating_stats.apply_change(before, after)
+    instance._rating_contribution = after
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_stats_on_delete(sender, instance, **kwargs):
+    before = getattr(instance, "_rating_contribution", {})
+    if before is None:
+        rating_stats.refresh({instance.service_id})
+    else:
+        rating_stats.apply_change(before, {})
+    instance._rating_contribution = {}
+
+
+@receiver([post_save, post_delete], sender=ServiceImage)
+def refresh_service_cover(sender, instance, **kwargs):
+    Service.objects.filter(pk=instance.service_id).refresh_cover_images()
+
+
+@receiver(post_save, sender=Service)
+def refresh_service_search_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.refresh_search_documents([instance.pk])
+
+
+@receiver(m2m_changed, sender=Service.tags.through)
+@receiver(m2m_changed, sender=Service.additional_categories.through)
+def refresh_search_document_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        search.refresh_search_documents([instance.pk])
+    elif pk_set:
+        search.refresh_search_documents(pk_set)
+
+
+@receiver(post_save, sender=ServiceTag)
+def refresh_tagged_search_documents(sender, instance, created, **kwargs):
+    if not created:
+        search.refresh_search_documents(instance.services.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_search_documents(sender, instance, created, **kwargs):
+    if created:
+        return
+    service_ids = Service.objects.filter(
+        Q(category=instance) | Q(additional_categories=instance)
+    ).values_list("id", flat=True)
+    search.refresh_search_documents(set(service_ids))
+
+
+@receiver([post_save, post_delete], sender=ServiceAttributeValue)
+def refresh_service_attribute_document(sender, instance, **kwargs):
+    attribute_document.schedule_refresh([instance.service_id])
+
+
+@receiver([post_save, post_delete], sender=ProductAttributeValue)
+def refresh_product_attribute_document(sender, instance, **kwargs):
+    service_ids = ServiceProduct.objects.filter(pk=instance.product_id).values_list("service_id", flat=True)
+    attribute_document.schedule_refresh(service_ids)
+
+
+@receiver(post_delete, sender=ServiceProduct)
+def refresh_deleted_product_attribute_document(sender, instance, **kwargs):
+    attribute_document.schedule_refresh([instance.service_id])
+
+
+@receiver([post_save, post_delete], sender=Service)
+def invalidate_service_detail(sender, instance, **kwargs):
+    detail_cache.invalidate([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ServiceImage)
+@receiver([post_save, post_delete], sender=ServiceVideo)
+@receiver([post_save, post_delete], sender=ServiceContact)
+@receiver([post_save, post_delete], sender=ServiceAttributeValue)
+@receiver([post_save, post_delete], sender=ServiceProduct)
+def invalidate_service_detail_child(sender, instance, **kwargs):
+    detail_cache.invalidate([instance.service_id])
+
+
+@receiver([post_save, post_delete], sender=ServiceProductImage)
+@receiver([post_save, post_delete], sender=ProductAttributeValue)
+def invalidate_service_detail_product_child(sender, instance, **kwargs):
+    detail_cache.invalidate(
+        ServiceProduct.objects.filter(pk=instance.product_id).values_list("service_id", flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=Service.tags.through)
+@receiver(m2m_changed, sender=Service.available_cities.through)
+@receiver(m2m_changed, sender=Service.additional_categories.through)
+def invalidate_service_detail_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        detail_cache.invalidate([instance.pk])
+    elif pk_set:
+        detail_cache.invalidate(pk_set)
+    else:
+        detail_cache.invalidate_all()
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=ServiceTag)
+@receiver([post_save, post_delete], sender=City)
+@receiver([post_save, post_delete], sender=Region)
+@receiver([post_save, post_delete], sender=Attribute)
+@receiver([post_save, post_delete], sender=AttributeOption)
+@receiver([post_save, post_delete], sender=CategoryAttribute)
+@receiver([post_save, post_delete], sender=ContactType)
+def invalidate_shared_service_detail(sender, instance, **kwargs):
+    detail_cache.invalidate_all()
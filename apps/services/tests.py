@@ -1,11 +1,25 @@
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
 from unittest.mock import Mock, patch
 from datetime import datetime, timedelta, timezone
 from types import SimpleNamespace
 
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
 from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
 from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
 from apps.services.admin import (
@@ -16,18 +30,28 @@ from apps.services.admin import (
 )
 from apps.services.management.commands.generate_hls import Command as GenerateHLSCommand
 from apps.categories.models import Category
+from apps.regions.models import City, Region
 from apps.services.models import (
     Attribute,
     AttributeOption,
     CategoryAttribute,
+    ContactType,
+    Favorite,
     ProductAttributeValue,
     Review,
     ReviewReport,
     Service,
     ServiceAttributeValue,
+    ServiceContact,
+    ServiceImage,
     ServiceProduct,
+    ServiceRatingStats,
+    ServiceTag,
     ServiceVideo,
 )
+from apps.services import filters, geo, search
+from apps.services.factories import ServiceFixtureMixin
+from apps.services.rating_stats import rating_annotations
 from core.utils import format_price_text
 from apps.services.serializers import (
     AttributeSerializer,
@@ -36,12 +60,16 @@ from apps.services.serializers import (
     ServiceApplicationSerializer,
     ServiceDetailSerializer,
     ServiceBaseSerializer,
+    ServiceCarouselCardSerializer,
+    ServiceCarouselSerializer,
+    ServiceListCardSerializer,
+    ServiceListSerializer,
     ServiceShowcaseSerializer,
     ServiceUpdateSerializer,
 )
 from apps.services.throttles import ServiceApplicationIPThrottle
 from apps.services.validators import validate_file_size
-from apps.users.models import RoleEnum, User
+from apps.users.models import RoleEnum, User, UserBlock
 
 
 class FormatPriceTextTests(SimpleTestCase):
@@ -572,6 +600,83 @@ class ServiceAttributeFilterTests(TestCase):
 
         self.assertEqual(self._service_ids(response), {self.service_a.id, self.service_b.id})
 
+    def test_text_filter_matches_the_normalized_value_on_both_backends(self):
+        color = Attribute.objects.create(
+            name_tm="Reňk", name_ru="Цвет", slug="color", input_type="text", is_active=True
+        )
+        ServiceAttributeValue.objects.create(service=self.service_c, attribute=color, value_text_tm="  Gyzyl ")
+        spec = {"operator": "exact", "values": ["GYZYL"]}
+
+        exact = self.client.get("/api/v1/services/", {"service_attr.color": "GYZYL"})
+        partial = self.client.get("/api/v1/services/", {"service_attr.color": "gyz"})
+
+        self.assertEqual(self._service_ids(exact), {self.service_c.id})
+        self.assertEqual(self._service_ids(partial), set())
+        self.assertEqual(filters._attribute_path("$.s", color, spec, {}), f'($.s.t."{color.id}"[*] == "gyzyl")')
+        self.service_c.refresh_from_db()
+        self.assertEqual(self.service_c.attribute_document["s"]["t"], {str(color.id): ["gyzyl"]})
+
+    def test_facets_count_filtered_services_in_grouped_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/v1/services/facets/", {"product_attr.capacity_min": "300"})
+
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        # At most two grouped queries per facet (attribute facets also read their links).
+        self.assertLessEqual(len(ctx.captured_queries), 2 * len(payload))
+        self.assertEqual(payload["total"], 2)
+        self.assertEqual(payload["categories"], [{"id": self.category.id, "count": 2}])
+        self.assertEqual(payload["service_attributes"], [])
+        self.assertEqual(
+            payload["product_attributes"],
+            [
+                {
+                    "id": self.hall_shape.id,
+                    "slug": "hall_shape",
+                    "options": [
+                        {"id": self.round_option.id, "count": 2, "value": "round"},
+                        {"id": self.square_option.id, "count": 1, "value": "square"},
+                    ],
+                }
+            ],
+        )
+
+    def test_attribute_document_follows_values(self):
+        self.service_a.refresh_from_db()
+        document = self.service_a.attribute_document
+
+        self.assertEqual(document["s"], {"b": {str(self.parking.id): [True]}})
+        self.assertEqual(
+            document["p"],
+            [{"n": {str(self.capacity.id): [320]}, "o": {str(self.hall_shape.id): [self.round_option.id]}}],
+        )
+
+        ServiceAttributeValue.objects.filter(service=self.service_a).delete()
+        self.service_a.refresh_from_db()
+
+        self.assertEqual(self.service_a.attribute_document["s"], {})
+
+    def test_attribute_filters_compile_to_one_jsonpath(self):
+        path = filters._attribute_path(
+            "@",
+            self.capacity,
+            {"operator": "min", "values": ["300"]},
+            {},
+        )
+        choice = filters._attribute_path(
+            "@",
+            self.hall_shape,
+            {"operator": "exact", "values": ["round", "square"]},
+            filters._resolve_option_ids([({"operator": "exact", "values": ["round", "square"]}, self.hall_shape)]),
+        )
+
+        self.assertEqual(path, f'(@.n."{self.capacity.id}"[*] >= 300.0)')
+        self.assertEqual(
+            choice,
+            f'(@.o."{self.hall_shape.id}"[*] == {self.round_option.id}'
+            f' || @.o."{self.hall_shape.id}"[*] == {self.square_option.id})',
+        )
+
 
 class ReviewReportEndpointTests(TestCase):
     def setUp(self):
@@ -631,3 +736,834 @@ class ReviewReportEndpointTests(TestCase):
         report = ReviewReport.objects.get()
         self.assertEqual(report.reason, "Still spam")
         self.assertEqual(first.data["status"], ReviewReport.Status.PENDING)
+
+
+class ServiceRatingStatsTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        super().setUp()
+        self.viewer = User.objects.create_user(phone="+99369999101", password="pass123")
+        self.critic = User.objects.create_user(phone="+99369999102", password="pass123")
+        self.service = self.create_service("Service")
+
+    def _stats(self):
+        stats = ServiceRatingStats.objects.get(service=self.service)
+        return stats.rating_sum, stats.rating_count, stats.rating_avg
+
+    def _review(self, user, rating, **kwargs):
+        return Review.objects.create(user=user, service=self.service, rating=rating, comment="ok", **kwargs)
+
+    def test_stats_follow_review_changes(self):
+        self._review(self.viewer, 5)
+        review = self._review(self.critic, 2)
+        self.assertEqual(self._stats(), (7, 2, Decimal("3.50")))
+
+        review.is_approved = False
+        review.save(update_fields=["is_approved"])
+        self.assertEqual(self._stats(), (5, 1, Decimal("5.00")))
+
+        review.is_approved = True
+        review.rating = 4
+        review.save()
+        self.assertEqual(self._stats(), (9, 2, Decimal("4.50")))
+
+        Review.objects.get(pk=review.pk).delete()
+        self.assertEqual(self._stats(), (5, 1, Decimal("5.00")))
+
+    def test_unapproved_reviews_are_not_counted(self):
+        self._review(self.viewer, 1, is_approved=False)
+
+        self.assertFalse(ServiceRatingStats.objects.filter(service=self.service).exists())
+
+    def test_list_reads_stats_without_aggregating_reviews(self):
+        self._review(self.viewer, 5)
+        self._review(self.critic, 2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/v1/services/")
+
+        item = response.data["results"][0]
+        self.assertEqual(item["rating"], 3.5)
+        self.assertEqual(item["reviews_count"], 2)
+        self.assertFalse(any("AVG(" in query["sql"].upper() for query in ctx.captured_queries))
+
+    def test_reviews_of_blocked_users_are_subtracted(self):
+        self._review(self.viewer, 5)
+        self._review(self.critic, 2)
+        UserBlock.objects.create(blocker=self.viewer, blocked=self.critic)
+        self.client.force_authenticate(user=self.viewer)
+
+        item = self.client.get("/api/v1/services/").data["results"][0]
+
+        self.assertEqual(item["rating"], 5.0)
+        self.assertEqual(item["reviews_count"], 1)
+
+    def test_reconcile_command_fixes_drift(self):
+        self._review(self.viewer, 5)
+        ServiceRatingStats.objects.filter(service=self.service).update(rating_sum=1, rating_count=3)
+
+        call_command("reconcile_rating_stats", "--dry-run", stdout=StringIO())
+        self.assertEqual(self._stats()[:2], (1, 3))
+
+        call_command("reconcile_rating_stats", stdout=StringIO())
+        self.assertEqual(self._stats(), (5, 1, Decimal("5.00")))
+
+
+class ServiceCoverImageTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = self.create_service("Service")
+
+    def _image(self, name, position):
+        return ServiceImage.objects.create(
+            service=self.service,
+            image=f"services/images/{name}.webp",
+            position=position,
+            aspect_ratio=1.0,
+        )
+
+    def _cover(self):
+        return Service.objects.values_list("cover_image_path", flat=True).get(pk=self.service.pk)
+
+    def test_cover_follows_gallery_order(self):
+        second = self._image("second", 2)
+        self.assertEqual(self._cover(), "services/images/second.webp")
+
+        first = self._image("first", 1)
+        self.assertEqual(self._cover(), "services/images/first.webp")
+
+        second.position = 0
+        second.save(update_fields=["position"])
+        self.assertEqual(self._cover(), "services/images/second.webp")
+
+        second.delete()
+        self.assertEqual(self._cover(), "services/images/first.webp")
+
+        first.delete()
+        self.assertIsNone(self._cover())
+
+    def test_list_and_vendor_views_pick_the_same_cover(self):
+        self._image("later", 5)
+        self._image("earlier", 1)
+        client = APIClient()
+
+        public = client.get("/api/v1/services/").data["results"][0]
+        client.force_authenticate(user=self.vendor)
+        vendor = client.get("/api/v1/services/my/").data["results"][0]
+
+        self.assertTrue(public["cover_url"].endswith("services/images/earlier.webp"))
+        self.assertEqual(public["cover_url"], vendor["cover_url"])
+
+
+class CursorPaginationTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        super().setUp()
+        self.services = [
+            self.create_service(f"S{index}", priority=index // 2, price_min=None if index % 2 else index)
+            for index in range(5)
+        ]
+
+    def _walk(self, url, params):
+        ids = []
+        response = self.client.get(url, {**params, "cursor": ""})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item["id"] for item in response.data["results"])
+            if not response.data["next"]:
+                return ids
+            response = self.client.get(response.data["next"])
+
+    def test_cursor_pages_match_page_numbers_without_count(self):
+        expected = [item["id"] for item in self.client.get("/api/v1/services/", {"size": 10}).data["results"]]
+
+        with CaptureQueriesContext(connection) as ctx:
+            first = self.client.get("/api/v1/services/", {"size": 2, "cursor": ""})
+
+        self.assertNotIn("count", first.data)
+        self.assertFalse(any("COUNT(" in query["sql"].upper() for query in ctx.captured_queries))
+        self.assertEqual(self._walk("/api/v1/services/", {"size": 2}), expected)
+
+    def test_nullable_ordering_falls_back_to_offset_cursor(self):
+        params = {"ordering": "price_min", "size": 10}
+        expected = [item["id"] for item in self.client.get("/api/v1/services/", params).data["results"]]
+
+        self.assertEqual(self._walk("/api/v1/services/", {**params, "size": 2}), expected)
+
+    def test_page_parameter_keeps_page_numbers(self):
+        response = self.client.get("/api/v1/services/", {"size": 2, "page": 2, "cursor": ""})
+
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_reviews_walk_by_cursor(self):
+        for index, service in enumerate(self.services):
+            Review.objects.create(user=self.vendor, service=service, rating=index + 1, comment="ok")
+        expected = [item["id"] for item in self.client.get("/api/v1/reviews/").data["results"]]
+
+        self.assertEqual(self._walk("/api/v1/reviews/", {"size": 2}), expected)
+
+    def test_rejects_garbage_cursor(self):
+        response = self.client.get("/api/v1/services/", {"cursor": "!!!"})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class ServiceSearchDocumentTests(ServiceFixtureMixin, TestCase):
+    category_name = ("Gözellik", "Красота")
+
+    def setUp(self):
+        self.client = APIClient()
+        super().setUp()
+        self.tag = ServiceTag.objects.create(name_tm="Saç", name_ru="Волосы")
+        self.service = self.create_service(
+            "Salon Aýna",
+            "Салон Айна",
+            description_tm="<p>Gowy &amp; arzan</p>",
+            description_ru="<p>Хорошо</p>",
+        )
+        self.service.tags.add(self.tag)
+
+    def _search_text(self):
+        return Service.objects.values_list("search_text", flat=True).get(pk=self.service.pk)
+
+    def test_document_strips_markup(self):
+        texts = search.document_texts(["A"], ["b"], ["<p>Gowy &amp; arzan</p>"])
+
+        self.assertEqual(texts["body"], "Gowy & arzan")
+
+    def test_document_follows_titles_tags_and_categories(self):
+        self.assertEqual(self._search_text(), "salon aýna салон айна saç волосы gözellik красота")
+
+        self.tag.name_ru = "Стрижка"
+        self.tag.save()
+        self.category.name_ru = "Уход"
+        self.category.save()
+
+        self.assertIn("стрижка", self._search_text())
+        self.assertIn("уход", self._search_text())
+
+    @skipUnless(connection.vendor == "postgresql", "Full-text search needs PostgreSQL")
+    def test_ranked_search_tolerates_typos(self):
+        response = self.client.get("/api/v1/services/", {"search": "salom"})
+
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.service.id])
+
+    def test_search_parameter_still_matches_titles(self):
+        response = self.client.get("/api/v1/services/", {"search": "Aýna"})
+
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.service.id])
+
+
+class ServiceFilterSemiJoinTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        super().setUp()
+        self.region = Region.objects.create(name_tm="Ahal", name_ru="Ахал")
+        self.other_region = Region.objects.create(name_tm="Mary", name_ru="Мары")
+        self.cities = [
+            City.objects.create(region=self.region, name_tm="Änew", name_ru="Анев"),
+            City.objects.create(region=self.region, name_tm="Tejen", name_ru="Теджен"),
+            City.objects.create(region=self.other_region, name_tm="Mary", name_ru="Мары"),
+        ]
+        self.categories = [
+            Category.objects.create(name_tm="Toý", name_ru="Той"),
+            Category.objects.create(name_tm="Surat", name_ru="Фото"),
+        ]
+        self.tags = [
+            ServiceTag.objects.create(name_tm="Arzan", name_ru="Дёшево"),
+            ServiceTag.objects.create(name_tm="Çalt", name_ru="Быстро"),
+        ]
+        self.services = []
+        for index in range(4):
+            service = self.create_service(f"S{index}", category=self.categories[index % 2])
+            self.services.append(service)
+        # Every service matches several ids, which used to repeat rows.
+        self.services[0].available_cities.set(self.cities[:2])
+        self.services[0].tags.set(self.tags)
+        self.services[0].additional_categories.set([self.categories[1]])
+        self.services[1].available_cities.set(self.cities)
+        self.services[1].tags.set(self.tags[:1])
+        self.services[2].available_cities.set(self.cities[2:])
+        self.services[3].additional_categories.set([self.categories[0]])
+
+    def _joined_ids(self, params):
+        qs = Service.objects.filter(is_active=True)
+        if "category" in params:
+            ids = [int(value) for value in params["category"].split(",")]
+            qs = qs.filter(Q(category_id__in=ids) | Q(additional_categories__id__in=ids))
+        if "city" in params:
+            qs = qs.filter(available_cities__in=[int(value) for value in params["city"].split(",")])
+        if "region" in params:
+            qs = qs.filter(available_cities__region__in=[int(value) for value in params["region"].split(",")])
+        if "tags" in params:
+            qs = qs.filter(tags__in=params["tags"])
+        return set(qs.distinct().values_list("id", flat=True))
+
+    def test_filters_match_joined_results_without_distinct(self):
+        cases = [
+            {"category": f"{self.categories[0].id},{self.categories[1].id}"},
+            {"city": f"{self.cities[0].id},{self.cities[1].id}"},
+            {"region": f"{self.region.id},{self.other_region.id}"},
+            {"tags": [self.tags[0].id, self.tags[1].id]},
+            {
+                "category": str(self.categories[1].id),
+                "region": str(self.region.id),
+                "tags": [self.tags[0].id],
+            },
+        ]
+        for params in cases:
+            with self.subTest(params=params):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get("/api/v1/services/", params)
+
+                self.assertEqual(response.status_code, 200)
+                ids = [item["id"] for item in response.data["results"]]
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(set(ids), self._joined_ids(params))
+                self.assertTrue(ids)
+                service_queries = [q["sql"] for q in ctx.captured_queries if "services_service" in q["sql"]]
+                self.assertTrue(service_queries)
+                self.assertFalse([sql for sql in service_queries if "DISTINCT" in sql.upper()])
+
+    def test_location_filters_include_main_city(self):
+        self.services[3].city = self.cities[2]
+        self.services[3].save()
+
+        by_city = Service.objects.filter_by_city_ids([self.cities[2].id], include_main_city=True)
+        by_region = Service.objects.filter_by_region_ids([self.other_region.id], include_main_city=True)
+
+        expected = {self.services[1].id, self.services[2].id, self.services[3].id}
+        self.assertEqual(set(by_city.values_list("id", flat=True)), expected)
+        self.assertEqual(set(by_region.values_list("id", flat=True)), expected)
+        self.assertNotIn("DISTINCT", str(by_region.query).upper())
+
+
+class ServiceCardSerializerTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(phone="+99369999151", password="pass123")
+        region = Region.objects.create(name_tm="Ahal", name_ru="Ахал")
+        city = City.objects.create(region=region, name_tm="Änew", name_ru="Анев", is_region_level=True)
+        category = Category.objects.create(name_tm="Toý", name_ru="Той")
+        extra_category = Category.objects.create(name_tm="Surat", name_ru="Фото")
+        tag = ServiceTag.objects.create(name_tm="Arzan", name_ru="Дёшево")
+
+        first = self.create_service(
+            "Birinji",
+            "Первый",
+            category=category,
+            city=city,
+            avatar="services/avatars/first.webp",
+            price_min=100,
+            price_max=250.5,
+            discount_text="-10%",
+            work_experience_years=3,
+            address=" Köçe 1 ",
+            is_verified=True,
+        )
+        first.additional_categories.set([extra_category])
+        first.tags.set([tag])
+        second = self.create_service("Ikinji", "Второй", category=extra_category, latitude=37.9, longitude=58.4)
+        ServiceImage.objects.create(service=second, image="services/images/second.webp", position=1, aspect_ratio=1.0)
+        Favorite.objects.create(user=self.user, service=second)
+        Review.objects.create(service=first, user=self.user, rating=4, comment="ok", is_approved=True)
+
+    def _request(self, lang, user=None):
+        request = RequestFactory().get("/api/v1/services/", {"lang": lang})
+        request.user = user or AnonymousUser()
+        return request
+
+    def _services(self, annotated=True):
+        qs = (
+            Service.objects.select_related("category", "city", "city__region")
+            .prefetch_related("additional_categories", "tags", "serviceimage_set")
+            .order_by("id")
+        )
+        if annotated:
+            qs = qs.annotate(**rating_annotations())
+        return list(qs)
+
+    def test_cards_render_the_same_bytes_as_the_drf_serializers(self):
+        pairs = [
+            (ServiceListSerializer, ServiceListCardSerializer),
+            (ServiceCarouselSerializer, ServiceCarouselCardSerializer),
+        ]
+        for reference, fast in pairs:
+            for lang in ("tm", "ru"):
+                for user in (None, self.user):
+                    for annotated in (True, False):
+                        with self.subTest(serializer=fast.__name__, lang=lang, user=user, annotated=annotated):
+                            services = self._services(annotated)
+                            context = {"request": self._request(lang, user)}
+                            expected = JSONRenderer().render(reference(services, many=True, context=context).data)
+                            actual = JSONRenderer().render(fast(services, many=True, context=context).data)
+
+                            self.assertEqual(actual, expected)
+                            self.assertEqual(
+                                JSONRenderer().render(fast(services[0], context=context).data),
+                                JSONRenderer().render(reference(services[0], context=context).data),
+                            )
+
+    def test_benchmark_command_checks_output(self):
+        out = StringIO()
+
+        call_command("benchmark_service_cards", "--repeat", "2", stdout=out)
+
+        self.assertIn("identical", out.getvalue())
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class ServiceDetailCacheTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        super().setUp()
+        self.viewer = User.objects.create_user(phone="+99369999161", password="pass123")
+        self.critic = User.objects.create_user(phone="+99369999162", password="pass123")
+        self.service = self.create_service("Toý mekany", "Банкетный зал")
+        self.product = ServiceProduct.objects.create(service=self.service, title_tm="Zal", title_ru="Зал", price=100)
+        Review.objects.create(service=self.service, user=self.viewer, rating=5, comment="ok", is_approved=True)
+        Review.objects.create(service=self.service, user=self.critic, rating=1, comment="bad", is_approved=True)
+        self.url = f"/api/v1/services/{self.service.id}/"
+
+    def test_repeated_detail_is_served_from_cache(self):
+        first = self.client.get(self.url, {"lang": "ru"})
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url, {"lang": "ru"})
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(second.data["title"], "Банкетный зал")
+        self.assertEqual(self.client.get(self.url, {"lang": "tm"}).data["title"], "Toý mekany")
+
+    def test_per_process_cache_disables_the_detail_cache(self):
+        with override_settings(CACHE_IS_SHARED=False), patch("apps.services.views.detail_cache.get_detail") as get_detail:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["title"], "Toý mekany")
+        get_detail.assert_not_called()
+
+    def test_child_and_shared_rows_invalidate_the_detail(self):
+        self.client.get(self.url)
+
+        self.product.title_tm = "Uly zal"
+        self.product.save()
+        self.assertEqual(self.client.get(self.url).data["products"][0]["title"], "Uly zal")
+
+        self.category.name_tm = "Banket"
+        self.category.save()
+        self.assertEqual(self.client.get(self.url).data["category_title"], "Banket")
+
+        self.service.is_active = False
+        self.service.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_viewer_fields_are_applied_over_the_shared_payload(self):
+        Favorite.objects.create(user=self.viewer, service=self.service)
+        Favorite.objects.create(user=self.viewer, product=self.product)
+        UserBlock.objects.create(blocker=self.viewer, blocked=self.critic)
+        self.client.force_authenticate(user=self.viewer)
+        own = self.client.get(self.url).data
+
+        self.client.force_authenticate(user=None)
+        anonymous = self.client.get(self.url).data
+
+        self.assertTrue(own["is_favorite"])
+        self.assertTrue(own["products"][0]["is_favorite"])
+        self.assertEqual((own["rating"], own["reviews_count"]), (5.0, 1))
+        self.assertFalse(anonymous["is_favorite"])
+        self.assertFalse(anonymous["products"][0]["is_favorite"])
+        self.assertEqual((anonymous["rating"], anonymous["reviews_count"]), (3.0, 2))
+
+    def test_bulk_attribute_values_invalidate_the_detail(self):
+        attribute = Attribute.objects.create(
+            name_tm="Sygym",
+            name_ru="Вместимость",
+            slug="capacity",
+            input_type="number",
+            is_active=True,
+        )
+        CategoryAttribute.objects.create(
+            category=self.category, attribute=attribute, scope=CategoryAttribute.Scope.SERVICE
+        )
+        first = self.client.get(self.url)
+        self.assertEqual(first.data["attributes"], [])
+
+        self.client.force_authenticate(user=self.vendor)
+        response = self.client.put(
+            f"/api/v1/vendor/services/{self.service.id}/attributes/bulk/",
+            {"items": [{"attribute": attribute.id, "value_number": 120}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(user=None)
+
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.data["attributes"]), 1)
+
+
+class ServiceMediaDimensionsTests(ServiceFixtureMixin, TestCase):
+    category_name = ("Surat", "Фото")
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        super().setUp()
+        self.service = self.create_service("Surat", "Фото")
+
+    def _png(self, name, size):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new("RGB", size, "white").save(buffer, format="PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def test_upload_stores_dimensions(self):
+        image = ServiceImage.objects.create(service=self.service, image=self._png("wide.png", (40, 20)))
+        video = ServiceVideo.objects.create(service=self.service, preview=self._png("preview.png", (30, 60)))
+
+        image.refresh_from_db()
+        video.refresh_from_db()
+        self.assertEqual((image.width, image.height, image.aspect_ratio), (40, 20, 2.0))
+        self.assertTrue(image.image.name.endswith(".webp"))
+        self.assertEqual((video.preview_width, video.preview_height, video.preview_aspect_ratio), (30, 60, 0.5))
+
+    def test_detail_reads_stored_dimensions_without_opening_files(self):
+        ServiceImage.objects.create(service=self.service, image=self._png("wide.png", (40, 20)))
+
+        with patch("PIL.Image.open", side_effect=AssertionError("file opened")) as image_open:
+            response = APIClient().get(f"/api/v1/services/{self.service.id}/")
+            image = ServiceImage.objects.get(service=self.service)
+            image.position = 5
+            image.save()
+
+        self.assertEqual(response.status_code, 200)
+        image_open.assert_not_called()
+        item = response.data["media"][0]
+        self.assertEqual((item["width"], item["height"], item["aspect_ratio"]), (40, 20, 2.0))
+
+    def test_backfill_measures_rows_without_dimensions(self):
+        image = ServiceImage.objects.create(service=self.service, image=self._png("wide.png", (40, 20)))
+        ServiceImage.objects.filter(pk=image.pk).update(width=None, height=None, aspect_ratio=None)
+        out = StringIO()
+
+        call_command("backfill_media_dimensions", "--workers", "2", stdout=out)
+
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height, image.aspect_ratio), (40, 20, 2.0))
+        self.assertIn("Measured 1 images.", out.getvalue())
+
+
+class ServiceNearbyTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        super().setUp()
+        self.other_category = Category.objects.create(name_tm="Surat", name_ru="Фото")
+        self.origin = (37.9500, 58.3800)
+        self.near = self._service("Near", 37.9550, 58.3850)
+        self.nearer = self._service("Nearer", 37.9510, 58.3810)
+        self.far = self._service("Far", 38.0500, 58.3800)
+        self.elsewhere = self._service("Elsewhere", 37.9520, 58.3820, category=self.other_category)
+        self._service("No location", None, None)
+
+    def _service(self, title, lat, lng, category=None):
+        return self.create_service(title, category=category or self.category, latitude=lat, longitude=lng)
+
+    def test_bounding_box_contains_the_radius(self):
+        lat, lng = self.origin
+        box = geo.bounding_box(lat, lng, 10)
+
+        self.assertAlmostEqual(geo.haversine_km(lat, lng, box.max_lat, lng), 10, places=3)
+        self.assertGreaterEqual(geo.haversine_km(lat, lng, lat, box.max_lng), 10)
+        self.assertEqual(geo.bounding_box(89.99, 0, 10)[2:], (None, None))
+        self.assertEqual(geo.bounding_box(0, 179.99, 10)[2:], (None, None))
+
+    def test_nearby_orders_by_distance_within_radius(self):
+        lat, lng = self.origin
+        response = self.client.get("/api/v1/services/nearby/", {"lat": lat, "lng": lng, "radius": 5})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual([item["id"] for item in results], [self.nearer.id, self.elsewhere.id, self.near.id])
+        expected = geo.haversine_km(lat, lng, self.near.latitude, self.near.longitude)
+        self.assertAlmostEqual(results[2]["distance"], expected, places=3)
+        self.assertEqual(results[0]["title"], "Nearer")
+
+    def test_nearby_composes_with_list_filters(self):
+        lat, lng = self.origin
+        response = self.client.get(
+            "/api/v1/services/nearby/",
+            {"lat": lat, "lng": lng, "radius": 20, "category": self.category.id},
+        )
+
+        self.assertEqual(
+            [item["id"] for item in response.data["results"]],
+            [self.nearer.id, self.near.id, self.far.id],
+        )
+
+    def test_nearby_validates_point_and_radius(self):
+        self.assertEqual(self.client.get("/api/v1/services/nearby/", {"lat": 37.95}).status_code, 400)
+        response = self.client.get("/api/v1/services/nearby/", {"lat": 37.95, "lng": 58.38, "radius": 500})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("radius", response.data)
+
+
+@override_settings(SERVICE_MAP_PIN_ZOOM=15, SERVICE_MAP_CLUSTER_CELLS_PER_TILE=4)
+class ServiceMapTests(ServiceFixtureMixin, TestCase):
+    url = "/api/v1/services/map/"
+    bbox = "58.0,37.5,59.0,38.5"
+
+    def setUp(self):
+        self.client = APIClient()
+        super().setUp()
+        self.other_category = Category.objects.create(name_tm="Surat", name_ru="Фото")
+        self.downtown = [
+            self._service("Merkez 1", 37.9501, 58.3801),
+            self._service("Merkez 2", 37.9502, 58.3802),
+            self._service("Merkez 3", 37.9503, 58.3803, category=self.other_category),
+        ]
+        self.suburb = self._service("Gyra", 38.3000, 58.9000)
+        self._service("Daşarda", 40.0000, 60.0000)
+
+    def _service(self, title, lat, lng, category=None):
+        return self.create_service(title, category=category or self.category, latitude=lat, longitude=lng)
+
+    def test_low_zoom_returns_clusters_and_single_pins(self):
+        response = self.client.get(self.url, {"bbox": self.bbox, "zoom": 10})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["clusters"]), 1)
+        cluster = response.data["clusters"][0]
+        self.assertEqual(cluster["count"], 3)
+        self.assertAlmostEqual(cluster["latitude"], 37.9502, places=4)
+        self.assertEqual([pin["id"] for pin in response.data["pins"]], [self.suburb.id])
+        self.assertEqual(response.data["pins"][0]["title"], "Gyra")
+
+    def test_high_zoom_returns_individual_pins(self):
+        response = self.client.get(self.url, {"bbox": self.bbox, "zoom": 16})
+
+        self.assertEqual(response.data["clusters"], [])
+        self.assertCountEqual(
+            [pin["id"] for pin in response.data["pins"]],
+            [service.id for service in [*self.downtown, self.suburb]],
+        )
+
+    def test_map_honours_list_filters(self):
+        response = self.client.get(self.url, {"bbox": self.bbox, "zoom": 10, "category": self.category.id})
+
+        self.assertEqual(response.data["clusters"][0]["count"], 2)
+
+    def test_map_validates_viewport(self):
+        self.assertEqual(self.client.get(self.url, {"bbox": "1,2,3", "zoom": 10}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"bbox": self.bbox, "zoom": 99}).status_code, 400)
+
+
+@override_settings(SERVICE_BATCH_MAX_IDS=3)
+class ServiceBatchTests(ServiceFixtureMixin, TestCase):
+    url = "/api/v1/services/batch/"
+
+    def setUp(self):
+        self.client = APIClient()
+        super().setUp()
+        self.first, self.second, self.inactive = [
+            self.create_service(title, is_active=is_active)
+            for title, is_active in (("Birinji", True), ("Ikinji", True), ("Ýapyk", False))
+        ]
+        Service.objects.update(cover_image_path="services/images/cover.webp")
+
+    def test_batch_preserves_requested_order(self):
+        ids = f"{self.second.id},{self.inactive.id},{self.first.id},{self.second.id}"
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {"ids": ids})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["id"] for item in response.data], [self.second.id, self.first.id])
+        self.assertEqual(response.data[0]["title"], "Ikinji")
+        # One query for the annotated services and the list's additional categories prefetch.
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_batch_cards_match_the_list(self):
+        listed = {item["id"]: item for item in self.client.get("/api/v1/services/").data["results"]}
+        batch = self.client.get(self.url, {"ids": f"{self.first.id}"}).data
+
+        self.assertEqual(batch[0], listed[self.first.id])
+
+    def test_batch_validates_ids(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"ids": "a,b"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"ids": "1,2,3,4"}).status_code, 400)
+
+
+class SparseFieldsetTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        super().setUp()
+        self.service = self.create_service(
+            "Toý mekany", "Банкетный зал", cover_image_path="services/images/cover.webp"
+        )
+        self.product = ServiceProduct.objects.create(service=self.service, title_tm="Zal", title_ru="Зал", price=100)
+        self.url = f"/api/v1/services/{self.service.id}/"
+
+    def _sql(self, ctx):
+        return " ".join(query["sql"] for query in ctx.captured_queries)
+
+    @override_settings(SERVICE_DETAIL_CACHE_ENABLED=False)
+    def test_fields_prune_output_and_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {"fields": "id,title,rating"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {"id", "title", "rating"})
+        # The conditional GET validators, then the pruned detail.
+        self.assertEqual(len(ctx.captured_queries), 2)
+        sql = ctx.captured_queries[-1]["sql"]
+        self.assertNotIn("services_serviceproduct", sql)
+        self.assertNotIn("services_favorite", sql)
+        self.assertNotIn("users_user", sql)
+        self.assertIn("services_serviceratingstats", sql)
+
+    @override_settings(SERVICE_DETAIL_CACHE_ENABLED=False)
+    def test_expand_limits_nested_relations(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(self.url, {"expand": "products"}).data
+
+        self.assertEqual(data["products"][0]["title"], "Zal")
+        self.assertEqual(data["title"], "Toý mekany")
+        for relation in ("contacts", "attributes", "media", "images", "videos", "tags", "available_cities"):
+            self.assertNotIn(relation, data)
+        sql = self._sql(ctx)
+        self.assertNotIn("services_servicecontact", sql)
+        self.assertNotIn("services_serviceimage", sql)
+
+    @override_settings(CACHE_IS_SHARED=True)
+    def test_cached_detail_is_pruned(self):
+        full = self.client.get(self.url).data
+
+        with CaptureQueriesContext(connection) as ctx:
+            sparse = self.client.get(self.url, {"fields": "id,title,products", "expand": "products"}).data
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(sparse, {key: full[key] for key in ("id", "title", "products")})
+
+    def test_list_cards_are_pruned(self):
+        results = self.client.get("/api/v1/services/", {"fields": "id,title"}).data["results"]
+
+        self.assertEqual(results, [{"id": self.service.id, "title": "Toý mekany"}])
+
+    def test_list_skips_relations_of_pruned_fields(self):
+        with CaptureQueriesContext(connection) as ctx:
+            results = self.client.get("/api/v1/services/", {"fields": "id,title,categories"}).data["results"]
+
+        self.assertEqual(results, [{"id": self.service.id, "title": "Toý mekany", "categories": [self.category.id]}])
+        # Count, page, additional categories; the page joins neither city nor category.
+        self.assertEqual(len(ctx.captured_queries), 3)
+        page_sql = ctx.captured_queries[1]["sql"]
+        self.assertNotIn("regions_city", page_sql)
+        self.assertNotIn("categories_category", page_sql)
+
+    def test_product_detail_skips_unrequested_relations(self):
+        url = f"/api/v1/services/{self.service.id}/products/{self.product.id}/"
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url, {"fields": "id,title,price,images", "expand": ""}).data
+
+        self.assertEqual(data, {"id": self.product.id, "title": "Zal", "price": 100.0})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn("services_serviceproductimage", ctx.captured_queries[-1]["sql"])
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class ServiceConditionalGetTests(ServiceFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        super().setUp()
+        self.viewer = User.objects.create_user(phone="+99369999221", password="pass123")
+        self.service = self.create_service("Toý mekany", "Банкетный зал")
+        self.product = ServiceProduct.objects.create(service=self.service, title_tm="Zal", title_ru="Зал", price=100)
+        self.url = f"/api/v1/services/{self.service.id}/"
+        self.product_url = f"/api/v1/services/{self.service.id}/products/{self.product.id}/"
+
+    def test_matching_etag_answers_304_from_one_query(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first["ETag"])
+        self.assertNotIn("Last-Modified", first)
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_per_process_cache_sends_no_etag(self):
+        with override_settings(CACHE_IS_SHARED=False):
+            first = self.client.get(self.url)
+            second = self.client.get(self.url, HTTP_IF_NONE_MATCH='"anything"')
+            product = self.client.get(self.product_url)
+
+        self.assertNotIn("ETag", first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(product.status_code, 200)
+        self.assertNotIn("ETag", product)
+
+    def test_if_modified_since_alone_never_answers_304(self):
+        since = http_date(time.time() + 60)
+        phone = ContactType.objects.create(slug="phone", name_tm="Telefon", name_ru="Телефон")
+        self.client.get(self.url)
+
+        ServiceContact.objects.create(service=self.service, type=phone, value="+99361000000")
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=since)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["contacts"][0]["value"], "+99361000000")
+        self.assertEqual(self.client.get(self.product_url, HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_child_rows_and_representation_change_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        ServiceImage.objects.create(service=self.service, image="services/images/new.webp", position=1)
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+
+        etag = changed["ETag"]
+        Review.objects.create(service=self.service, user=self.viewer, rating=4, comment="ok", is_approved=True)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotEqual(self.client.get(self.url, {"lang": "ru"})["ETag"], self.client.get(self.url)["ETag"])
+
+    def test_viewer_favorites_change_the_etag(self):
+        self.client.force_authenticate(user=self.viewer)
+        etag = self.client.get(self.url)["ETag"]
+
+        Favorite.objects.create(user=self.viewer, product=self.product)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["products"][0]["is_favorite"])
+
+    def test_product_detail_supports_conditional_get(self):
+        etag = self.client.get(self.product_url)["ETag"]
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(self.product_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        self.product.price = 120
+        self.product.save()
+        self.assertEqual(self.client.get(self.product_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(f"/api/v1/services/{self.service.id}/products/0/").status_code, 404)
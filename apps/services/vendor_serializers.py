@@ -3,6 +3,7 @@ from rest_framework import serializers
 
 from apps.categories.models import Category
 from apps.regions.models import City, Region
+from apps.services import attribute_document, detail_cache
 from apps.services.models import (
     Attribute,
     AttributeOption,
@@ -130,6 +131,8 @@ class VendorServiceWriteSerializer(serializers.ModelSerializer):
             ServiceContact.objects.bulk_create(
                 [ServiceContact(service=instance, **contact_data) for contact_data in contacts_data]
             )
+            # bulk_create sends no post_save, so the cached detail is not dropped by signals.
+            detail_cache.invalidate([instance.id])
         return instance
 
     def create(self, validated_data):
@@ -161,7 +164,7 @@ class VendorServiceImageSerializer(serializers.ModelSerializer):
         fields = ["id", "image", "aspect_ratio", "position"]
 
     def get_aspect_ratio(self, obj):
-        return obj.get_or_set_aspect_ratio()
+        return obj.get_aspect_ratio()
 
 
 class VendorServiceImageWriteSerializer(serializers.ModelSerializer):
@@ -243,16 +246,24 @@ def _validate_attribute_entries(category, scope, entries, require_complete):
 
 def _persist_service_attribute_values(service, entries):
     rows = [ServiceAttributeValue(service=service, **item) for item in entries]
-    service.service_attribute_values.all().delete()
-    if rows:
-        ServiceAttributeValue.objects.bulk_create(rows)
+    with attribute_document.deferred_refresh():
+        service.service_attribute_values.all().delete()
+        if rows:
+            ServiceAttributeValue.objects.bulk_create(rows)
+        attribute_document.schedule_refresh([service.id])
+    # bulk_create sends no post_save, and the delete none when no rows existed.
+    detail_cache.invalidate([service.id])
 
 
 def _persist_product_attribute_values(product, entries):
     rows = [ProductAttributeValue(product=product, **item) for item in entries]
-    product.values.all().delete()
-    if rows:
-        ProductAttributeValue.objects.bulk_create(rows)
+    with attribute_document.deferred_refresh():
+        product.values.all().delete()
+        if rows:
+            ProductAttributeValue.objects.bulk_create(rows)
+        attribute_document.schedule_refresh([product.service_id])
+    # bulk_create sends no post_save, and the delete none when no rows existed.
+    detail_cache.invalidate([product.service_id])
 
 
 def _validate_attribute_value_payload(category, scope, attrs):
@@ -397,6 +408,7 @@ class VendorServiceProductWriteSerializer(serializers.ModelSerializer):
                 if image
             ]
         )
+        detail_cache.invalidate([product.service_id])
 
     def create(self, validated_data):
         service = self.context["service"]
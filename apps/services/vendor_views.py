@@ -1,5 +1,3 @@
-from django.db.models import Avg, Count, OuterRef, Q, Subquery
-from django.db.models.functions import Round
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, mixins, permissions, status, viewsets
 from rest_framework.decorators import action
@@ -12,6 +10,7 @@ from apps.services.mixins import FavoriteAnnotateMixin
 from apps.categories.models import Category
 from apps.services.models import Attribute, CategoryAttribute, Service, ServiceAttributeValue, ServiceImage, ServiceProduct, ServiceProductImage, ServiceVideo
 from apps.services.permissions import IsVendor
+from apps.services.rating_stats import rating_annotations
 from apps.services.serializers import CategorySchemaSerializer, ServiceDetailSerializer
 from apps.services.vendor_serializers import (
     ReorderSerializer,
@@ -99,13 +98,7 @@ class VendorServiceViewSet(FavoriteAnnotateMixin,
             Service.objects.filter(vendor=self.request.user)
             .select_related("vendor", "category", "city", "city__region")
             .prefetch_related("additional_categories")
-            .annotate(
-                rating=Round(Avg("reviews__rating", filter=Q(reviews__is_approved=True)), 2),
-                reviews_count=Count("reviews", filter=Q(reviews__is_approved=True)),
-                cover_image_path=Subquery(
-                    ServiceImage.objects.filter(service_id=OuterRef("pk")).order_by("position", "id").values("image")[:1]
-                ),
-            )
+            .annotate(**rating_annotations())
             .order_by("-created_at")
         )
         if self.action in {"retrieve", "update", "partial_update"}:
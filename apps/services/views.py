@@ -1,7 +1,6 @@
 from django.core.exceptions import PermissionDenied
 from django.core.files.storage import default_storage
-from django.db.models import Avg, Case, Count, IntegerField, Prefetch, Q, OuterRef, Subquery, Value, When
-from django.db.models.functions import Round
+from django.db.models import Case, IntegerField, Prefetch, Value, When
 from django.shortcuts import get_object_or_404
 from rest_framework import mixins, viewsets, permissions
 from rest_framework.views import APIView
@@ -14,19 +13,28 @@ from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
-from core.pagination import CustomPagination
+from core.fieldsets import FieldPlan, field_plan
+from core.pagination import CursorOrPagePagination
+from core.utils import get_lang_code
 from apps.categories.models import Category
 from .permissions import IsVendor, IsServiceVendorOwner, IsServiceProductVendorOwner
 from .filters import ServiceFilter, ServiceProductFilter, apply_attribute_filters, parse_int_list
-from .models import Service, Review, Favorite, ServiceProduct, ServiceImage, ContactType, ReviewReport
+from .models import Service, Review, Favorite, ServiceProduct, ContactType, ReviewReport
 from .models import ServiceVideo
 from .serializers import (
     CategorySchemaSerializer,
     ServiceDetailSerializer,
     ServiceShowcaseSerializer,
+    ServiceBatchQuerySerializer,
+    ServiceFacetsSerializer,
+    ServiceMapQuerySerializer,
+    ServiceMapSerializer,
     ReviewSerializer,
     FavoriteSerializer,
     ServiceListSerializer,
+    ServiceListCardSerializer,
+    ServiceNearbyCardSerializer,
+    ServiceNearbyQuerySerializer,
     ServiceProductSerializer,
     ServiceProductListSerializer,
     ServiceProductDetailSerializer,
@@ -41,6 +49,80 @@ from .mixins import FavoriteAnnotateMixin
 from .throttles import ServiceApplicationIPThrottle
 from apps.system.models import WebsiteShowcaseConfig
 from apps.users.blocking import get_blocked_user_ids
+from .rating_stats import rating_annotations
+from .search import ServiceSearchFilter
+from .facets import compute_facets
+from .map_clusters import compute_map
+from . import cards, conditional, detail_cache
+
+
+SERVICE_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        name='city',
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description='Filter by available cities (comma-separated IDs), e.g. 1,2,3',
+        style='form',
+        explode=False,
+    ),
+    OpenApiParameter(
+        name='region',
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description='Filter by regions (comma-separated IDs), e.g. 4,5',
+        style='form',
+        explode=False,
+    ),
+    OpenApiParameter(
+        name='category',
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description='Filter by categories (comma-separated IDs), e.g. 10,11',
+        style='form',
+        explode=False,
+    ),
+    OpenApiParameter(
+        name='main_city',
+        type=OpenApiTypes.INT,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description='Filter by main city (single ID).',
+    ),
+    OpenApiParameter(
+        name='search',
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description='Search services by title (all languages).',
+    ),
+]
+
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        name='fields',
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description='Return only these top-level fields (comma-separated), e.g. id,title,rating',
+        style='form',
+        explode=False,
+    ),
+    OpenApiParameter(
+        name='expand',
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description=(
+            'Nested relations to include (comma-separated), e.g. products,contacts. '
+            'Without it all relations are included; relations left out are not queried.'
+        ),
+        style='form',
+        explode=False,
+    ),
+]
 
 
 @extend_schema(tags=["Services"])
@@ -50,59 +132,97 @@ class ServiceViewSet(FavoriteAnnotateMixin,
                      mixins.UpdateModelMixin,
                      viewsets.GenericViewSet):
     queryset = Service.objects.all()
-    filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ServiceSearchFilter]
     filterset_class = ServiceFilter
     ordering_fields = ['priority', 'created_at', 'price_min']
     ordering = ['priority', '-created_at']
     search_fields = ['title_tm', 'title_ru']
-    pagination_class = CustomPagination
+    pagination_class = CursorOrPagePagination
     favorite_field = 'service'
     parser_classes = (MultiPartParser, FormParser, JSONParser)
 
     def get_serializer_class(self):
-        if self.action == 'list':
-            return ServiceListSerializer
+        if self.action in ['list', 'batch']:
+            return ServiceListCardSerializer
+        if self.action == 'nearby':
+            return ServiceNearbyCardSerializer
         if self.action in ['update', 'partial_update']:
             return ServiceUpdateSerializer
         return ServiceDetailSerializer
 
     def get_queryset(self):
         blocked_user_ids = get_blocked_user_ids(getattr(self.request, "user", None))
-        review_filter = Q(reviews__is_approved=True)
-        if blocked_user_ids:
-            review_filter &= ~Q(reviews__user_id__in=blocked_user_ids)
-
-        prefetches = ["additional_categories"]
+        plan = field_plan(self.request)
         if getattr(self, "action", None) == "retrieve":
-            prefetches.extend(['tags', 'available_cities'])
+            return self._detail_queryset(plan, blocked_user_ids)
+
+        # Cards skip the relations of pruned fields, see cards.CITY_FIELDS.
+        select_related = ['vendor']
+        if plan.wants_any(cards.CATEGORY_FIELDS):
+            select_related.append('category')
+        if plan.wants_any(cards.CITY_FIELDS):
+            select_related.extend(['city', 'city__region'])
         qs = (
             Service.objects.filter(is_active=True)
-            .select_related('vendor', 'category', 'city', 'city__region')
-            .prefetch_related(*prefetches)
-            .annotate(
-                rating=Round(Avg("reviews__rating", filter=review_filter), 2),
-                reviews_count=Count("reviews", filter=review_filter),
-                cover_image_path=Subquery(
-                    ServiceImage.objects.filter(service_id=OuterRef("pk"))
-                    .order_by("id")
-                    .values("image")[:1]
-                ),
-            )
+            .select_related(*select_related)
+            .defer("description_tm", "description_ru", "search_vector", "search_text", "attribute_document")
             .order_by('priority', '-created_at')
         )
-        if getattr(self, "action", None) != "retrieve":
-            qs = qs.defer("description_tm", "description_ru")
-        if getattr(self, "action", None) == "retrieve":
+        if plan.wants_any(cards.ADDITIONAL_CATEGORY_FIELDS):
+            qs = qs.prefetch_related("additional_categories")
+        if plan.wants_any(["rating", "reviews_count"]):
+            qs = qs.annotate(**rating_annotations(blocked_user_ids))
+        return self.annotate_is_favorite(qs)
+
+    def _detail_queryset(self, plan, blocked_user_ids):
+        expandable = ServiceDetailSerializer.expandable_fields
+
+        def wants(*names):
+            return plan.wants_any(names, expandable)
+
+        select_related = []
+        if wants("vendor"):
+            select_related.append("vendor")
+        if wants("category_title"):
+            select_related.append("category")
+        if wants("city", "city_title", "region_title", "is_region_level"):
+            select_related.extend(["city", "city__region"])
+
+        prefetches = []
+        if wants("additional_categories", "categories"):
+            prefetches.append("additional_categories")
+        if wants("tags"):
+            prefetches.append("tags")
+        if wants("available_cities"):
+            prefetches.append("available_cities")
+        if wants("products"):
             products_qs = ServiceProduct.objects.prefetch_related(
                 "images", "values__attribute", "values__option"
             ).order_by("priority", "-created_at")
-            qs = qs.prefetch_related(
-                Prefetch("products", queryset=products_qs),
-                "contacts__type",
-                "service_attribute_values__attribute",
-                "service_attribute_values__option",
-            )
-        return self.annotate_is_favorite(qs)
+            prefetches.append(Prefetch("products", queryset=products_qs))
+        if wants("contacts"):
+            prefetches.append("contacts__type")
+        if wants("attributes"):
+            prefetches.extend(["service_attribute_values__attribute", "service_attribute_values__option"])
+
+        deferred = ["search_vector", "search_text", "attribute_document"]
+        if not wants("description", "description_tm", "description_ru"):
+            deferred.extend(["description_tm", "description_ru"])
+
+        qs = (
+            Service.objects.filter(is_active=True)
+            .prefetch_related(*prefetches)
+            .defer(*deferred)
+            .order_by('priority', '-created_at')
+        )
+        if select_related:
+            # An empty select_related() would follow every foreign key.
+            qs = qs.select_related(*select_related)
+        if wants("rating", "reviews_count"):
+            qs = qs.annotate(**rating_annotations(blocked_user_ids))
+        if wants("is_favorite"):
+            qs = self.annotate_is_favorite(qs)
+        return qs
 
     def filter_queryset(self, queryset):
         queryset = super().filter_queryset(queryset)
@@ -111,19 +231,23 @@ class ServiceViewSet(FavoriteAnnotateMixin,
         category_ids = parse_int_list(self.request.query_params.get("category"))
         explicit_ordering = self.request.query_params.get("ordering")
         if len(category_ids) == 1 and not explicit_ordering:
+            ordering = ["category_match_rank", "priority", "-created_at"]
+            if "search_rank" in queryset.query.annotations:
+                ordering.insert(1, "-search_rank")
             queryset = queryset.annotate(
                 category_match_rank=Case(
                     When(category_id=category_ids[0], then=Value(0)),
                     default=Value(1),
                     output_field=IntegerField(),
                 )
-            ).order_by("category_match_rank", "priority", "-created_at")
+            ).order_by(*ordering)
 
         return queryset
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
+        context['field_plan'] = field_plan(self.request)
         return context
 
     def get_permissions(self):
@@ -211,53 +335,142 @@ class ServiceViewSet(FavoriteAnnotateMixin,
             'Dynamic attribute filters use service_attr.<slug>, product_attr.<slug>, '
             'and numeric suffixes _min / _max.'
         ),
-        parameters=[
-            OpenApiParameter(
-                name='city',
-                type=OpenApiTypes.STR,
-                location=OpenApiParameter.QUERY,
-                required=False,
-                description='Filter by available cities (comma-separated IDs), e.g. 1,2,3',
-                style='form',
-                explode=False,
-            ),
-            OpenApiParameter(
-                name='region',
-                type=OpenApiTypes.STR,
-                location=OpenApiParameter.QUERY,
-                required=False,
-                description='Filter by regions (comma-separated IDs), e.g. 4,5',
-                style='form',
-                explode=False,
-            ),
-            OpenApiParameter(
-                name='category',
-                type=OpenApiTypes.STR,
-                location=OpenApiParameter.QUERY,
-                required=False,
-                description='Filter by categories (comma-separated IDs), e.g. 10,11',
-                style='form',
-                explode=False,
-            ),
-            OpenApiParameter(
-                name='main_city',
-                type=OpenApiTypes.INT,
-                location=OpenApiParameter.QUERY,
-                required=False,
-                description='Filter by main city (single ID).',
-            ),
-            OpenApiParameter(
-                name='search',
-                type=OpenApiTypes.STR,
-                location=OpenApiParameter.QUERY,
-                required=False,
-                description='Search services by title (all languages).',
-            ),
-        ]
+        parameters=[*SERVICE_FILTER_PARAMETERS, SPARSE_FIELDSET_PARAMETERS[0]],
+        responses=ServiceListSerializer(many=True),
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS)
+    def retrieve(self, request, *args, **kwargs):
+        service_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        blocked_user_ids = get_blocked_user_ids(getattr(request, "user", None))
+        overlay = detail_cache.user_overlay(
+            service_id, request.user, blocked_user_ids, markers=conditional.service_markers()
+        )
+        validators = conditional.service_validators(service_id, overlay, request)
+        if validators is None:
+            return self._detail_response(request, service_id, overlay)
+        not_modified = conditional.not_modified(request, validators)
+        if not_modified is not None:
+            return not_modified
+        return conditional.apply_validators(self._detail_response(request, service_id, overlay), validators)
+
+    def _detail_response(self, request, service_id, overlay):
+        if not detail_cache.is_enabled():
+            return super().retrieve(request)
+        plan = field_plan(request)
+        payload, key = detail_cache.get_detail(service_id, get_lang_code(request), request)
+        if payload is None:
+            if plan.is_partial:
+                # Only full payloads are cached; a sparse one runs the pruned query.
+                return super().retrieve(request)
+            payload = dict(self.get_serializer(self.get_object()).data)
+            detail_cache.store_detail(key, payload)
+        payload = detail_cache.apply_overlay(payload, overlay)
+        return Response(plan.prune(payload, ServiceDetailSerializer.expandable_fields))
+
+    @extend_schema(
+        summary="Count services per filter value",
+        description=(
+            'Accepts the same filters as the service list and returns how many matching services '
+            'fall under each category, city, region, tag and filterable attribute option.'
+        ),
+        parameters=SERVICE_FILTER_PARAMETERS,
+        responses=ServiceFacetsSerializer,
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="facets",
+        permission_classes=[permissions.AllowAny],
+        pagination_class=None,
+    )
+    def facets(self, request, *args, **kwargs):
+        services = self.filter_queryset(Service.objects.filter(is_active=True))
+        category_ids = parse_int_list(request.query_params.get("category"))
+        return Response(ServiceFacetsSerializer(compute_facets(services, category_ids)).data)
+
+    @extend_schema(
+        summary="List services near a point",
+        description=(
+            'Services with coordinates within `radius` km of `lat`/`lng`, nearest first. '
+            'Accepts the same filters as the service list; each card carries `distance` in km.'
+        ),
+        parameters=[ServiceNearbyQuerySerializer, *SERVICE_FILTER_PARAMETERS],
+        responses=ServiceNearbyCardSerializer(many=True),
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="nearby",
+        permission_classes=[permissions.AllowAny],
+    )
+    def nearby(self, request, *args, **kwargs):
+        point = ServiceNearbyQuerySerializer(data=request.query_params)
+        point.is_valid(raise_exception=True)
+        qs = (
+            self.filter_queryset(self.get_queryset())
+            .within_radius(point.validated_data["lat"], point.validated_data["lng"], point.validated_data["radius"])
+            .order_by("distance", "priority", "-created_at")
+        )
+        page = self.paginate_queryset(qs)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(
+        summary="Look up services by IDs",
+        description=(
+            'Returns list cards for the given IDs in the requested order. '
+            'Missing and inactive services are left out.'
+        ),
+        parameters=[ServiceBatchQuerySerializer],
+        responses=ServiceListSerializer(many=True),
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="batch",
+        permission_classes=[permissions.AllowAny],
+        pagination_class=None,
+    )
+    def batch(self, request, *args, **kwargs):
+        query = ServiceBatchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        ids = query.validated_data["ids"]
+        services_map = {service.id: service for service in self.get_queryset().filter(pk__in=ids).order_by()}
+        services = [services_map[service_id] for service_id in ids if service_id in services_map]
+        return Response(self.get_serializer(services, many=True).data)
+
+    @extend_schema(
+        summary="Cluster services for the map",
+        description=(
+            'Groups geolocated services inside `bbox` into zoom-dependent grid cells. '
+            'Returns cluster centroids with counts, and pins for single services or at high zoom. '
+            'Accepts the same filters as the service list.'
+        ),
+        parameters=[ServiceMapQuerySerializer, *SERVICE_FILTER_PARAMETERS],
+        responses=ServiceMapSerializer,
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="map",
+        permission_classes=[permissions.AllowAny],
+        pagination_class=None,
+    )
+    def map(self, request, *args, **kwargs):
+        viewport = ServiceMapQuerySerializer(data=request.query_params)
+        viewport.is_valid(raise_exception=True)
+        services = self.filter_queryset(Service.objects.filter(is_active=True))
+        payload = compute_map(
+            services,
+            viewport.validated_data["bbox"],
+            viewport.validated_data["zoom"],
+            get_lang_code(request),
+        )
+        return Response(ServiceMapSerializer(payload).data)
+
     @extend_schema(
         summary="List showcase services",
         description="Returns manually selected services for the website showcase block.",
@@ -272,9 +485,6 @@ class ServiceViewSet(FavoriteAnnotateMixin,
     )
     def showcase(self, request, *args, **kwargs):
         blocked_user_ids = get_blocked_user_ids(getattr(request, "user", None))
-        review_filter = Q(reviews__is_approved=True)
-        if blocked_user_ids:
-            review_filter &= ~Q(reviews__user_id__in=blocked_user_ids)
 
         config = (
             WebsiteShowcaseConfig.objects.filter(is_active=True)
@@ -300,15 +510,7 @@ class ServiceViewSet(FavoriteAnnotateMixin,
                 "contacts__type",
                 "serviceimage_set",
             )
-            .annotate(
-                rating=Round(Avg("reviews__rating", filter=review_filter), 2),
-                reviews_count=Count("reviews", filter=review_filter),
-                cover_image_path=Subquery(
-                    ServiceImage.objects.filter(service_id=OuterRef("pk"))
-                    .order_by("id")
-                    .values("image")[:1]
-                ),
-            )
+            .annotate(**rating_annotations(blocked_user_ids))
         )
         showcase_qs = self.annotate_is_favorite(showcase_qs)
         services_map = {service.id: service for service in showcase_qs}
@@ -329,29 +531,18 @@ class ServiceViewSet(FavoriteAnnotateMixin,
     )
     def my(self, request, *args, **kwargs):
         blocked_user_ids = get_blocked_user_ids(getattr(request, "user", None))
-        review_filter = Q(reviews__is_approved=True)
-        if blocked_user_ids:
-            review_filter &= ~Q(reviews__user_id__in=blocked_user_ids)
 
         qs = (
             Service.objects.filter(is_active=True, vendor=request.user)
             .select_related("vendor", "category", "city")
             .prefetch_related("additional_categories")
-            .annotate(
-                rating=Round(Avg("reviews__rating", filter=review_filter), 2),
-                reviews_count=Count("reviews", filter=review_filter),
-                cover_image_path=Subquery(
-                    ServiceImage.objects.filter(service_id=OuterRef("pk"))
-                    .order_by("id")
-                    .values("image")[:1]
-                ),
-            )
-            .defer("description_tm", "description_ru")
+            .annotate(**rating_annotations(blocked_user_ids))
+            .defer("description_tm", "description_ru", "search_vector", "search_text", "attribute_document")
             .order_by("priority", "-created_at")
         )
         qs = self.annotate_is_favorite(qs)
         page = self.paginate_queryset(qs)
-        serializer = ServiceListSerializer(page, many=True, context={"request": request})
+        serializer = ServiceListCardSerializer(page, many=True, context={"request": request})
         return self.get_paginated_response(serializer.data)
 
 
@@ -374,7 +565,7 @@ class ReviewViewSet(mixins.ListModelMixin,
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['service', 'user']
-    pagination_class = CustomPagination
+    pagination_class = CursorOrPagePagination
 
     def get_queryset(self):
         queryset = Review.objects.filter(is_approved=True).select_related('user', 'service')
@@ -439,7 +630,7 @@ class FavoriteViewSet(mixins.ListModelMixin,
     serializer_class = FavoriteSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
-    pagination_class = CustomPagination
+    pagination_class = CursorOrPagePagination
 
     @extend_schema(
         summary='List favorites',
@@ -463,9 +654,7 @@ class FavoriteViewSet(mixins.ListModelMixin,
 
     def get_queryset(self):
         blocked_user_ids = get_blocked_user_ids(getattr(self.request, "user", None))
-        service_review_filter = Q(service__reviews__is_approved=True)
-        if blocked_user_ids:
-            service_review_filter &= ~Q(service__reviews__user_id__in=blocked_user_ids)
+        service_rating = rating_annotations(blocked_user_ids, prefix="service__")
 
         qs = (
             Favorite.objects.filter(user=self.request.user)
@@ -479,22 +668,8 @@ class FavoriteViewSet(mixins.ListModelMixin,
             )
             .prefetch_related('service__additional_categories')
             .annotate(
-                service_rating=Round(
-                    Avg(
-                    "service__reviews__rating",
-                    filter=service_review_filter,
-                    ),
-                    2,
-                ),
-                service_reviews_count=Count(
-                    "service__reviews",
-                    filter=service_review_filter,
-                ),
-                service_cover_image_path=Subquery(
-                    ServiceImage.objects.filter(service_id=OuterRef("service_id"))
-                    .order_by("id")
-                    .values("image")[:1]
-                ),
+                service_rating=service_rating["rating"],
+                service_reviews_count=service_rating["reviews_count"],
             )
         )
         fav_type = (self.request.query_params.get('type') or '').lower().strip()
@@ -567,27 +742,50 @@ class ServiceProductViewSet(FavoriteAnnotateMixin,
                             mixins.RetrieveModelMixin,
                             mixins.UpdateModelMixin,
                             viewsets.GenericViewSet):
-    queryset = ServiceProduct.objects.select_related('service').prefetch_related(
-        'images', 'values__attribute', 'values__option', 'service__contacts__type'
-    )
+    queryset = ServiceProduct.objects.all()
     serializer_class = ServiceProductSerializer
-    pagination_class = CustomPagination
+    pagination_class = CursorOrPagePagination
     filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
     filterset_class = ServiceProductFilter
     ordering_fields = ['price', 'created_at', 'priority']
     ordering = ['priority', '-created_at']
     search_fields = ['title_tm', 'title_ru', 'description_tm', 'description_ru']
     favorite_field = 'product'
+    sparse_actions = ('list', 'retrieve', 'my')
 
     def get_queryset(self):
+        plan = field_plan(self.request) if getattr(self, "action", None) in self.sparse_actions else FieldPlan()
+        serializer_class = self.get_serializer_class()
+        available = set(serializer_class.Meta.fields)
+        expandable = getattr(serializer_class, "expandable_fields", ())
+
+        def wants(*names):
+            return plan.wants_any([name for name in names if name in available], expandable)
+
         qs = super().get_queryset()
-        qs = qs.filter(service__is_active=True)
-        qs = self.annotate_is_favorite(qs)
+        if wants("service_title_tm", "service_title_ru", "contacts"):
+            qs = qs.select_related('service')
+        prefetches = []
+        if wants("images"):
+            prefetches.append('images')
+        if wants("values"):
+            prefetches.extend(['values__attribute', 'values__option'])
+        if wants("contacts"):
+            prefetches.append('service__contacts__type')
+        qs = qs.prefetch_related(*prefetches).filter(service__is_active=True)
+        if wants("is_favorite"):
+            qs = self.annotate_is_favorite(qs)
         service_id = self.kwargs.get('service_id') or self.kwargs.get('service_pk')
         if service_id is not None:
             qs = qs.filter(service_id=service_id)
         return qs
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if getattr(self, "action", None) in self.sparse_actions:
+            context['field_plan'] = field_plan(self.request)
+        return context
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ServiceProductDetailSerializer
@@ -604,6 +802,22 @@ class ServiceProductViewSet(FavoriteAnnotateMixin,
             return [permissions.IsAuthenticated(), IsVendor(), IsServiceProductVendorOwner()]
         return [permissions.AllowAny()]
 
+    @extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS)
+    def retrieve(self, request, *args, **kwargs):
+        service_id = self.kwargs.get('service_id') or self.kwargs.get('service_pk')
+        product_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        validators = conditional.product_validators(product_id, service_id, request)
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+        not_modified = conditional.not_modified(request, validators)
+        if not_modified is not None:
+            return not_modified
+        return conditional.apply_validators(super().retrieve(request, *args, **kwargs), validators)
+
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
@@ -45,8 +45,12 @@ class WebPImageFieldFile(ImageFieldFile):
             return name, None
 
     def save(self, name, content, save=True):
+        from core.image_assets import record_image_source
+
         new_name, new_content = self._convert_to_webp(name, content)
-        super().save(new_name, new_content or content, save)
+        content = new_content or content
+        super().save(new_name, content, save)
+        record_image_source(self.name, content.size)
 
 
 class WebPImageField(ImageField):
@@ -0,0 +1,48 @@
+"""Sparse fieldsets: `?fields=` and `?expand=` query parameters.
+
+`fields` lists the top-level fields to return. `expand` lists which of a
+serializer's nested relations (its `expandable_fields`) to include; without
+it every relation is included, as before. Views read the same plan to skip
+the joins, prefetches and annotations of fields that are left out.
+"""
+from typing import FrozenSet, Iterable, NamedTuple, Optional
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+class FieldPlan(NamedTuple):
+    fields: Optional[FrozenSet[str]] = None
+    expand: Optional[FrozenSet[str]] = None
+
+    @property
+    def is_partial(self) -> bool:
+        return self.fields is not None or self.expand is not None
+
+    def wants(self, name: str, expandable: Iterable[str] = ()) -> bool:
+        if self.fields is not None and name not in self.fields:
+            return False
+        if self.expand is not None and name in expandable and name not in self.expand:
+            return False
+        return True
+
+    def wants_any(self, names: Iterable[str], expandable: Iterable[str] = ()) -> bool:
+        return any(self.wants(name, expandable) for name in names)
+
+    def prune(self, data: dict, expandable: Iterable[str] = ()) -> dict:
+        if not self.is_partial:
+            return data
+        return {name: value for name, value in data.items() if self.wants(name, expandable)}
+
+
+def _names(raw: Optional[str]) -> Optional[FrozenSet[str]]:
+    if raw is None:
+        return None
+    return frozenset(part.strip() for part in raw.split(",") if part.strip())
+
+
+def field_plan(request) -> FieldPlan:
+    params = getattr(request, "query_params", None)
+    if params is None:
+        return FieldPlan()
+    return FieldPlan(_names(params.get(FIELDS_PARAM)), _names(params.get(EXPAND_PARAM)))
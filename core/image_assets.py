@@ -1,10 +1,22 @@
 import hashlib
 import io
+import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Iterable, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
 
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
 
 try:
     from PIL import Image, ImageOps
@@ -13,6 +25,18 @@ except Exception:
     ImageOps = None
 
 
+RENDER_MODE_INLINE = "inline"
+RENDER_MODE_DEFERRED = "deferred"
+# Rows claimed per transaction by render_pending_variants.
+RENDER_BATCH_SIZE = 20
+
+logger = logging.getLogger(__name__)
+
+_render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-variants")
+_render_lock = threading.Lock()
+_render_scheduled = False
+
+
 @dataclass(frozen=True)
 class ImagePreset:
     key: str
@@ -42,6 +66,44 @@ HOME_IMAGE_PRESETS = {
 }
 
 
+@dataclass
+class _VariantRequest:
+    variants: dict
+    preset: ImagePreset
+    source_name: str
+    source_field: str
+    prefix: str
+    storage: object
+    # Filled in by _resolve_variants from the recorded source signature.
+    signature: str = ""
+
+    @property
+    def variant_name(self) -> str:
+        return f"{self.prefix}/{self.preset.key}_{self.signature}.webp"
+
+    @property
+    def manifest_key(self) -> Tuple[str, str, str]:
+        return self.source_name, self.signature, self.preset.key
+
+
+_variant_batch: ContextVar[Optional[List[_VariantRequest]]] = ContextVar("image_variant_batch", default=None)
+
+
+@contextmanager
+def collect_image_variants():
+    """Resolve variants of all assets built inside the block with one manifest lookup."""
+    if _variant_batch.get() is not None:
+        yield
+        return
+    token = _variant_batch.set([])
+    try:
+        yield
+        requests = _variant_batch.get()
+    finally:
+        _variant_batch.reset(token)
+    _resolve_variants(requests)
+
+
 def build_image_asset(
     source_field,
     *,
@@ -60,50 +122,206 @@ def build_image_asset(
         return None
 
     variants = {}
-    for key in preset_keys:
-        preset = HOME_IMAGE_PRESETS.get(key)
-        if not preset:
-            continue
-        variant_url = _ensure_variant_url(
-            source_field=source_field,
-            entity=entity,
-            object_id=object_id,
-            field_name=field_name,
+    prefix = _build_field_prefix(entity=entity, object_id=object_id, field_name=field_name)
+    requests = [
+        _VariantRequest(
+            variants=variants,
             preset=preset,
+            source_name=source_field.name,
+            source_field=_field_label(source_field),
+            prefix=prefix,
+            storage=source_field.storage,
         )
-        if variant_url:
-            variants[key] = variant_url
+        for preset in (HOME_IMAGE_PRESETS.get(key) for key in preset_keys)
+        if preset
+    ]
+    batch = _variant_batch.get()
+    if batch is None:
+        _resolve_variants(requests)
+    else:
+        batch.extend(requests)
     return {"original": original_url, "variants": variants}
 
 
-def _ensure_variant_url(source_field, *, entity: str, object_id: int, field_name: str, preset: ImagePreset) -> Optional[str]:
-    variant_name = _build_variant_name(
-        source_field=source_field,
-        entity=entity,
-        object_id=object_id,
-        field_name=field_name,
-        preset=preset,
+def _resolve_variants(requests: List[_VariantRequest]) -> None:
+    if not requests:
+        return
+    from apps.media.models import ImageSource, ImageVariant
+
+    names = {request.source_name for request in requests}
+    recorded = ImageSource.objects.filter(name=OuterRef("source_name")).values("signature")[:1]
+    signatures: Dict[str, str] = {}
+    manifest = {}
+    for row in ImageVariant.objects.filter(source_name__in=names).annotate(recorded_signature=Subquery(recorded)):
+        signatures[row.source_name] = row.recorded_signature or _name_signature(row.source_name)
+        manifest[(row.source_name, row.signature, row.preset)] = row
+    unseen = names - signatures.keys()
+    if unseen:
+        # Only sources without any variant yet need a separate signature lookup.
+        found = dict(ImageSource.objects.filter(name__in=unseen).values_list("name", "signature"))
+        signatures.update({name: found.get(name) or _name_signature(name) for name in unseen})
+    for request in requests:
+        request.signature = signatures[request.source_name]
+
+    missing: Dict[Tuple[str, str, str], List[_VariantRequest]] = {}
+    for request in requests:
+        row = manifest.get(request.manifest_key)
+        if row is None:
+            missing.setdefault(request.manifest_key, []).append(request)
+        elif row.status == ImageVariant.Status.READY:
+            _set_variant_url(request, row.variant_name)
+    if not missing:
+        return
+
+    ImageVariant.objects.bulk_create(
+        [
+            ImageVariant(
+                source_name=request.source_name,
+                source_field=request.source_field,
+                signature=request.signature,
+                preset=request.preset.key,
+                variant_name=request.variant_name,
+            )
+            for request, *_ in missing.values()
+        ],
+        ignore_conflicts=True,
     )
-    storage = source_field.storage
+    if _render_mode() != RENDER_MODE_INLINE:
+        _schedule_background_render()
+        return
+
+    for key, key_requests in missing.items():
+        request = key_requests[0]
+        rendered = render_variant(request.storage, request.source_name, request.variant_name, request.preset)
+        _mark_variant(*key, variant_name=request.variant_name, rendered=rendered)
+        if rendered:
+            for item in key_requests:
+                _set_variant_url(item, request.variant_name)
+
+
+def _set_variant_url(request: _VariantRequest, variant_name: str) -> None:
     try:
-        if storage.exists(variant_name):
-            return storage.url(variant_name)
+        request.variants[request.preset.key] = request.storage.url(variant_name)
     except Exception:
-        return None
+        pass
+
+
+def _mark_variant(source_name: str, signature: str, preset_key: str, *, variant_name: str, rendered: bool) -> None:
+    from apps.media.models import ImageVariant
+
+    ImageVariant.objects.filter(
+        source_name=source_name,
+        signature=signature,
+        preset=preset_key,
+    ).update(
+        variant_name=variant_name,
+        status=ImageVariant.Status.READY if rendered else ImageVariant.Status.FAILED,
+        updated_at=timezone.now(),
+    )
+
+
+def _render_mode() -> str:
+    return getattr(settings, "IMAGE_VARIANT_RENDER_MODE", RENDER_MODE_DEFERRED)
+
+
+def _schedule_background_render() -> None:
+    if getattr(settings, "IMAGE_VARIANT_BACKGROUND_RENDER", True):
+        transaction.on_commit(_submit_background_render)
+
+
+def _submit_background_render() -> None:
+    global _render_scheduled
+    with _render_lock:
+        if _render_scheduled:
+            return
+        _render_scheduled = True
+    _render_executor.submit(_run_background_render)
+
 
-    _cleanup_old_preset_variants(
+def _run_background_render() -> None:
+    global _render_scheduled
+    with _render_lock:
+        _render_scheduled = False
+    try:
+        render_pending_variants()
+    except Exception:
+        logger.exception("Background image variant rendering failed")
+    finally:
+        connections.close_all()
+
+
+def pending_variants_count(include_failed: bool = False) -> int:
+    from apps.media.models import ImageVariant
+
+    return ImageVariant.objects.filter(status__in=_queued_statuses(include_failed)).count()
+
+
+def _queued_statuses(include_failed: bool) -> List[str]:
+    from apps.media.models import ImageVariant
+
+    statuses = [ImageVariant.Status.PENDING]
+    if include_failed:
+        statuses.append(ImageVariant.Status.FAILED)
+    return statuses
+
+
+def render_pending_variants(storage=None, limit: int = 0, include_failed: bool = False) -> Tuple[int, int]:
+    """Render queued variants, opening each source through its field's storage.
+
+    Rows are claimed with SKIP LOCKED a batch at a time, so several workers can
+    drain the queue without rendering the same variant twice. `storage`
+    overrides the field storage.
+    """
+    from apps.media.models import ImageVariant
+
+    rendered = failed = 0
+    last_id = 0
+    while not limit or rendered + failed < limit:
+        batch_size = min(RENDER_BATCH_SIZE, limit - rendered - failed) if limit else RENDER_BATCH_SIZE
+        with transaction.atomic():
+            batch = list(
+                ImageVariant.objects.select_for_update(skip_locked=True)
+                .filter(status__in=_queued_statuses(include_failed), id__gt=last_id)
+                .order_by("id")[:batch_size]
+            )
+            if not batch:
+                break
+            for variant in batch:
+                preset = HOME_IMAGE_PRESETS.get(variant.preset)
+                source_storage = storage or _field_storage(variant.source_field)
+                ok = bool(preset) and render_variant(source_storage, variant.source_name, variant.variant_name, preset)
+                _mark_variant(
+                    variant.source_name,
+                    variant.signature,
+                    variant.preset,
+                    variant_name=variant.variant_name,
+                    rendered=ok,
+                )
+                if ok:
+                    rendered += 1
+                else:
+                    failed += 1
+        last_id = batch[-1].id
+    return rendered, failed
+
+
+def render_variant(storage, source_name: str, variant_name: str, preset: ImagePreset) -> bool:
+    if Image is None or ImageOps is None:
+        return False
+
+    removed = _cleanup_old_preset_variants(
         storage=storage,
-        prefix=_build_field_prefix(entity=entity, object_id=object_id, field_name=field_name),
+        prefix=os.path.dirname(variant_name),
         preset_key=preset.key,
         keep_name=variant_name,
     )
+    if removed:
+        from apps.media.models import ImageVariant
 
-    if Image is None or ImageOps is None:
-        return None
+        ImageVariant.objects.filter(variant_name__in=removed).delete()
 
     try:
-        source_field.open("rb")
-        with Image.open(source_field.file) as image:
+        with storage.open(source_name, "rb") as source, Image.open(source) as image:
             image.load()
             image = _normalize_mode(image)
             resampling = getattr(getattr(Image, "Resampling", Image), "LANCZOS", Image.LANCZOS)
@@ -120,40 +338,59 @@ def _ensure_variant_url(source_field, *, entity: str, object_id: int, field_name
                 method=6,
             )
             buffer.seek(0)
+            if storage.exists(variant_name):
+                storage.delete(variant_name)
             storage.save(variant_name, ContentFile(buffer.read()))
-        return storage.url(variant_name)
+        return True
     except Exception:
-        return None
-    finally:
-        try:
-            source_field.close()
-        except Exception:
-            pass
+        return False
 
 
 def _build_field_prefix(*, entity: str, object_id: int, field_name: str) -> str:
     return f"home/variants/{entity}/{object_id}/{field_name}"
 
 
-def _build_variant_name(source_field, *, entity: str, object_id: int, field_name: str, preset: ImagePreset) -> str:
-    signature = _source_signature(source_field)
-    prefix = _build_field_prefix(entity=entity, object_id=object_id, field_name=field_name)
-    return f"{prefix}/{preset.key}_{signature}.webp"
+def _field_label(source_field) -> str:
+    field = getattr(source_field, "field", None)
+    model = getattr(field, "model", None)
+    if model is None:
+        return ""
+    return f"{model._meta.label}.{field.name}"
 
 
-def _source_signature(source_field) -> str:
-    parts = [source_field.name]
+def _field_storage(label: str):
+    if not label:
+        return default_storage
     try:
-        parts.append(str(source_field.size))
-    except Exception:
-        pass
-    try:
-        modified = source_field.storage.get_modified_time(source_field.name)
-        parts.append(str(int(modified.timestamp())))
-    except Exception:
-        pass
-    raw = "|".join(parts).encode("utf-8")
-    return hashlib.sha256(raw).hexdigest()[:16]
+        model_label, field_name = label.rsplit(".", 1)
+        return apps.get_model(model_label)._meta.get_field(field_name).storage
+    except (LookupError, ValueError, FieldDoesNotExist):
+        return default_storage
+
+
+def record_image_source(name: str, size: int) -> None:
+    """Record the signature of a freshly saved source.
+
+    Size and save time are known at upload, so content re-uploaded under an
+    existing name gets new variants without a storage round trip when assets
+    are resolved.
+    """
+    from apps.media.models import ImageSource
+
+    ImageSource.objects.update_or_create(
+        name=name,
+        defaults={"signature": _hash(f"{name}:{size}:{timezone.now().isoformat()}")},
+    )
+
+
+def _name_signature(name: str) -> str:
+    # Sources saved before signatures were recorded. Content overwritten in
+    # place under such a name needs `render_image_variants --reset`.
+    return _hash(name)
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
 
 
 def _normalize_mode(image):
@@ -164,10 +401,9 @@ def _normalize_mode(image):
     return image
 
 
-def _cleanup_old_preset_variants(*, storage, prefix: str, preset_key: str, keep_name: str) -> None:
+def _cleanup_old_preset_variants(*, storage, prefix: str, preset_key: str, keep_name: str) -> List[str]:
     candidates = _list_storage_files(storage, prefix)
-    if not candidates:
-        return
+    removed = []
     marker = f"{preset_key}_"
     for name in candidates:
         base = os.path.basename(name)
@@ -178,8 +414,10 @@ def _cleanup_old_preset_variants(*, storage, prefix: str, preset_key: str, keep_
         try:
             if storage.exists(name):
                 storage.delete(name)
+                removed.append(name)
         except Exception:
             continue
+    return removed
 
 
 def _list_storage_files(storage, path: str) -> list[str]:
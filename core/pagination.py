@@ -1,7 +1,202 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, List, Optional, Tuple
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Case, Q, Value
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'size'
     max_page_size = 100
+
+
+class CursorOrPagePagination(CustomPagination):
+    """Page numbers by default, keyset cursors once a client sends `cursor`.
+
+    Cursor pages skip the COUNT and the OFFSET: the next page starts after the
+    ordering values of the last row, with the primary key as tie-breaker. An
+    ordering the keyset cannot express (expressions, related or nullable
+    columns) still gets cursors, carrying a plain offset instead.
+    """
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            self.cursor_query_param in request.query_params
+            and self.page_query_param not in request.query_params
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        ordering = keyset_ordering(queryset)
+        cursor = self._decode_cursor(request.query_params.get(self.cursor_query_param))
+        if ordering is None:
+            offset = cursor.get('o', 0) if cursor else 0
+            if not isinstance(offset, int) or offset < 0:
+                raise NotFound(self.invalid_cursor_message)
+            rows = list(queryset[offset:offset + page_size + 1])
+            self.next_cursor = {'o': offset + page_size} if len(rows) > page_size else None
+        else:
+            queryset = queryset.order_by(*keyset_order_by(ordering))
+            if cursor:
+                try:
+                    queryset = queryset.filter(keyset_after(queryset.model._meta, ordering, cursor.get('k')))
+                except ValueError:
+                    raise NotFound(self.invalid_cursor_message)
+            rows = list(queryset[:page_size + 1])
+            self.next_cursor = None
+            if len(rows) > page_size:
+                last = rows[page_size - 1]
+                self.next_cursor = {'k': keyset_values(getattr(last, attname) for _, _, attname in ordering)}
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self._cursor_link(self.next_cursor)),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        page_schema = super().get_paginated_response_schema(schema)
+        page_schema['properties']['next']['description'] = (
+            'Next page link. With `cursor` in the query the response carries no `count` or `previous`.'
+        )
+        return page_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Keyset cursor; send it empty to start cursor pagination.',
+            'schema': {'type': 'string'},
+        })
+        return parameters
+
+    def _cursor_link(self, cursor) -> Optional[str]:
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self._encode_cursor(cursor))
+
+    @staticmethod
+    def _encode_cursor(cursor) -> str:
+        raw = json.dumps(cursor, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def _decode_cursor(self, token: Optional[str]):
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            cursor = json.loads(raw.decode('utf-8'))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(cursor, dict):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+
+def keyset_ordering(queryset) -> Optional[List[Tuple[str, bool, str]]]:
+    """Return (name, descending, attribute) per ordering term, ending with the pk.
+
+    None when the ordering cannot be expressed as a keyset.
+    """
+    query = queryset.query
+    terms = list(query.order_by) or list(query.get_meta().ordering or [])
+    opts = query.get_meta()
+    pk_name = opts.pk.name
+    ordering = []
+    for term in terms:
+        if not isinstance(term, str) or term == '?':
+            return None
+        descending = term.startswith('-')
+        name = term.lstrip('-')
+        if name == 'pk':
+            name = pk_name
+        if name in query.annotations:
+            if not _is_non_null_case(query.annotations[name]):
+                return None
+            ordering.append((name, descending, name))
+            continue
+        if '__' in name:
+            return None
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if getattr(field, 'null', True) or not getattr(field, 'concrete', False):
+            return None
+        ordering.append((name, descending, field.attname))
+        if field.primary_key:
+            return ordering
+    descending = ordering[-1][1] if ordering else False
+    ordering.append((pk_name, descending, opts.pk.attname))
+    return ordering
+
+
+def keyset_order_by(ordering) -> List[str]:
+    return [f"-{name}" if descending else name for name, descending, _ in ordering]
+
+
+def keyset_after(opts, ordering, values) -> Q:
+    """Rows after `values`, the ordering values of a row. Raises ValueError for bad values."""
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise ValueError("Cursor does not match the ordering")
+    after = Q()
+    equal = Q()
+    for (name, descending, _), raw in zip(ordering, values):
+        value = _parse_value(opts, name, raw)
+        after |= equal & Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+        equal &= Q(**{name: value})
+    return after
+
+
+def keyset_values(values) -> List[Any]:
+    """JSON-safe ordering values of a row, to pass back to `keyset_after`."""
+    return [_encode_value(value) for value in values]
+
+
+def _parse_value(opts, name: str, value: Any):
+    try:
+        field = opts.get_field(name)
+    except FieldDoesNotExist:
+        field = None
+    try:
+        # Annotations allowed in a keyset are integer ranks.
+        return field.to_python(value) if field is not None else int(value)
+    except (TypeError, ValidationError) as exc:
+        raise ValueError(str(exc))
+
+
+def _is_non_null_case(expression) -> bool:
+    default = getattr(expression, 'default', None)
+    return isinstance(expression, Case) and isinstance(default, Value) and default.value is not None
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
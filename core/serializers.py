@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from core.fieldsets import FieldPlan
 from core.utils import get_lang_code
 
 
@@ -13,3 +14,19 @@ class LangMixin:
                     lang = get_lang_code(self.context.get("request"))
             self._lang_code = lang or get_lang_code()
         return self._lang_code
+
+
+class SparseFieldsMixin:
+    """Applies the `field_plan` from the context to the top-level serializer.
+
+    Nested serializers share the context but keep all their fields.
+    """
+
+    expandable_fields: tuple = ()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        plan = getattr(self, "context", {}).get("field_plan") or FieldPlan()
+        if not plan.is_partial or (self.root is not self and self.root is not self.parent):
+            return fields
+        return {name: field for name, field in fields.items() if plan.wants(name, self.expandable_fields)}
@@ -1,10 +1,65 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
 from urllib.parse import urlparse, urlunparse
 
 from django.conf import settings
 from storages.backends.s3boto3 import S3Boto3Storage
 
+_storage_calls: ContextVar[Optional[List[str]]] = ContextVar("storage_calls", default=None)
 
-class PublicMinioStorage(S3Boto3Storage):
+
+@contextmanager
+def track_storage_calls():
+    """Collect the names of storage methods called inside the block."""
+    calls: List[str] = []
+    token = _storage_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _storage_calls.reset(token)
+
+
+class StorageCallCounterMixin:
+    def _track(self, method: str) -> None:
+        calls = _storage_calls.get()
+        if calls is not None:
+            calls.append(method)
+
+    def url(self, name, *args, **kwargs):
+        self._track("url")
+        return super().url(name, *args, **kwargs)
+
+    def exists(self, name):
+        self._track("exists")
+        return super().exists(name)
+
+    def size(self, name):
+        self._track("size")
+        return super().size(name)
+
+    def get_modified_time(self, name):
+        self._track("get_modified_time")
+        return super().get_modified_time(name)
+
+    def listdir(self, path):
+        self._track("listdir")
+        return super().listdir(path)
+
+    def _open(self, name, mode="rb"):
+        self._track("open")
+        return super()._open(name, mode)
+
+    def _save(self, name, content):
+        self._track("save")
+        return super()._save(name, content)
+
+    def delete(self, name):
+        self._track("delete")
+        return super().delete(name)
+
+
+class PublicMinioStorage(StorageCallCounterMixin, S3Boto3Storage):
     def get_object_parameters(self, name):
         params = super().get_object_parameters(name)
         if name and (name.startswith("category/thumbs/") or name.startswith("home/variants/")):
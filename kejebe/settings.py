@@ -61,6 +61,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'easy_thumbnails',
     'image_cropping',
     "drf_spectacular",
@@ -77,6 +78,7 @@ INSTALLED_APPS = [
     'apps.devices',
     'apps.home',
     'apps.system',
+    'apps.media',
     'mptt',
     'nested_admin',
     'django_json_widget',
@@ -124,6 +126,25 @@ FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg").strip() or "ffmpeg"
 DELETE_ORIGINAL_VIDEO_AFTER_HLS = os.getenv("DELETE_ORIGINAL_VIDEO_AFTER_HLS", "true").lower() == "true"
 SERVICE_VIDEO_MAX_FILE_SIZE_MB = int(os.getenv("SERVICE_VIDEO_MAX_FILE_SIZE_MB", "500"))
 REVIEW_REPORT_SLA_HOURS = int(os.getenv("REVIEW_REPORT_SLA_HOURS", "24"))
+HOME_SNAPSHOT_ENABLED = os.getenv("HOME_SNAPSHOT_ENABLED", "true").lower() == "true"
+HOME_SNAPSHOT_TTL_SECONDS = int(os.getenv("HOME_SNAPSHOT_TTL_SECONDS", "120"))
+HOME_SNAPSHOT_MAX_KEYS = int(os.getenv("HOME_SNAPSHOT_MAX_KEYS", "500"))
+HOME_CONFIG_INDEX_LOCAL_TTL_SECONDS = int(os.getenv("HOME_CONFIG_INDEX_LOCAL_TTL_SECONDS", "30"))
+HOME_CONCURRENT_BLOCKS = os.getenv("HOME_CONCURRENT_BLOCKS", "false").lower() == "true"
+# Capped at DB_CONNECTIONS_PER_PROCESS - 1, see DATABASES.
+HOME_BLOCK_WORKERS = int(os.getenv("HOME_BLOCK_WORKERS", "4"))
+HOME_BLOCK_QUERY_BUDGET = int(os.getenv("HOME_BLOCK_QUERY_BUDGET", "0"))
+HOME_DEBUG_ALLOW_NON_STAFF = os.getenv("HOME_DEBUG_ALLOW_NON_STAFF", "true" if DEBUG else "false").lower() == "true"
+SERVICE_DETAIL_CACHE_ENABLED = os.getenv("SERVICE_DETAIL_CACHE_ENABLED", "true").lower() == "true"
+SERVICE_DETAIL_CACHE_TTL_SECONDS = int(os.getenv("SERVICE_DETAIL_CACHE_TTL_SECONDS", "300"))
+SERVICE_NEARBY_DEFAULT_RADIUS_KM = float(os.getenv("SERVICE_NEARBY_DEFAULT_RADIUS_KM", "5"))
+SERVICE_NEARBY_MAX_RADIUS_KM = float(os.getenv("SERVICE_NEARBY_MAX_RADIUS_KM", "50"))
+SERVICE_MAP_CLUSTER_CELLS_PER_TILE = int(os.getenv("SERVICE_MAP_CLUSTER_CELLS_PER_TILE", "4"))
+SERVICE_MAP_PIN_ZOOM = int(os.getenv("SERVICE_MAP_PIN_ZOOM", "15"))
+SERVICE_MAP_MAX_PINS = int(os.getenv("SERVICE_MAP_MAX_PINS", "500"))
+SERVICE_BATCH_MAX_IDS = int(os.getenv("SERVICE_BATCH_MAX_IDS", "50"))
+IMAGE_VARIANT_RENDER_MODE = os.getenv("IMAGE_VARIANT_RENDER_MODE", "deferred").strip().lower() or "deferred"
+IMAGE_VARIANT_BACKGROUND_RENDER = os.getenv("IMAGE_VARIANT_BACKGROUND_RENDER", "true").lower() == "true"
 TERMS_VERSION = os.getenv("TERMS_VERSION", "2026-04-23").strip() or "2026-04-23"
 TERMS_LAST_UPDATED = os.getenv("TERMS_LAST_UPDATED", "2026-04-23T00:00:00Z").strip() or "2026-04-23T00:00:00Z"
 CORS_ALLOWED_ORIGINS = [
@@ -163,6 +184,27 @@ SIMPLE_JWT = {
 
 IMAGE_CROPPING_BACKEND = "core.image_cropping_backend.WebPEasyThumbnailsBackend"
 
+# Home snapshots, the home config index and the service detail cache are
+# invalidated through cache keys, so multi-worker deployments need a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache). With a
+# per-process backend an invalidation only reaches the worker that made the
+# change: home snapshots and the service detail cache are then disabled and the
+# config index falls back to HOME_CONFIG_INDEX_LOCAL_TTL_SECONDS.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+_PER_PROCESS_CACHE_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+CACHE_IS_SHARED = os.getenv(
+    "CACHE_IS_SHARED",
+    "false" if CACHES["default"]["BACKEND"] in _PER_PROCESS_CACHE_BACKENDS else "true",
+).lower() == "true"
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -264,6 +306,10 @@ DATABASES = {
         "CONN_MAX_AGE": 600,
     }
 }
+# Persistent connections one process may hold: the request thread plus the
+# home block pool. Gunicorn workers x this must stay below the server's
+# max_connections (100 on a stock PostgreSQL).
+DB_CONNECTIONS_PER_PROCESS = int(os.getenv("DB_CONNECTIONS_PER_PROCESS", "5"))
 
 
 # Password validation
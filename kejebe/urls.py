@@ -15,7 +15,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework_nested import routers
 
@@ -111,6 +111,7 @@ api_patterns = [
     path("users/<str:user_id>/block/", UserBlockView.as_view(), name="users-block"),
     path('devices/', include('apps.devices.urls')),
     path('home/', HomeViewSet.as_view({'get': 'list'})),
+    re_path(r'^home/blocks/(?:blk_)?(?P<pk>\d+)/$', HomeViewSet.as_view({'get': 'block'})),
     path('system/contacts', SystemContactViewSet.as_view({'get': 'list'}), name='system-contacts'),
     path('system/about', SystemAboutView.as_view(), name='system-about'),
     path("legal/terms", TermsInfoView.as_view(), name="legal-terms"),